@@ -2,7 +2,6 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import json
 import logging
 import os
 import re
@@ -11,16 +10,24 @@ import time
 import uuid
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 
-import uvicorn
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from zoneinfo import ZoneInfo
 
 # Google GenAI
-from google import genai
-from google.genai.errors import ServerError
+from google.genai.errors import APIError
+
+import gemini_client
+import serve
+from json_io import JSONBytesResponse, validate_json
+from kv_cache import KVCache
+from metrics import metrics_response, stage_timer
+from request_memo import IdempotencyKeyMismatch, InflightCoalescer, body_hash, check_body, request_key
+from textnorm import normalize_name
+from upstream_limiter import UpstreamOverloaded
 
 
 # ============================ Logging ============================
@@ -31,6 +38,7 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 logger = logging.getLogger("task_planner")
+METRICS_APP = "task"
 
 
 # ============================ Schemas ============================
@@ -263,7 +271,11 @@ API_DESCRIPTION = """
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("FastAPI startup")
+    google_api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
+    if google_api_key:
+        gemini_client.init_client(api_key=google_api_key)
     yield
+    await gemini_client.close_client()
     logger.info("FastAPI shutdown")
 
 
@@ -298,6 +310,38 @@ async def log_requests(request: Request, call_next):
 
 
 # ============================ Endpoints ============================
+@app.exception_handler(IdempotencyKeyMismatch)
+async def idempotency_key_mismatch_handler(request: Request, exc: IdempotencyKeyMismatch):
+    # Idempotency-Key เดิมแต่ body ต่าง — ไม่คืนผลของ request ก่อนหน้าแบบเงียบ ๆ
+    logger.warning(f"[{getattr(request.state, 'req_id', '-')}] {exc}")
+    return JSONResponse(
+        status_code=422,
+        content={
+            "detail": {
+                "error": "idempotency_key_mismatch",
+                "message": "Idempotency-Key นี้ถูกใช้กับคำขออื่นไปแล้ว",
+            }
+        },
+    )
+
+
+@app.exception_handler(UpstreamOverloaded)
+async def upstream_overloaded_handler(request: Request, exc: UpstreamOverloaded):
+    # คิวของโมเดลเต็ม — shed ทันทีพร้อม Retry-After แทนการยิง 429 ใส่ upstream ซ้ำ
+    logger.warning(f"[{getattr(request.state, 'req_id', '-')}] {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={
+            "detail": {
+                "error": "upstream_overloaded",
+                "message": "ระบบมีคำขอจำนวนมาก โปรดลองใหม่ภายหลัง",
+                "retry_after": exc.retry_after,
+            }
+        },
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.get("/")
 async def root():
     return {"status": "Hello"}
@@ -305,7 +349,23 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "gemini_limiters": gemini_client.limiter_stats()}
+
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
+
+
+# Memoization: request ซ้ำ (retry จากแอป/กดส่งซ้ำ) ใช้ผลร่วมกัน และ cache ผลสำเร็จช่วงสั้น ๆ
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+_plan_cache = KVCache(
+    "response_plan",
+    ttl=RESPONSE_CACHE_TTL,
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "200")),
+    path=os.getenv("CACHE_DB_PATH", "planner_cache.sqlite3"),
+)
+_plan_inflight = InflightCoalescer()
 
 
 @app.post("/plan", response_model=PlanResponse)
@@ -314,6 +374,7 @@ async def plan_endpoint(
     request: Request,
     response: Response,
     allow_soft: Optional[bool] = None,
+    idempotency_key: Optional[str] = Header(default=None),
 ):
     req_id = getattr(request.state, "req_id", "-")
     logger.info(f"[{req_id}] Received /plan with input length={len(req.input)}")
@@ -321,6 +382,44 @@ async def plan_endpoint(
     # Today (Asia/Bangkok)
     today_iso = datetime.now(TH_TZ).date().isoformat()
 
+    soft_default = os.getenv("SOFT_FEASIBILITY_DEFAULT", "true").lower() == "true"
+    allow_soft = soft_default if allow_soft is None else bool(allow_soft)
+
+    key = request_key(
+        "plan",
+        normalize_name(req.input),
+        req.target_language,
+        allow_soft,
+        today_iso,
+        idempotency_key=idempotency_key,
+    )
+    body = body_hash(normalize_name(req.input), req.target_language, allow_soft)
+    cached = await _plan_cache.aget(key)
+    if cached:
+        check_body(key, cached.get("body"), body)
+        logger.info(f"[{req_id}] response cache hit")
+        # แผนใน cache ผ่าน validate มาแล้วตอนเก็บ — ส่ง JSON ตรง ๆ ไม่สร้าง PlanResponse ซ้ำ
+        return JSONBytesResponse(cached["plan"], headers={**cached["headers"], "X-Response-Cache": "hit"})
+
+    (result, headers), shared = await _plan_inflight.run(
+        key, lambda: _generate_plan(req, req_id, today_iso, allow_soft), body
+    )
+    if shared:
+        logger.info(f"[{req_id}] coalesced with in-flight identical request")
+    else:
+        await _plan_cache.aset(key, {"plan": result.model_dump(mode="json"), "headers": headers, "body": body})
+    response.headers.update(headers)
+    response.headers["X-Response-Cache"] = "shared" if shared else "miss"
+    return result
+
+
+async def _generate_plan(
+    req: UserRequest,
+    req_id: str,
+    today_iso: str,
+    allow_soft: bool,
+) -> tuple[PlanResponse, Dict[str, str]]:
+    """เรียกโมเดล + ตรวจ intent/feasibility — คืน (PlanResponse, headers ที่ต้องแนบ) หรือ raise HTTPException"""
     # API Key & model checks
     google_api_key = os.getenv("GOOGLE_API_KEY") or os.getenv("GEMINI_API_KEY")
     if not google_api_key:
@@ -356,53 +455,38 @@ async def plan_endpoint(
     }
     prompt = make_combined_prompt(user_text, today_iso, lang=req.target_language)
 
-    # Create client
-    client = genai.Client(api_key=google_api_key)
+    # Shared client (connection pool ถูกสร้างครั้งเดียวใน lifespan)
+    client = gemini_client.get_client(api_key=google_api_key)
 
-    # Call model (with fallback)
+    # Call model (retry + hedge/fallback ไปยัง GEMINI_FALLBACK_MODEL เมื่อ overload หรือช้ากว่า p95)
+    fb_model = os.getenv("GEMINI_FALLBACK_MODEL")
     try:
         logger.info(f"[{req_id}] Calling Gemini model={model_name}")
         t0 = time.perf_counter()
-        resp = client.models.generate_content(model=model_name, contents=prompt, config=config)
-        logger.info(f"[{req_id}] Gemini responded in {(time.perf_counter() - t0) * 1000:.1f} ms")
-    except ServerError as se:
-        status_code = getattr(se, "status_code", None)
-        provider_status = None
-        try:
-            provider_status = (getattr(se, "response_json", {}) or {}).get("error", {}).get("status")
-        except Exception:
-            provider_status = None
-
-        fb_model = os.getenv("GEMINI_FALLBACK_MODEL")
-        if status_code in (429, 503) and fb_model and fb_model != model_name:
-            logger.warning(f"[{req_id}] {status_code} {provider_status} -> trying fallback={fb_model}")
-            try:
-                t1 = time.perf_counter()
-                resp = client.models.generate_content(model=fb_model, contents=prompt, config=config)
-                logger.info(f"[{req_id}] Fallback responded in {(time.perf_counter() - t1) * 1000:.1f} ms")
-            except Exception:
-                logger.exception(f"[{req_id}] Fallback also failed")
-                raise HTTPException(
-                    status_code=503 if status_code == 503 else 429 if status_code == 429 else 502,
-                    detail={
-                        "error": "upstream_unavailable",
-                        "message": "บริการโมเดลภายนอกไม่พร้อมใช้งาน โปรดลองใหม่ภายหลัง",
-                        "provider_status": provider_status,
-                    },
-                )
-        else:
-            logger.exception(f"[{req_id}] Gemini API error (status={status_code}, {provider_status})")
-            http_status = 503 if status_code == 503 else 429 if status_code == 429 else 502
-            raise HTTPException(
-                status_code=http_status,
-                detail={
-                    "error": "upstream_unavailable" if http_status in (429, 503) else "upstream_error",
-                    "message": "บริการโมเดลภายนอกไม่พร้อมใช้งาน โปรดลองใหม่ภายหลัง"
-                    if http_status in (429, 503)
-                    else f"Gemini API error",
-                    "provider_status": provider_status,
-                },
+        with stage_timer(METRICS_APP, "generation"):
+            resp = await gemini_client.call_model(
+                model_name,
+                lambda m: client.aio.models.generate_content(model=m, contents=prompt, config=config),
+                fallback_model=fb_model,
             )
+        logger.info(f"[{req_id}] Gemini responded in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    except UpstreamOverloaded:
+        raise
+    except APIError as ae:
+        status_code = ae.code
+        provider_status = ae.status
+        logger.exception(f"[{req_id}] Gemini API error (status={status_code}, {provider_status})")
+        http_status = 503 if status_code == 503 else 429 if status_code == 429 else 502
+        raise HTTPException(
+            status_code=http_status,
+            detail={
+                "error": "upstream_unavailable" if http_status in (429, 503) else "upstream_error",
+                "message": "บริการโมเดลภายนอกไม่พร้อมใช้งาน โปรดลองใหม่ภายหลัง"
+                if http_status in (429, 503)
+                else f"Gemini API error",
+                "provider_status": provider_status,
+            },
+        )
     except Exception as e:
         logger.exception(f"[{req_id}] Gemini API error: {e}")
         raise HTTPException(status_code=502, detail=f"Gemini API error: {e}")
@@ -412,7 +496,8 @@ async def plan_endpoint(
     if not combined:
         logger.warning(f"[{req_id}] No .parsed -> try parse resp.text")
         try:
-            combined = CombinedOut(**json.loads(resp.text))
+            with stage_timer(METRICS_APP, "parse_validate"):
+                combined = validate_json(CombinedOut, resp.text)
         except Exception:
             logger.exception(f"[{req_id}] Failed to parse CombinedOut")
             raise HTTPException(status_code=500, detail="Failed to parse model response into CombinedOut schema")
@@ -451,16 +536,16 @@ async def plan_endpoint(
         raise HTTPException(status_code=500, detail="Model did not return a plan for acceptable intent")
 
     # Feasibility (soft-fail)
-    soft_default = os.getenv("SOFT_FEASIBILITY_DEFAULT", "true").lower() == "true"
-    allow_soft = soft_default if allow_soft is None else bool(allow_soft)
-
-    meta = assess_feasibility(combined.plan)
+    with stage_timer(METRICS_APP, "feasibility"):
+        meta = assess_feasibility(combined.plan)
 
     # Attach headers for observability/edge routing
-    response.headers["X-Plan-Feasible"] = "true" if meta.feasible else "false"
-    response.headers["X-Plan-Difficulty"] = meta.difficulty
+    headers: Dict[str, str] = {
+        "X-Plan-Feasible": "true" if meta.feasible else "false",
+        "X-Plan-Difficulty": meta.difficulty,
+    }
     if meta.warnings:
-        response.headers["X-Plan-Warnings"] = "; ".join(meta.warnings)[:512]
+        headers["X-Plan-Warnings"] = "; ".join(meta.warnings)[:512]
 
     if not meta.feasible and not allow_soft:
         logger.warning(f"[{req_id}] IMPOSSIBLE -> strict 422, reasons={meta.reasons}")
@@ -479,12 +564,14 @@ async def plan_endpoint(
         )
 
     logger.info(f"[{req_id}] return plan with feasibility={meta.difficulty} soft_allowed={allow_soft}")
-    return PlanResponse(plan=combined.plan, feasibility=meta)
+    return PlanResponse(plan=combined.plan, feasibility=meta), headers
 
 
 # ============================ Entrypoint ============================
 if __name__ == "__main__":
-    uvicorn.run(
+    # WEB_CONCURRENCY>1 -> หลาย worker process ใช้ cache SQLite ร่วมกัน (ดู serve.py / gunicorn.conf.py)
+    serve.run(
+        "api:app",
         app,
         host=os.getenv("HOST", "127.0.0.1"),
         port=int(os.getenv("PORT", "8000")),
@@ -493,15 +580,28 @@ if __name__ == "__main__":
     )
 
 # ============================ วิธีการรัน ============================
-# 1) pip install fastapi uvicorn pydantic google-genai python-dotenv
+# 1) pip install fastapi uvicorn pydantic google-genai httpx python-dotenv prometheus-client
 # 2) ตั้งค่า .env อย่างน้อย:
 #       GOOGLE_API_KEY="YOUR_API_KEY_HERE"     # หรือ GEMINI_API_KEY (fallback)
 #       GEMINI_MODEL="gemini-1.5-pro"
 #       LOG_LEVEL="INFO"
 #       SOFT_FEASIBILITY_DEFAULT="true"        # เปิด soft-fail เป็นค่าเริ่มต้น
+#       GEMINI_POOL_MAX_CONNECTIONS="32"       # (ไม่บังคับ) ขนาด connection pool ของ Gemini client
+#       GEMINI_HTTP_TIMEOUT="120"              # (ไม่บังคับ) timeout ต่อ request (วินาที)
+#       WEB_CONCURRENCY="1"                    # (ไม่บังคับ) จำนวน worker process (cache ใช้ SQLite ร่วมกัน)
+#       GEMINI_MAX_CONCURRENCY="8"             # (ไม่บังคับ) request พร้อมกันสูงสุดต่อโมเดล (ลดเองเมื่อเจอ 429)
+#       GEMINI_MAX_QUEUE="32"                  # (ไม่บังคับ) คิวรอต่อโมเดล เต็มแล้วตอบ 503 + Retry-After
+#       GEMINI_RPM="0"                         # (ไม่บังคับ) โควตา request ต่อนาทีต่อโมเดล (0 = ไม่จำกัด)
+#       GEMINI_FALLBACK_MODEL="gemini-2.5-flash" # (ไม่บังคับ) ใช้เมื่อโมเดลหลัก overload และเป็นปลายทางของ hedge
+#       GEMINI_RETRY_MAX_ATTEMPTS="3"          # (ไม่บังคับ) retry 429/5xx/timeout ด้วย backoff + jitter
+#       GEMINI_RETRY_DEADLINE="90"             # (ไม่บังคับ) เวลารวมทุก attempt (วินาที)
+#       GEMINI_HEDGE="false"                   # (ไม่บังคับ) ส่งซ้ำไป fallback เมื่อช้ากว่า p95 ของโมเดลหลัก
 # 3) รันแอป:
 #       python api.py
+#       WEB_CONCURRENCY=4 python api.py              # หลาย worker
+#       gunicorn -c gunicorn.conf.py api:app         # หรือผ่าน gunicorn (pip install gunicorn)
 # 4) ใช้งาน:
 #       POST http://127.0.0.1:8000/plan?allow_soft=true
+#       GET  http://127.0.0.1:8000/metrics     (Prometheus)
 #       Swagger UI: http://127.0.0.1:8000/docs
 #       ReDoc:      http://127.0.0.1:8000/redoc
@@ -0,0 +1,108 @@
+"""เทียบเวลา strip + validate + restore ของ /changeplan บนแผนขนาดใหญ่ ระหว่างวิธีเดิม (dict walk ตามชื่อ)
+กับ strip รอบเดียวที่ให้ place_id + restore ตาม place_id (extract_and_strip_old_plan / restore_old_places ใน main.py)
+
+ไม่เรียกโมเดล — ใช้แผนเดิมที่ strip แล้วแทนผลลัพธ์จากโมเดล (กรณีเลวร้ายสุด: ทุกสถานที่ถูกคงไว้)
+
+    python benchmarks/bench_changeplan_strip.py --days 10 --stops 8 --options 3 --rounds 50
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import summarize_ms
+from benchmarks.fake_upstream import FakeConfig, make_plan_response
+
+import main
+
+
+def _enriched_plan(days: int, stops: int, options: int) -> str:
+    """แผนที่เติมพิกัด/ลิงก์/รูปครบแล้ว (เหมือน olddata ที่แอปส่งกลับมา)"""
+    data = make_plan_response(FakeConfig(days=days, stops_per_day=stops, hotels=3), options)
+    plan = main.assign_place_ids(main.PlanResponse(**data))
+    for i, (_, place) in enumerate(main.iter_places(plan)):
+        place.coordinates = main.Coordinates(lat=18.7 + i / 1e4, lng=98.98)
+        place.google_maps_url = main.get_map_url(place.name)
+        place.image_url = [f"https://img.example/{i}/{k}.jpg" for k in range(3)]
+        place.isnewplan = "old_plan"
+    return plan.model_dump_json()
+
+
+# ---- before: json.loads + dict walk + json.dumps, แล้ว validate, แล้ว walk อีกรอบตามชื่อ ----
+def _legacy_strip(olddata_text: str):
+    old_places_map = {}
+    data = json.loads(olddata_text)
+    places = [stop["places"] for plan in data["plan_output"] for day in plan["itinerary"] for stop in day["stops"]]
+    places += [h for hotel_list in data["hotel_output"] for h in hotel_list]
+    for p in places:
+        name = p.get("name")
+        if name:
+            old_places_map[name] = {k: p.get(k) for k in ("coordinates", "google_maps_url", "image_url")}
+            p["coordinates"] = p["google_maps_url"] = p["image_url"] = None
+    return json.dumps(data, ensure_ascii=False), old_places_map
+
+
+def _legacy_restore(plan, old_places_map):
+    places = [stop.places for option in plan.plan_output for day in option.itinerary for stop in day.stops]
+    places += [h for hotel_list in plan.hotel_output for h in hotel_list]
+    for p in places:
+        cached = old_places_map.get(p.name)
+        if cached:
+            c = cached.get("coordinates")
+            if isinstance(c, dict):
+                p.coordinates = main.Coordinates(lat=c["lat"], lng=c["lng"])
+            p.google_maps_url = cached.get("google_maps_url") or p.google_maps_url
+            p.image_url = cached.get("image_url") or p.image_url
+    return plan
+
+
+def _legacy_round(olddata: str):
+    stripped, old = _legacy_strip(olddata)
+    plan = main.PlanResponse(**json.loads(stripped))  # แทนผลจากโมเดล
+    return _legacy_restore(plan, old)
+
+
+def _typed_round(olddata: str):
+    stripped, old = main.extract_and_strip_old_plan(olddata)
+    plan = main.PlanResponse(**json.loads(stripped))  # แทนผลจากโมเดล
+    return main.restore_old_places(plan, old)
+
+
+def _bench(label, fn, olddata, rounds):
+    fn(olddata)  # warm-up
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn(olddata)
+        samples.append((time.perf_counter() - t0) * 1000)
+    stats = summarize_ms(samples)
+    print(f"{label:<8} mean={stats['mean_ms']:8.2f} ms  p50={stats['p50_ms']:8.2f} ms  p95={stats['p95_ms']:8.2f} ms")
+    return stats
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--stops", type=int, default=8)
+    parser.add_argument("--options", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    olddata = _enriched_plan(args.days, args.stops, args.options)
+    n_places = sum(1 for _ in main.iter_places(main.PlanResponse.model_validate_json(olddata)))
+    print(f"plan: {args.options} options x {args.days} days x {args.stops} stops, {n_places} places, {len(olddata) / 1024:.0f} KiB")
+
+    restored = _typed_round(olddata)
+    assert all(p.coordinates is not None for _, p in main.iter_places(restored)), "typed restore lost coordinates"
+
+    before = _bench("legacy", _legacy_round, olddata, args.rounds)
+    after = _bench("typed", _typed_round, olddata, args.rounds)
+    print(f"speedup: x{before['mean_ms'] / after['mean_ms']:.2f}")
+
+
+if __name__ == "__main__":
+    main_()
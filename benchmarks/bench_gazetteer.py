@@ -0,0 +1,77 @@
+"""วัดเวลา build และ lookup ของ gazetteer (gazetteer.py) บน index สังเคราะห์ขนาดใหญ่
+
+ชื่อสังเคราะห์ผสมคำนำหน้า/ชื่อ/ย่านแบบชื่อสถานที่ไทย พร้อม alias อังกฤษ — วัดแยกตามชนิดการจับคู่
+
+    python benchmarks/bench_gazetteer.py --places 100000 --lookups 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import summarize_ms
+from gazetteer import Gazetteer, build_index
+
+_PREFIXES = ["วัด", "ตลาด", "ร้าน", "คาเฟ่", "พิพิธภัณฑ์", "อุทยาน", "น้ำตก", "ดอย", "หาด", "เกาะ"]
+_WORDS = ["พระธาตุ", "ศรี", "ทอง", "แก้ว", "ใหม่", "หลวง", "สวน", "ริมน้ำ", "ภู", "ช้าง", "มังกร", "ดาว", "บัว", "เมฆ"]
+_AREAS = ["เชียงใหม่", "ลำปาง", "ภูเก็ต", "กระบี่", "น่าน", "ระยอง", "ตราด", "เลย"]
+
+
+def _synthetic(n: int, rng: random.Random):
+    names = []
+    for i in range(n):
+        name = rng.choice(_PREFIXES) + "".join(rng.sample(_WORDS, 3)) + rng.choice(_AREAS) + str(i)
+        names.append(name)
+        yield name, 5.6 + rng.random() * 15, 97.3 + rng.random() * 8, rng.randint(0, 10000)
+        yield f"place {i} {rng.choice(_AREAS)}", 13.7, 100.5, 0
+    _synthetic.names = names
+
+
+def _queries(names, n: int, rng: random.Random):
+    kinds = {
+        "exact": lambda s: s,
+        "prefix": lambda s: s[:-1],
+        "contained": lambda s: s + "ราชวรวิหาร",
+        "fuzzy": lambda s: s[:-3] + "ก" + s[-2:],
+        "miss": lambda s: "ไม่มีในระบบ" + s[::-1],
+    }
+    return {kind: [make(rng.choice(names)) for _ in range(n // len(kinds))] for kind, make in kinds.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--places", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "gazetteer.idx")
+        t0 = time.perf_counter()
+        count = build_index(_synthetic(args.places, rng), path)
+        print(f"build: {count} keys, {os.path.getsize(path) / 1024 / 1024:.1f} MB in {time.perf_counter() - t0:.2f}s")
+
+        t0 = time.perf_counter()
+        index = Gazetteer(path)
+        print(f"open: {(time.perf_counter() - t0) * 1e3:.2f} ms")
+
+        for kind, queries in _queries(_synthetic.names, args.lookups, rng).items():
+            samples, matched = [], {}
+            for q in queries:
+                t0 = time.perf_counter()
+                hit = index.lookup(q)
+                samples.append((time.perf_counter() - t0) * 1e6)  # หน่วย µs (summarize_ms ไม่สนหน่วย)
+                label = hit.match if hit else "miss"
+                matched[label] = matched.get(label, 0) + 1
+            stats = summarize_ms(samples)
+            print(f"{kind:<10} p50={stats['p50_ms']:7.1f} µs  p95={stats['p95_ms']:7.1f} µs  matched={matched}")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
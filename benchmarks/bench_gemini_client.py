@@ -0,0 +1,67 @@
+"""เทียบ latency ต่อ request ระหว่างการสร้าง genai.Client ใหม่ทุกครั้ง กับ client กลางที่ใช้ pool ร่วมกัน
+
+ต้องมี GOOGLE_API_KEY/GEMINI_API_KEY (หรือชี้ GEMINI_BASE_URL ไปยัง server จำลอง)
+
+    python benchmarks/bench_gemini_client.py --requests 20 --model gemini-2.5-flash-lite
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from google import genai
+from google.genai import types
+
+import gemini_client
+from benchmarks.common import summarize_ms
+
+
+def _http_options():
+    return types.HttpOptions(base_url=gemini_client.GEMINI_BASE_URL) if gemini_client.GEMINI_BASE_URL else None
+
+
+def _run(label, get_client, model, n, op):
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        client = get_client()
+        if op == "count_tokens":
+            client.models.count_tokens(model=model, contents="สวัสดี")
+        else:
+            client.models.generate_content(
+                model=model,
+                contents="ตอบคำว่า ok",
+                config=types.GenerateContentConfig(thinking_config=types.ThinkingConfig(thinking_budget=0)),
+            )
+        samples.append((time.perf_counter() - t0) * 1000)
+    stats = summarize_ms(samples)
+    print(
+        f"{label:<10} n={n:<4} mean={stats['mean_ms']:8.1f} ms  "
+        f"p50={stats['p50_ms']:8.1f} ms  p95={stats['p95_ms']:8.1f} ms  "
+        f"first={samples[0]:8.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--model", default=os.getenv("GEMINI_MODEL_LOW", "gemini-2.5-flash-lite"))
+    parser.add_argument("--op", choices=["count_tokens", "generate"], default="count_tokens")
+    args = parser.parse_args()
+
+    # before: client ใหม่ทุก request (พฤติกรรมเดิมของ _call_gemini_json / plan_endpoint)
+    _run("per-call", lambda: genai.Client(http_options=_http_options()), args.model, args.requests, args.op)
+
+    # after: client กลางตัวเดียว — connection ถูก keep-alive ข้าม request
+    shared = gemini_client.create_client()
+    _run("shared", lambda: shared, args.model, args.requests, args.op)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""วัดเวลา compile/query ของ opening_hours.py และการตรวจความเป็นไปได้ทั้งแผน (assess_plan_feasibility ใน main.py)
+
+ข้อความเวลาเปิด-ปิดผสมรูปแบบไทย/อังกฤษแบบที่โมเดลตอบจริง — compile แบบ cold (ล้าง cache) เทียบกับ cached
+
+    python benchmarks/bench_opening_hours.py --queries 50000 --days 10 --stops 8 --options 3
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.common import summarize_ms
+from benchmarks.fake_upstream import FakeConfig, make_plan_response
+from opening_hours import compile_hours, is_open
+
+_SAMPLES = [
+    "Mon-Sun 10:00-18:00",
+    "Mon-Sun 10:00-18:00 (closed Wed)",
+    "ทุกวัน 08.00-17.00 น. ปิดวันจันทร์",
+    "อังคาร-อาทิตย์ 09:00-16:30",
+    "จ.-ศ. 11:00-14:00, 17:00-22:00 เสาร์-อาทิตย์ 10:00-22:00",
+    "Tue–Sun 9am-5pm; closed Mondays",
+    "Daily 18:00-02:00",
+    "เปิด 24 ชั่วโมง",
+    "Weekdays 9:30 AM – 6 PM, Weekends 10 AM - 4 PM",
+    "ปิดทุกวันพุธ 10:00-20:00",
+]
+
+
+def _bench(label, fn, args_list):
+    samples = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - t0) * 1e6)  # หน่วย µs (summarize_ms ไม่สนหน่วย)
+    stats = summarize_ms(samples)
+    print(f"{label:<16} p50={stats['p50_ms']:8.2f} µs  p95={stats['p95_ms']:8.2f} µs")
+
+
+def _cold_compile(text):
+    compile_hours.cache_clear()
+    compile_hours(text)
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--stops", type=int, default=8)
+    parser.add_argument("--options", type=int, default=3)
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    texts = [(rng.choice(_SAMPLES),) for _ in range(args.queries // 10)]
+    _bench("compile (cold)", _cold_compile, texts)
+    _bench("compile (cached)", compile_hours, texts)
+    queries = []
+    for _ in range(args.queries):
+        start = rng.randrange(6 * 60, 22 * 60)
+        queries.append((rng.choice(_SAMPLES), rng.randrange(7), (start, start + rng.choice((30, 60, 90, 120)))))
+    _bench("is_open", is_open, queries)
+
+    import main
+
+    data = make_plan_response(FakeConfig(days=args.days, stops_per_day=args.stops, hotels=3), args.options)
+    plan = main.PlanResponse(**data)
+    for i, (_, place) in enumerate(main.iter_places(plan)):
+        place.coordinates = main.Coordinates(lat=18.7 + i / 1e3, lng=98.98 + (i % 7) / 1e3)
+        place.opening_hours = _SAMPLES[i % len(_SAMPLES)]
+    n_stops = sum(len(day.stops) for option in plan.plan_output for day in option.itinerary)
+    main.assess_plan_feasibility(plan)  # warm-up
+    samples = []
+    for _ in range(args.rounds):
+        t0 = time.perf_counter()
+        main.assess_plan_feasibility(plan)
+        samples.append((time.perf_counter() - t0) * 1000)
+    stats = summarize_ms(samples)
+    print(
+        f"feasibility      {args.options} options x {args.days} days x {args.stops} stops: "
+        f"p50={stats['p50_ms']:.2f} ms ({stats['p50_ms'] * 1000 / n_stops:.1f} µs/stop)  "
+        f"difficulty={[o.feasibility.difficulty for o in plan.plan_output]}"
+    )
+
+
+if __name__ == "__main__":
+    main_()
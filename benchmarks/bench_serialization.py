@@ -0,0 +1,109 @@
+"""เทียบเวลา parse/serialize ของแผนขนาดจริง ระหว่างวิธีเดิมกับ json_io.py (pydantic-core รอบเดียว)
+
+- parse:    json.loads + schema(**dict)             vs validate_json (ข้อความจากโมเดล -> PlanResponse)
+- ndjson:   model_dump(mode="json") + json.dumps    vs dump_json ของ event ที่มี model ปน (stream/batch)
+- cache hit: PlanResponse(**cached) ผ่าน response_model vs JSONBytesResponse(cached) (วัดทั้ง endpoint ผ่าน ASGI)
+
+    python benchmarks/bench_serialization.py --days 10 --stops 8 --rounds 200
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import FastAPI
+
+from benchmarks.common import summarize_ms
+from benchmarks.fake_upstream import FakeConfig, make_plan_response
+from json_io import JSONBytesResponse, dump_json, validate_json
+
+import main
+
+
+def _enriched_plan(days: int, stops: int, options: int) -> main.PlanResponse:
+    """แผนที่เติมพิกัด/ลิงก์/รูปและ feasibility ครบแล้ว (เหมือนผลที่ /makeplan ส่งกลับ)"""
+    plan = main.assign_place_ids(main.PlanResponse(**make_plan_response(FakeConfig(days=days, stops_per_day=stops, hotels=3), options)))
+    for i, (_, place) in enumerate(main.iter_places(plan)):
+        place.coordinates = main.Coordinates(lat=18.7 + i / 1e4, lng=98.98)
+        place.google_maps_url = main.get_map_url(place.name)
+        place.image_url = [f"https://img.example/{i}/{k}.jpg" for k in range(3)]
+    return main.attach_feasibility(plan)
+
+
+def _time(fn, rounds: int) -> float:
+    fn()  # warm-up
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return summarize_ms(samples)["p50_ms"]
+
+
+async def _time_endpoint(app: FastAPI, path: str, rounds: int) -> float:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.post(path)
+        samples = []
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            (await client.post(path)).raise_for_status()
+            samples.append((time.perf_counter() - t0) * 1000)
+    return summarize_ms(samples)["p50_ms"]
+
+
+def _report(label: str, before: float, after: float) -> None:
+    print(f"  {label:<10} before={before:7.2f} ms  after={after:7.2f} ms  x{before / after:.2f}")
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--stops", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    for options in (1, 3):
+        plan = _enriched_plan(args.days, args.stops, options)
+        raw = plan.model_dump_json()
+        cached = plan.model_dump(mode="json")
+        event = {"event": "done", "data": plan}
+        print(f"{options} option(s) x {args.days} days x {args.stops} stops: {len(raw.encode()) / 1024:.0f} KiB")
+
+        assert validate_json(main.PlanResponse, raw) == main.PlanResponse(**json.loads(raw))
+        assert json.loads(dump_json(event)) == {"event": "done", "data": cached}
+        _report(
+            "parse",
+            _time(lambda: main.PlanResponse(**json.loads(raw)), args.rounds),
+            _time(lambda: validate_json(main.PlanResponse, raw), args.rounds),
+        )
+        _report(
+            "ndjson",
+            _time(lambda: json.dumps({"event": "done", "data": plan.model_dump(mode="json")}, ensure_ascii=False).encode("utf-8"), args.rounds),
+            _time(lambda: dump_json(event), args.rounds),
+        )
+
+        app = FastAPI()
+
+        @app.post("/legacy", response_model=main.PlanResponse)
+        async def legacy():
+            return main.PlanResponse(**cached)
+
+        @app.post("/direct", response_model=main.PlanResponse)
+        async def direct():
+            return JSONBytesResponse(cached)
+
+        _report(
+            "cache hit",
+            asyncio.run(_time_endpoint(app, "/legacy", args.rounds)),
+            asyncio.run(_time_endpoint(app, "/direct", args.rounds)),
+        )
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,21 @@
+"""ฟังก์ชันสถิติที่ใช้ร่วมกันในสคริปต์ benchmark"""
+
+import statistics
+from typing import Dict, Sequence
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize_ms(samples_ms: Sequence[float]) -> Dict[str, float]:
+    return {
+        "mean_ms": round(statistics.mean(samples_ms), 2) if samples_ms else 0.0,
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p95_ms": round(percentile(samples_ms, 95), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+    }
@@ -0,0 +1,201 @@
+"""Server จำลอง Gemini + Google Custom Search + Google Maps สำหรับ benchmark แบบ offline
+
+ตอบ JSON สำเร็จรูปตามชนิดของคำขอ (intent / research / PlanResponse / DayPatch / CombinedOut)
+พร้อมตั้ง latency และอัตรา error ได้ — ไม่มีการเรียกเครือข่ายภายนอกเลย
+
+    python benchmarks/fake_upstream.py --port 8900 --gemini-latency 0.8 --gemini-error-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+
+
+@dataclass
+class FakeConfig:
+    gemini_latency: float = 0.5       # วินาที (ค่าเฉลี่ย)
+    gemini_jitter: float = 0.2        # สัดส่วนความแกว่งของ latency (0.2 = ±20%)
+    gemini_error_rate: float = 0.0    # โอกาสตอบ 429/503
+    gemini_sec_per_kb: float = 0.0    # latency เพิ่มต่อ KB ของคำตอบ (จำลองเวลาสร้าง output token)
+    google_latency: float = 0.1
+    google_error_rate: float = 0.0
+    days: int = 3
+    stops_per_day: int = 4
+    hotels: int = 2
+
+
+_OPTIONS_RE = re.compile(r"options\)?: (\d)")
+_PATCH_DAYS_RE = re.compile(r"\((\d[\d, ]*)\) ---")
+_PLACE_NAMES = ["วัดพระธาตุดอยสุเทพ", "ถนนคนเดินท่าแพ", "วัดเจดีย์หลวง", "นิมมานเหมินท์", "ดอยอินทนนท์",
+                "ตลาดวโรรส", "ม่อนแจ่ม", "ร้านข้าวซอยแม่มณี", "คาเฟ่ริมปิง", "พิพิธภัณฑ์ล้านนา"]
+
+
+def _place(name: str, type_: str = "attraction") -> Dict[str, Any]:
+    return {
+        "type": type_,
+        "name": name,
+        "short_description": f"{name} จุดเด่นยอดนิยมของเมือง เหมาะกับการถ่ายรูปและเดินเล่น",
+        "notes": "เดินทางด้วยรถแดงจากจุดก่อนหน้าประมาณ 15 นาที",
+        "opening_hours": "Mon-Sun 08:00-18:00",
+        "price_info": "ฟรี",
+        "reservation_recommended": False,
+        "coordinates": None,
+        "google_maps_url": None,
+        "image_url": None,
+        "isnewplan": "new_plan",
+        "des_warnings": None,
+    }
+
+
+def make_plan_response(cfg: FakeConfig, options: int) -> Dict[str, Any]:
+    """PlanResponse สำเร็จรูป ขนาดตาม days/stops_per_day/hotels"""
+    plans: List[Dict[str, Any]] = []
+    hotels: List[List[Dict[str, Any]]] = []
+    for o in range(options):
+        itinerary = []
+        for d in range(cfg.days):
+            stops = [
+                {
+                    "order_in_day": s + 1,
+                    "places": _place(f"{_PLACE_NAMES[(d * cfg.stops_per_day + s) % len(_PLACE_NAMES)]} {o}-{d}-{s}"),
+                    "start_time": f"{9 + s * 2:02d}:00",
+                    "stay_duration": 90,
+                }
+                for s in range(cfg.stops_per_day)
+            ]
+            itinerary.append({"day_index": d + 1, "summary": f"วันที่ {d + 1} ย่านเมืองเก่า", "stops": stops})
+        plans.append({
+            "name": f"ทริปเชียงใหม่ ตัวเลือก {o + 1}",
+            "overview": "เที่ยววัด คาเฟ่ และตลาดท้องถิ่น เหมาะกับสายชิล",
+            "budget_price": 8500.0,
+            "style": "leisure",
+            "itinerary": itinerary,
+            "warnings": ["เวลาเปิดปิดอาจเปลี่ยนแปลงตามฤดูกาล"],
+        })
+        hotels.append([_place(f"โรงแรมตัวอย่าง {o}-{h}", "hotel") for h in range(cfg.hotels)])
+    return {"status": "success", "description": "สร้างแผนสำเร็จ", "plan_output": plans, "hotel_output": hotels}
+
+
+def make_combined_out() -> Dict[str, Any]:
+    return {
+        "intent": "TASK_PLANNING",
+        "confidence": 0.92,
+        "reason": "ผู้ใช้ขอให้วางแผนงานพร้อมกรอบเวลา",
+        "plan": {
+            "task_name": "เตรียมพรีเซนต์ยอดขายประจำสัปดาห์",
+            "start_date": "2026-01-05",
+            "end_date": "2026-01-09",
+            "priority": "High",
+            "subtasks": [
+                {"name": "รวบรวมข้อมูลยอดขาย", "description": "ดึงรายงานจาก ERP และไฟล์ Excel"},
+                {"name": "จัดทำสไลด์", "description": "ออกแบบโครงสไลด์และใส่กราฟ"},
+                {"name": "ซ้อมนำเสนอ", "description": "ซ้อมพูดตามสไลด์และจับเวลา"},
+            ],
+        },
+    }
+
+
+RESEARCH_TEXT = "[สถานที่ท่องเที่ยว]\n" + "\n".join(f"- {n} | 08:00-18:00 | ฟรี | จุดเด่น | -" for n in _PLACE_NAMES)
+
+
+def _gemini_payload(cfg: FakeConfig, body: str) -> str:
+    """เลือกคำตอบตามชนิดคำขอ: research (มี googleSearch tool) / CombinedOut / PlanResponse / intent"""
+    if "googleSearch" in body or "google_search" in body:
+        return RESEARCH_TEXT
+    if '"confidence"' in body:
+        return json.dumps(make_combined_out(), ensure_ascii=False)
+    if "DayPatch" in body:
+        m = _PATCH_DAYS_RE.search(body)
+        days = {int(d) for d in m.group(1).split(",")} if m else {1}
+        itinerary = make_plan_response(cfg, 1)["plan_output"][0]["itinerary"]
+        patch = {"status": "success", "description": "แก้ไขเฉพาะวันที่ระบุ", "itinerary": [d for d in itinerary if d["day_index"] in days]}
+        return json.dumps(patch, ensure_ascii=False)
+    if "plan_output" in body:
+        m = _OPTIONS_RE.search(body)
+        options = int(m.group(1)) if m else 1
+        return json.dumps(make_plan_response(cfg, options), ensure_ascii=False)
+    return json.dumps({"intent": "travel_reasonable", "description": "คำขอวางแผนท่องเที่ยวที่ทำได้จริง"}, ensure_ascii=False)
+
+
+def _candidate(text: str) -> Dict[str, Any]:
+    return {
+        "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 100, "candidatesTokenCount": len(text) // 4},
+    }
+
+
+async def _delay(mean: float, jitter: float) -> None:
+    if mean > 0:
+        await asyncio.sleep(max(0.0, random.uniform(mean * (1 - jitter), mean * (1 + jitter))))
+
+
+def create_app(cfg: FakeConfig) -> FastAPI:
+    app = FastAPI(title="Fake Gemini/Google upstream")
+
+    @app.post("/{api_version}/models/{model_action}")
+    async def generate(api_version: str, model_action: str, request: Request):
+        body = (await request.body()).decode("utf-8")
+        text = _gemini_payload(cfg, body)
+        await _delay(cfg.gemini_latency + cfg.gemini_sec_per_kb * len(text.encode("utf-8")) / 1024, cfg.gemini_jitter)
+        if random.random() < cfg.gemini_error_rate:
+            code = random.choice([429, 503])
+            status = "RESOURCE_EXHAUSTED" if code == 429 else "UNAVAILABLE"
+            return JSONResponse({"error": {"code": code, "message": "fake overload", "status": status}}, status_code=code)
+
+        if "streamGenerateContent" in model_action:
+            async def sse():
+                step = max(1, len(text) // 8)
+                for i in range(0, len(text), step):
+                    yield f"data: {json.dumps(_candidate(text[i:i + step]), ensure_ascii=False)}\r\n\r\n"
+                    await asyncio.sleep(0)
+            return StreamingResponse(sse(), media_type="text/event-stream")
+        return JSONResponse(_candidate(text))
+
+    @app.get("/customsearch/v1")
+    async def custom_search(q: str = ""):
+        await _delay(cfg.google_latency, 0.3)
+        if random.random() < cfg.google_error_rate:
+            return JSONResponse({"error": {"code": 429, "message": "fake quota"}}, status_code=429)
+        return {"items": [{"link": f"https://img.example/{i}.jpg?q={len(q)}"} for i in range(3)]}
+
+    @app.get("/maps/search/")
+    async def maps_search(query: str = ""):
+        await _delay(cfg.google_latency, 0.3)
+        if random.random() < cfg.google_error_rate:
+            return PlainTextResponse("blocked", status_code=429)
+        lat = 18.7 + (hash(query) % 1000) / 10000
+        return PlainTextResponse(f'<a href="/maps/preview?center={lat:.5f}%2C98.98&zoom=15">redirect</a>', status_code=302)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--gemini-latency", type=float, default=FakeConfig.gemini_latency)
+    parser.add_argument("--gemini-error-rate", type=float, default=FakeConfig.gemini_error_rate)
+    parser.add_argument("--gemini-sec-per-kb", type=float, default=FakeConfig.gemini_sec_per_kb)
+    parser.add_argument("--google-latency", type=float, default=FakeConfig.google_latency)
+    parser.add_argument("--google-error-rate", type=float, default=FakeConfig.google_error_rate)
+    args = parser.parse_args()
+    cfg = FakeConfig(
+        gemini_latency=args.gemini_latency,
+        gemini_error_rate=args.gemini_error_rate,
+        gemini_sec_per_kb=args.gemini_sec_per_kb,
+        google_latency=args.google_latency,
+        google_error_rate=args.google_error_rate,
+    )
+    uvicorn.run(create_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""Load test แบบ offline: รัน main.app / api.app ใน process เดียวกัน ชี้ไปยัง server จำลอง (fake_upstream)
+
+ไม่ใช้ quota จริงและไม่ต้องต่อเครือข่ายภายนอก — รายงาน throughput, p50/p95/p99 และหน่วยความจำต่อ endpoint
+
+    python benchmarks/loadtest.py --endpoints makeplan,plan --requests 200 --concurrency 20
+    python benchmarks/loadtest.py --json --max-p95-ms 3000          # สำหรับ CI (exit 1 ถ้า p95 เกิน)
+
+ค่าเริ่มต้นปิด cache ทุกชั้น (TTL=0) เพื่อวัด path เต็ม ใช้ --warm-cache ถ้าต้องการวัดกรณี cache hit
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+
+from benchmarks.common import summarize_ms
+from benchmarks.fake_upstream import FakeConfig, create_app, make_plan_response
+
+ENDPOINTS = ("makeplan", "makeplan_stream", "changeplan", "changeplan_full", "plan")
+
+MAKEPLAN_INPUTS = [
+    "วางแผนเที่ยวเชียงใหม่ 3 วัน 2 คืน เน้นคาเฟ่",
+    "อยากไปทะเลที่จันทบุรี 2 วัน กับครอบครัว",
+    "ทริปสายบุญ อยุธยา 1 วัน",
+    "เที่ยวภูเก็ต 4 วัน 3 คืน งบไม่เกิน 15000",
+]
+PLAN_INPUTS = [
+    "ช่วยสร้าง to-do list สำหรับการเตรียมพรีเซนต์ยอดขายประจำสัปดาห์ จะพรีเซนต์วันศุกร์นี้",
+    "วางแผนย้ายบ้านภายในสองสัปดาห์ แบ่งงานเป็นขั้นตอน",
+    "เตรียมสอบ TOEIC ภายใน 1 เดือน",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _configure_env(base: str, warm_cache: bool) -> None:
+    """ต้องตั้งก่อน import main/api เพราะทั้งสองอ่าน env ตอน import"""
+    env = {
+        "GEMINI_BASE_URL": base,
+        "GOOGLE_API_KEY": "fake-key",
+        "GEMINI_MODEL": "fake-model",
+        "GOOGLE_CLOUD_API_KEY": "fake-key",
+        "CX_ID": "fake-cx",
+        "GOOGLE_CUSTOMSEARCH_URL": f"{base}/customsearch/v1",
+        "GOOGLE_MAPS_LOOKUP_URL": f"{base}/maps/search/",
+        "CACHE_DB_PATH": "",
+        "JOBS_DB_PATH": "",
+        "LOG_LEVEL": "WARNING",
+    }
+    if not warm_cache:
+        for name in ("PLACE_CACHE_TTL", "RESEARCH_CACHE_TTL", "RESPONSE_CACHE_TTL"):
+            env[name] = "0"
+    os.environ.update(env)
+
+
+class _FakeServer:
+    """uvicorn ใน thread แยก เพื่อไม่ให้แย่ง event loop กับแอปที่ถูกวัด"""
+
+    def __init__(self, cfg: FakeConfig, port: int):
+        config = uvicorn.Config(create_app(cfg), host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        deadline = time.time() + 10
+        while not self.server.started:
+            if time.time() > deadline:
+                raise RuntimeError("fake upstream did not start")
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _requests_for(endpoint: str, cfg: FakeConfig) -> Callable[[int], Dict[str, Any]]:
+    """คืนฟังก์ชัน i -> kwargs ของ httpx request สำหรับ endpoint นั้น"""
+    if endpoint == "makeplan":
+        return lambda i: {"method": "POST", "url": "/makeplan",
+                          "json": {"input": MAKEPLAN_INPUTS[i % len(MAKEPLAN_INPUTS)], "options": 1 + i % 2}}
+    if endpoint == "makeplan_stream":
+        return lambda i: {"method": "POST", "url": "/makeplan/stream",
+                          "json": {"input": MAKEPLAN_INPUTS[i % len(MAKEPLAN_INPUTS)], "options": 1}}
+    if endpoint in ("changeplan", "changeplan_full"):
+        # changeplan = คำสั่งระบุวัน (สร้างใหม่เฉพาะวันนั้น), changeplan_full = auto-fix (สร้างใหม่ทั้งแผน)
+        olddata = json.dumps(make_plan_response(cfg, 1), ensure_ascii=False)
+        instruction = "เปลี่ยนวันที่ 2 เป็นเที่ยวตลาด" if endpoint == "changeplan" else None
+        return lambda i: {"method": "POST", "url": "/changeplan", "json": {"input": instruction, "olddata": olddata}}
+    if endpoint == "plan":
+        return lambda i: {"method": "POST", "url": "/plan",
+                          "json": {"input": PLAN_INPUTS[i % len(PLAN_INPUTS)], "target_language": "th"}}
+    raise ValueError(endpoint)
+
+
+def _response_error(endpoint: str, resp: httpx.Response) -> str:
+    """คืน label ของ error ("" = สำเร็จ) — นับ status="error" ใน body และ stream ที่ไม่จบด้วย done ด้วย"""
+    if resp.status_code != 200:
+        return str(resp.status_code)
+    if endpoint == "makeplan_stream":
+        lines = resp.text.strip().splitlines()
+        return "" if lines and json.loads(lines[-1]).get("event") == "done" else "stream_error"
+    if endpoint in ("makeplan", "changeplan", "changeplan_full") and resp.json().get("status") != "success":
+        return "status_error"
+    return ""
+
+
+async def _run_endpoint(app, endpoint: str, cfg: FakeConfig, n: int, concurrency: int) -> Dict[str, Any]:
+    make = _requests_for(endpoint, cfg)
+    samples: List[float] = []
+    errors: Dict[str, int] = {}
+    sem = asyncio.Semaphore(concurrency)
+    rss_before = _peak_rss_mb()
+
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+
+            async def one(i: int) -> None:
+                async with sem:
+                    t0 = time.perf_counter()
+                    try:
+                        resp = await client.request(**make(i))
+                        error = _response_error(endpoint, resp)
+                        if error:
+                            errors[error] = errors.get(error, 0) + 1
+                    except Exception as e:
+                        errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    samples.append((time.perf_counter() - t0) * 1000)
+
+            t_start = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(n)))
+            elapsed = time.perf_counter() - t_start
+
+    return {
+        "endpoint": endpoint,
+        "requests": n,
+        "concurrency": concurrency,
+        "throughput_rps": n / elapsed if elapsed > 0 else 0.0,
+        **summarize_ms(samples),
+        "errors": errors,
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_delta_mb": _peak_rss_mb() - rss_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"คั่นด้วย comma จาก {', '.join(ENDPOINTS)}")
+    parser.add_argument("--requests", type=int, default=50, help="จำนวน request ต่อ endpoint")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--gemini-latency", type=float, default=0.2)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--gemini-sec-per-kb", type=float, default=0.0, help="latency เพิ่มต่อ KB ของคำตอบโมเดล")
+    parser.add_argument("--google-latency", type=float, default=0.05)
+    parser.add_argument("--google-error-rate", type=float, default=0.0)
+    parser.add_argument("--warm-cache", action="store_true", help="เปิด cache ตาม config ปกติ (ค่าเริ่มต้นปิดทุกชั้น)")
+    parser.add_argument("--json", action="store_true", help="พิมพ์ผลเป็น JSON (สำหรับ CI)")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="exit 1 ถ้า p95 ของ endpoint ใดเกินค่านี้")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = [e for e in endpoints if e not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+
+    cfg = FakeConfig(
+        gemini_latency=args.gemini_latency,
+        gemini_error_rate=args.gemini_error_rate,
+        gemini_sec_per_kb=args.gemini_sec_per_kb,
+        google_latency=args.google_latency,
+        google_error_rate=args.google_error_rate,
+    )
+    port = _free_port()
+    _configure_env(f"http://127.0.0.1:{port}", args.warm_cache)
+
+    import api
+    import main as planner
+
+    results = []
+    with _FakeServer(cfg, port):
+        for endpoint in endpoints:
+            app = api.app if endpoint == "plan" else planner.app
+            results.append(asyncio.run(_run_endpoint(app, endpoint, cfg, args.requests, args.concurrency)))
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for r in results:
+            print(
+                f"{r['endpoint']:<16} n={r['requests']:<5} c={r['concurrency']:<4} "
+                f"rps={r['throughput_rps']:7.1f}  p50={r['p50_ms']:8.1f}  p95={r['p95_ms']:8.1f}  "
+                f"p99={r['p99_ms']:8.1f} ms  errors={sum(r['errors'].values())}  "
+                f"rss={r['peak_rss_mb']:.0f} MB (+{r['peak_rss_delta_mb']:.1f})"
+            )
+
+    if args.max_p95_ms is not None:
+        slow = [r["endpoint"] for r in results if r["p95_ms"] > args.max_p95_ms]
+        if slow:
+            print(f"p95 เกิน {args.max_p95_ms} ms: {', '.join(slow)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Circuit breaker ต่อปลายทาง: ล้มติดกันครบ N ครั้ง -> เปิดวงจร (ตอบ fallback ทันที) แล้วค่อย probe ทีละครั้ง
+
+closed -> (ล้มครบ failure_threshold) -> open -> (ครบ reset_timeout) -> half_open
+half_open: ปล่อย probe ได้ครั้งละหนึ่ง request ต่อ reset_timeout — สำเร็จ = closed, ล้ม = open ใหม่
+"""
+
+import time
+from typing import Any, Callable, Dict, Optional
+
+from metrics import BREAKER_SHORT_CIRCUITS, BREAKER_STATE
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,  # เปลี่ยนได้ในเทสต์
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_at = 0.0
+        self._clock = clock
+        BREAKER_STATE.labels(name).set(0)
+
+    def allow(self) -> bool:
+        """ควรเรียกปลายทางจริงหรือไม่ (False = ใช้ค่า fallback ทันที)"""
+        now = self._clock()
+        if self.state == OPEN and now - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+            self._probe_at = now
+            return True
+        if self.state == HALF_OPEN and now - self._probe_at >= self.reset_timeout:
+            # probe ก่อนหน้าไม่รายงานผล (เช่น ถูกยกเลิก) — ปล่อย probe ใหม่
+            self._probe_at = now
+            return True
+        if self.state == CLOSED:
+            return True
+        BREAKER_SHORT_CIRCUITS.labels(self.name).inc()
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+            self._set_state(OPEN)
+
+    def record(self, failed: bool) -> None:
+        self.record_failure() if failed else self.record_success()
+
+    def stats(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == OPEN:
+            retry_in = round(max(0.0, self.reset_timeout - (self._clock() - self.opened_at)), 1)
+        return {"state": self.state, "failures": self.failures, "retry_in_s": retry_in}
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        BREAKER_STATE.labels(self.name).set(_STATE_VALUE[state])
@@ -0,0 +1,328 @@
+"""Gazetteer แบบ offline: ชื่อสถานที่ในไทย (ไทย + อังกฤษ + alias) -> พิกัด จากไฟล์ index ที่ memory-map
+
+ใช้แทนการ scrape หน้า redirect ของ Google Maps สำหรับสถานที่ที่รู้จักอยู่แล้ว — lookup ระดับไมโครวินาที
+ไม่มี request ออกเครือข่าย index เป็นไฟล์เดียวที่ทุก worker map หน้าเดียวกันร่วมกันได้
+
+สร้าง index จาก GeoNames (เช่น TH.txt จาก https://download.geonames.org/export/dump/) หรือ CSV ของเราเอง
+(คอลัมน์ name,lat,lng และ aliases คั่นด้วย "|" / rank ไม่บังคับ):
+
+    python gazetteer.py build TH.txt --out gazetteer.idx
+    python gazetteer.py build places.csv extra.csv --out gazetteer.idx
+    python gazetteer.py lookup gazetteer.idx "วัดพระธาตุดอยสุเทพ"
+
+รูปแบบไฟล์ (little-endian): header 16 ไบต์ | lat float64[N] | lng float64[N] | rank uint32[N]
+| offsets uint32[N+1] | keys (UTF-8 เรียงตาม byte) — key คือชื่อที่ผ่าน gazetteer_key แล้ว
+บิตบนสุดของ rank = key กำกวม (ชื่อซ้ำหลายสถานที่ที่อยู่ห่างกันเกิน SAME_PLACE_DEGREES เช่น "วัดใหม่"
+หรือ "วัดเจดีย์หลวง" ที่มีหลายจังหวัด) — lookup ไม่ตอบพิกัดของ key เหล่านี้ ให้ไปหาจากแหล่งอื่นแทน
+"""
+
+import argparse
+import bisect
+import csv
+import difflib
+import mmap
+import os
+import struct
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from textnorm import normalize_name
+
+_MAGIC = b"GAZ1"
+_HEADER = struct.Struct("<4sIII")  # magic, count, keys_size, reserved
+
+# จับคู่แบบหลวมเฉพาะชื่อที่ยาวพอ ("วัด", "cafe" จะไปโดนสถานที่อื่นทั้งประเทศ)
+MIN_PREFIX_CHARS = 5
+MIN_CONTAINED_RATIO = 0.6  # key ที่เป็นต้นของชื่อที่ค้น ต้องยาวอย่างน้อยเท่านี้ของชื่อ
+SAME_PLACE_DEGREES = 0.01  # ~1 กม. — ผู้สมัคร prefix ที่อยู่ห่างกันเกินนี้ถือว่าคนละสถานที่
+AMBIGUOUS_FLAG = 0x80000000
+RANK_MASK = AMBIGUOUS_FLAG - 1
+FUZZY_CUTOFF = 0.88
+FUZZY_MAX_CANDIDATES = 512
+
+
+def gazetteer_key(name: str) -> str:
+    """normalize_name แล้วตัดช่องว่าง/เครื่องหมายวรรคตอน/สัญลักษณ์ทิ้ง
+
+    ตัดตามหมวด Unicode (ไม่ใช้ \\W เพราะสระ/วรรณยุกต์ไทยเป็นหมวด Mn ซึ่ง \\W ถือว่าไม่ใช่ตัวอักษร)
+    เช่น "Wat Phra Kaew" / "wat-phra-kaew" -> "watphrakaew"
+    """
+    return "".join(ch for ch in normalize_name(name) if unicodedata.category(ch)[0] not in "PZSC")
+
+
+def _query_variants(name: str) -> List[str]:
+    """ชื่อจากโมเดลมักมีวงเล็บ เช่น "วัดพระธาตุดอยสุเทพ (Wat Phra That Doi Suthep)" — ลองทั้งชื่อเต็ม นอก และในวงเล็บ"""
+    variants = [name]
+    if "(" in name:
+        outside, _, rest = name.partition("(")
+        inside = rest.split(")", 1)[0]
+        variants += [outside, inside]
+    keys: List[str] = []
+    for variant in variants:
+        key = gazetteer_key(variant)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+@dataclass(frozen=True)
+class GazetteerHit:
+    key: str
+    lat: float
+    lng: float
+    match: str  # exact / prefix / contained / fuzzy
+
+
+class _Keys(Sequence):
+    """มองส่วน keys ของไฟล์เป็น list ของ bytes ที่เรียงแล้ว (ให้ bisect ใช้ได้โดยไม่ต้อง decode ทั้งไฟล์)"""
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes()
+
+
+class Gazetteer:
+    """index ที่เปิดแบบ read-only ผ่าน mmap — ใช้ร่วมกันได้ทุก request (ไม่มี state ที่เปลี่ยน)"""
+
+    def __init__(self, path: str):
+        if sys.byteorder != "little":
+            raise ValueError("gazetteer index is little-endian only")
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, keys_size, _ = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            raise ValueError(f"{path}: not a gazetteer index")
+        view = memoryview(self._mm)
+        pos = _HEADER.size
+        self._lat = view[pos:pos + 8 * count].cast("d")
+        pos += 8 * count
+        self._lng = view[pos:pos + 8 * count].cast("d")
+        pos += 8 * count
+        self._rank = view[pos:pos + 4 * count].cast("I")
+        pos += 4 * count
+        offsets = view[pos:pos + 4 * (count + 1)].cast("I")
+        pos += 4 * (count + 1)
+        self._keys = _Keys(view[pos:pos + keys_size], offsets)
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._lat = self._lng = self._rank = self._keys = None
+        self._mm.close()
+
+    def _hit(self, i: int, match: str) -> GazetteerHit:
+        return GazetteerHit(self._keys[i].decode("utf-8"), self._lat[i], self._lng[i], match)
+
+    def _ambiguous(self, i: int) -> bool:
+        return bool(self._rank[i] & AMBIGUOUS_FLAG)
+
+    def _rank_of(self, i: int) -> int:
+        return self._rank[i] & RANK_MASK
+
+    def _near(self, i: int, j: int) -> bool:
+        return abs(self._lat[i] - self._lat[j]) <= SAME_PLACE_DEGREES and abs(self._lng[i] - self._lng[j]) <= SAME_PLACE_DEGREES
+
+    def _find(self, key: bytes) -> Optional[int]:
+        i = bisect.bisect_left(self._keys, key)
+        return i if i < self.count and self._keys[i] == key else None
+
+    def _prefix_range(self, prefix: bytes, limit: int) -> Iterator[int]:
+        i = bisect.bisect_left(self._keys, prefix)
+        end = min(self.count, i + limit)
+        while i < end and self._keys[i].startswith(prefix):
+            yield i
+            i += 1
+
+    def lookup(self, name: str, fuzzy: bool = True) -> Optional[GazetteerHit]:
+        """exact -> prefix (ชื่อที่ค้นเป็นต้นของ key, เลือก rank สูงสุด) -> contained (key เป็นต้นของชื่อที่ค้น) -> fuzzy
+
+        key กำกวม (ชื่อซ้ำหลายสถานที่) ไม่ตอบ — ชื่อที่ตรงกับ key กำกวมพอดีคืน None ทันทีโดยไม่ลองแบบหลวม
+        """
+        keys = _query_variants(name)
+        encoded = [k.encode("utf-8") for k in keys]
+        ambiguous = False
+        for key in encoded:
+            i = self._find(key)
+            if i is not None:
+                if not self._ambiguous(i):
+                    return self._hit(i, "exact")
+                ambiguous = True
+        if ambiguous:
+            return None
+
+        for text, key in zip(keys, encoded):
+            if len(text) < MIN_PREFIX_CHARS:
+                continue
+            # ชื่อสั้นกว่าใน index เช่น "วัดพระธาตุดอยสุเทพ" -> "วัดพระธาตุดอยสุเทพราชวรวิหาร"
+            # ชื่อกว้าง ๆ อย่าง "ถนนคนเดิน" ที่ขึ้นต้นหลายสถานที่คนละพื้นที่ถือว่ากำกวม ไม่ตอบ
+            longest = len(text) / MIN_CONTAINED_RATIO
+            candidates = [j for j in self._prefix_range(key, FUZZY_MAX_CANDIDATES) if len(self._keys[j].decode("utf-8")) <= longest]
+            if candidates and not any(self._ambiguous(j) for j in candidates):
+                best = max(candidates, key=self._rank_of)
+                if all(self._near(best, j) for j in candidates):
+                    return self._hit(best, "prefix")
+
+        for text in keys:
+            # ชื่อยาวกว่าใน index เช่น "วัดพระธาตุดอยสุเทพราชวรวิหาร" -> "วัดพระธาตุดอยสุเทพ"
+            shortest = max(MIN_PREFIX_CHARS, int(len(text) * MIN_CONTAINED_RATIO + 0.999))
+            for n in range(len(text) - 1, shortest - 1, -1):
+                i = self._find(text[:n].encode("utf-8"))
+                if i is not None:
+                    return None if self._ambiguous(i) else self._hit(i, "contained")
+
+        if not fuzzy:
+            return None
+        for text in keys:
+            if len(text) < MIN_PREFIX_CHARS:
+                continue
+            # ผู้สมัครคือ key ที่ขึ้นต้นเหมือนครึ่งแรกของชื่อ — จับคำสะกดผิด/ต่างช่วงท้ายได้โดยไม่ต้องไล่ทั้ง index
+            head = text[:max(3, len(text) // 2)].encode("utf-8")
+            matcher = difflib.SequenceMatcher(autojunk=False)
+            matcher.set_seq2(text)
+            best_i, best_score = None, FUZZY_CUTOFF
+            for i in self._prefix_range(head, FUZZY_MAX_CANDIDATES):
+                if self._ambiguous(i):
+                    continue
+                matcher.set_seq1(self._keys[i].decode("utf-8"))
+                if matcher.real_quick_ratio() < best_score or matcher.quick_ratio() < best_score:
+                    continue
+                score = matcher.ratio()
+                if score > best_score or (score == best_score and best_i is not None and self._rank_of(i) > self._rank_of(best_i)):
+                    best_i, best_score = i, score
+            if best_i is not None:
+                return self._hit(best_i, "fuzzy")
+        return None
+
+
+def open_index(path: Optional[str]) -> Optional[Gazetteer]:
+    """เปิด index ถ้ามีไฟล์ — ไม่มี path/ไฟล์ = ปิดใช้งาน (คืน None)"""
+    if not path or not os.path.exists(path):
+        return None
+    return Gazetteer(path)
+
+
+# ---------------------------------------------------------------------------- build
+Entry = Tuple[str, float, float, int]  # (ชื่อ, lat, lng, rank)
+
+# GeoNames: geonameid, name, asciiname, alternatenames, latitude, longitude, feature class, feature code,
+# country code, cc2, admin1..4, population, elevation, dem, timezone, modification date
+_GEONAMES_COLUMNS = 19
+
+
+def read_geonames(path: str) -> Iterator[Entry]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < _GEONAMES_COLUMNS:
+                continue
+            try:
+                lat, lng = float(cols[4]), float(cols[5])
+            except ValueError:
+                continue
+            rank = int(cols[14]) if cols[14].isdigit() else 0
+            for name in [cols[1], cols[2], *cols[3].split(",")]:
+                if name:
+                    yield name, lat, lng, rank
+
+
+def read_csv(path: str) -> Iterator[Entry]:
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                lat, lng = float(row["lat"]), float(row["lng"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            rank = max(0, int(row.get("rank") or 0))
+            for name in [row.get("name") or "", *(row.get("aliases") or "").split("|")]:
+                if name.strip():
+                    yield name, lat, lng, rank
+
+
+def read_source(path: str) -> Iterator[Entry]:
+    return read_csv(path) if path.lower().endswith(".csv") else read_geonames(path)
+
+
+def build_index(entries: Iterable[Entry], out_path: str) -> int:
+    """เขียน index จาก (ชื่อ, lat, lng, rank) — key ซ้ำเก็บตัวที่ rank สูงสุด (เสมอกันเก็บตัวแรก) คืนจำนวน key
+
+    key ที่ผู้สมัครอยู่ห่างกันเกิน SAME_PLACE_DEGREES (ชื่อเดียวกันคนละสถานที่) ถูกตั้ง AMBIGUOUS_FLAG
+    """
+    best: Dict[bytes, Tuple[float, float, int]] = {}
+    spots: Dict[bytes, List[Tuple[float, float]]] = {}  # พิกัดที่ต่างกันของแต่ละ key (ทิ้งเมื่อรู้แล้วว่ากำกวม)
+    ambiguous = set()
+    for name, lat, lng, rank in entries:
+        key = gazetteer_key(name).encode("utf-8")
+        if not key or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            continue
+        rank = min(max(0, rank), RANK_MASK)
+        current = best.get(key)
+        if current is None or rank > current[2]:
+            best[key] = (lat, lng, rank)
+        if key in ambiguous:
+            continue
+        seen = spots.setdefault(key, [])
+        if any(abs(lat - a) > SAME_PLACE_DEGREES or abs(lng - b) > SAME_PLACE_DEGREES for a, b in seen):
+            ambiguous.add(key)
+            del spots[key]
+        elif (lat, lng) not in seen:
+            seen.append((lat, lng))
+
+    keys = sorted(best)
+    count = len(keys)
+    offsets = [0]
+    for key in keys:
+        offsets.append(offsets[-1] + len(key))
+    blob = b"".join(keys)
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, count, len(blob), 0))
+        f.write(struct.pack(f"<{count}d", *(best[k][0] for k in keys)))
+        f.write(struct.pack(f"<{count}d", *(best[k][1] for k in keys)))
+        f.write(struct.pack(f"<{count}I", *(best[k][2] | (AMBIGUOUS_FLAG if k in ambiguous else 0) for k in keys)))
+        f.write(struct.pack(f"<{count + 1}I", *offsets))
+        f.write(blob)
+    os.replace(tmp_path, out_path)  # worker ที่ map ไฟล์เก่าอยู่ยังอ่านต่อได้จนกว่าจะเปิดใหม่
+    return count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="สร้าง index จากไฟล์ GeoNames (.txt) และ/หรือ CSV")
+    build.add_argument("sources", nargs="+")
+    build.add_argument("--out", default="gazetteer.idx")
+    lookup = sub.add_parser("lookup", help="ทดสอบค้นชื่อใน index")
+    lookup.add_argument("index")
+    lookup.add_argument("names", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        t0 = time.perf_counter()
+        count = build_index((e for path in args.sources for e in read_source(path)), args.out)
+        size = os.path.getsize(args.out) / (1024 * 1024)
+        print(f"{args.out}: {count} keys, {size:.1f} MB in {time.perf_counter() - t0:.1f}s")
+        return
+
+    index = Gazetteer(args.index)
+    for name in args.names:
+        t0 = time.perf_counter()
+        hit = index.lookup(name)
+        elapsed_us = (time.perf_counter() - t0) * 1e6
+        print(f"{name}: {hit.match} {hit.key} {hit.lat:.6f},{hit.lng:.6f}" if hit else f"{name}: miss", f"({elapsed_us:.0f} µs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Gemini client กลางที่ใช้ร่วมกันทั้ง process
+
+สร้าง genai.Client ครั้งเดียว (ใน lifespan ของแอป) แล้วใช้ซ้ำทุก request
+เพื่อให้ connection pool / keep-alive ของ httpx ทำงาน ไม่ต้อง handshake TLS ใหม่ทุกครั้ง
+"""
+
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+from google import genai
+from google.genai import types
+
+from metrics import outbound_call
+from retry_policy import LatencyWindow, RetryPolicy, hedged, retry_call
+from upstream_limiter import AdaptiveLimiter, UpstreamOverloaded, is_overload_error
+
+logger = logging.getLogger("gemini_client")
+
+GEMINI_HTTP_TIMEOUT: float = float(os.getenv("GEMINI_HTTP_TIMEOUT", "120"))  # วินาที ต่อ request
+GEMINI_POOL_MAX_CONNECTIONS: int = int(os.getenv("GEMINI_POOL_MAX_CONNECTIONS", "32"))
+GEMINI_POOL_MAX_KEEPALIVE: int = int(os.getenv("GEMINI_POOL_MAX_KEEPALIVE", "16"))
+GEMINI_KEEPALIVE_EXPIRY: float = float(os.getenv("GEMINI_KEEPALIVE_EXPIRY", "60"))
+GEMINI_BASE_URL: Optional[str] = os.getenv("GEMINI_BASE_URL") or None  # override endpoint (เช่น proxy/server จำลอง)
+
+# limiter ต่อโมเดล (ต่อ process): หน้าต่าง concurrency สูงสุด, คิวรอ, เวลารอคิวสูงสุด, โควตาต่อนาที (0 = ไม่จำกัด)
+GEMINI_MAX_CONCURRENCY: int = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_QUEUE: int = int(os.getenv("GEMINI_MAX_QUEUE", "32"))
+GEMINI_QUEUE_TIMEOUT: float = float(os.getenv("GEMINI_QUEUE_TIMEOUT", "30"))
+GEMINI_RPM: float = float(os.getenv("GEMINI_RPM", "0"))
+
+# retry + hedge: hedge ส่ง request ซ้ำไปยัง fallback model เมื่อ primary ช้ากว่า p95 ของตัวเอง
+DEFAULT_RETRY_POLICY = RetryPolicy(
+    max_attempts=int(os.getenv("GEMINI_RETRY_MAX_ATTEMPTS", "3")),
+    base_delay=float(os.getenv("GEMINI_RETRY_BASE_DELAY", "0.5")),
+    max_delay=float(os.getenv("GEMINI_RETRY_MAX_DELAY", "8")),
+    deadline=float(os.getenv("GEMINI_RETRY_DEADLINE", "90")),
+)
+GEMINI_HEDGE: bool = os.getenv("GEMINI_HEDGE", "false").lower() == "true"
+GEMINI_HEDGE_MIN_SAMPLES: int = int(os.getenv("GEMINI_HEDGE_MIN_SAMPLES", "20"))
+
+T = TypeVar("T")
+
+_client: Optional[genai.Client] = None
+_limiters: Dict[str, AdaptiveLimiter] = {}
+_latencies: Dict[str, LatencyWindow] = {}
+
+
+def create_client(api_key: Optional[str] = None) -> genai.Client:
+    """สร้าง genai.Client ที่ตั้งค่า pool/timeout ตาม env (api_key=None -> ให้ SDK อ่านจาก env เอง)"""
+    limits = httpx.Limits(
+        max_connections=GEMINI_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=GEMINI_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=GEMINI_KEEPALIVE_EXPIRY,
+    )
+    http_options = types.HttpOptions(
+        base_url=GEMINI_BASE_URL,
+        timeout=int(GEMINI_HTTP_TIMEOUT * 1000),
+        client_args={"limits": limits},
+        async_client_args={"limits": limits},
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def init_client(api_key: Optional[str] = None) -> genai.Client:
+    """สร้าง client กลาง (เรียกตอน startup) — ถ้ามีอยู่แล้วจะคืนตัวเดิม"""
+    global _client
+    if _client is None:
+        _client = create_client(api_key)
+        logger.info(
+            f"Gemini client ready (pool={GEMINI_POOL_MAX_CONNECTIONS}, keepalive={GEMINI_POOL_MAX_KEEPALIVE}, "
+            f"timeout={GEMINI_HTTP_TIMEOUT}s)"
+        )
+    return _client
+
+
+def get_client(api_key: Optional[str] = None) -> genai.Client:
+    """คืน client กลาง สร้างให้ทันทีถ้ายังไม่ได้ init (เช่น เรียกจากสคริปต์)"""
+    return _client if _client is not None else init_client(api_key)
+
+
+async def close_client() -> None:
+    """ปิด connection pool ทั้ง sync/async (เรียกตอน shutdown)"""
+    global _client
+    if _client is None:
+        return
+    try:
+        await _client.aio.aclose()
+        _client.close()
+    except Exception as e:
+        logger.warning(f"close_client: {e}")
+    _client = None
+
+
+def limiter(model: str) -> AdaptiveLimiter:
+    """limiter ของโมเดลนั้น (สร้างครั้งแรกที่ใช้) — ครอบทุกการเรียกด้วย `async with limiter(model).slot():`"""
+    lim = _limiters.get(model)
+    if lim is None:
+        lim = _limiters[model] = AdaptiveLimiter(
+            f"gemini:{model}",
+            max_concurrency=GEMINI_MAX_CONCURRENCY,
+            max_queue=GEMINI_MAX_QUEUE,
+            queue_timeout=GEMINI_QUEUE_TIMEOUT,
+            rpm=GEMINI_RPM or None,
+        )
+    return lim
+
+
+def limiter_stats() -> Dict[str, Dict[str, float]]:
+    return {model: lim.stats() for model, lim in _limiters.items()}
+
+
+def _latency(model: str) -> LatencyWindow:
+    window = _latencies.get(model)
+    if window is None:
+        window = _latencies[model] = LatencyWindow(min_samples=GEMINI_HEDGE_MIN_SAMPLES)
+    return window
+
+
+async def _attempt(model: str, call: Callable[[str], Awaitable[T]]) -> T:
+    """หนึ่ง attempt: รอ slot ของ limiter -> เรียก -> บันทึก latency (เฉพาะที่สำเร็จ)"""
+    async with limiter(model).slot():
+        with outbound_call(f"gemini:{model}"):
+            t0 = time.perf_counter()
+            result = await call(model)
+    _latency(model).observe(time.perf_counter() - t0)
+    return result
+
+
+async def call_model(
+    model: str,
+    call: Callable[[str], Awaitable[T]],
+    fallback_model: Optional[str] = None,
+    policy: Optional[RetryPolicy] = None,
+    hedge: Optional[bool] = None,
+) -> T:
+    """เรียกโมเดลผ่าน limiter + retry (backoff/jitter/deadline) และ hedge/fallback ไปยัง fallback_model
+
+    call รับชื่อโมเดลแล้วคืน awaitable เช่น `lambda m: client.aio.models.generate_content(model=m, ...)`
+    ถ้า primary ล้มด้วย overload (429/503/คิวเต็ม) และยังไม่เคยส่งไป fallback จะลอง fallback อีกหนึ่งรอบ
+    """
+    policy = policy or DEFAULT_RETRY_POLICY
+    deadline = time.monotonic() + policy.deadline
+    if not fallback_model or fallback_model == model:
+        return await retry_call(f"gemini:{model}", lambda: _attempt(model, call), policy, deadline)
+
+    backup_started = False
+
+    async def backup() -> T:
+        nonlocal backup_started
+        backup_started = True
+        return await retry_call(f"gemini:{fallback_model}", lambda: _attempt(fallback_model, call), policy, deadline)
+
+    hedge_after = _latency(model).p95() if (GEMINI_HEDGE if hedge is None else hedge) else None
+    try:
+        return await hedged(
+            f"gemini:{model}",
+            lambda: retry_call(f"gemini:{model}", lambda: _attempt(model, call), policy, deadline),
+            backup,
+            hedge_after,
+        )
+    except Exception as exc:
+        if backup_started or not (isinstance(exc, UpstreamOverloaded) or is_overload_error(exc)):
+            raise
+        logger.warning(f"call_model: {model} overloaded ({exc}) -> fallback={fallback_model}")
+        return await backup()
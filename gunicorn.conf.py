@@ -0,0 +1,34 @@
+# gunicorn.conf.py — รันหลาย worker ด้วย gunicorn + UvicornWorker
+#
+#   pip install gunicorn
+#   gunicorn -c gunicorn.conf.py main:app      # Travel Planner
+#   gunicorn -c gunicorn.conf.py api:app       # Task Planner
+#
+# cache และคิวงานอยู่ใน SQLite (CACHE_DB_PATH / JOBS_DB_PATH, โหมด WAL) ทุก worker จึงใช้ร่วมกัน
+# metrics รวมข้าม worker ผ่าน PROMETHEUS_MULTIPROC_DIR (ตั้งให้อัตโนมัติถ้าไม่ได้กำหนด)
+
+import multiprocessing
+import os
+
+from serve import prepare_multiprocess_metrics
+
+bind = f"{os.getenv('HOST', '127.0.0.1')}:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count()))))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# pipeline สร้างแผน (intent -> research -> generate -> enrich) ใช้เวลาหลายสิบวินาทีได้
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+accesslog = "-"
+
+
+def on_starting(server):
+    prepare_multiprocess_metrics()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
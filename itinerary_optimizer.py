@@ -0,0 +1,186 @@
+"""จัดลำดับจุดแวะในแต่ละวันและคำนวณเวลาใหม่แบบ deterministic ในเครื่อง (ใช้แทน LLM ในโหมด auto-fix)
+
+ระยะทางทุกคู่คำนวณทีเดียวด้วย haversine แบบ vectorized (NumPy) แล้วจัดลำดับ: ช่วงสั้น (<= EXACT_MAX_NODES จุด)
+ลองทุกลำดับพร้อมกันเป็น array ส่วนช่วงที่ยาวกว่าใช้ nearest neighbour + 2-opt
+จุดที่ปักหมุด (pinned เช่น จุดแรกของวัน ร้านอาหาร หรือจุดที่ไม่มีพิกัด) อยู่ตำแหน่งเดิมเสมอ
+จัดลำดับเฉพาะช่วงระหว่างหมุด แล้วคิดเวลาเริ่มใหม่จาก stay_duration + เวลาเดินทางโดยประมาณ
+"""
+
+import itertools
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+EXACT_MAX_NODES = 7  # 7! = 5040 ลำดับ — ประเมินพร้อมกันได้ในไม่ถึงมิลลิวินาที
+
+
+@dataclass
+class Stop:
+    lat: Optional[float]
+    lng: Optional[float]
+    stay_minutes: int
+    pinned: bool = False
+
+    @property
+    def located(self) -> bool:
+        return self.lat is not None and self.lng is not None
+
+
+@dataclass
+class DayResult:
+    order: List[int]            # index ของ stop เดิมตามลำดับใหม่
+    start_minutes: List[int]    # นาทีนับจากเที่ยงคืน ตามลำดับใหม่
+    travel_minutes: List[int]   # เวลาเดินทางจากจุดก่อนหน้า (จุดแรก = 0)
+    distance_km: float
+    original_distance_km: float
+
+    @property
+    def reordered(self) -> bool:
+        return self.order != sorted(self.order)
+
+
+def haversine_matrix(lat: Sequence[float], lng: Sequence[float]) -> np.ndarray:
+    """ระยะทาง (กม.) ระหว่างทุกคู่จุด — พิกัดที่เป็น NaN ให้ผลเป็น NaN"""
+    phi = np.radians(np.asarray(lat, dtype=np.float64))
+    lam = np.radians(np.asarray(lng, dtype=np.float64))
+    a = np.sin((phi[:, None] - phi[None, :]) / 2) ** 2 + np.cos(phi)[:, None] * np.cos(phi)[None, :] * np.sin(
+        (lam[:, None] - lam[None, :]) / 2
+    ) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def travel_minutes(distance_km: float, speed_kmh: float, buffer_minutes: int, unknown_minutes: int) -> int:
+    """เวลาเดินทางโดยประมาณ ปัดขึ้นเป็นช่วง 5 นาที — ระยะทางไม่ทราบ (NaN) ใช้ unknown_minutes"""
+    if math.isnan(distance_km):
+        return unknown_minutes
+    minutes = distance_km / max(speed_kmh, 1e-6) * 60 + buffer_minutes
+    return int(math.ceil(minutes / 5) * 5)
+
+
+def _path_length(dist: np.ndarray, path: Sequence[int]) -> float:
+    if len(path) < 2:
+        return 0.0
+    idx = np.asarray(path)
+    return float(dist[idx[:-1], idx[1:]].sum())
+
+
+def _nearest_neighbour(dist: np.ndarray, nodes: List[int], head: int) -> List[int]:
+    path, remaining = [], list(nodes)
+    current = head
+    while remaining:
+        nxt = min(remaining, key=lambda j: dist[current, j])
+        path.append(nxt)
+        remaining.remove(nxt)
+        current = nxt
+    return path
+
+
+def _two_opt(dist: np.ndarray, path: List[int], max_rounds: int = 100) -> List[int]:
+    """2-opt โดย path[0] และ path[-1] เป็นหมุดปลาย — หา delta ของทุก j พร้อมกันต่อหนึ่ง i"""
+    path = list(path)
+    m = len(path)
+    for _ in range(max_rounds):
+        improved = False
+        for i in range(1, m - 2):
+            p = np.asarray(path)
+            js = np.arange(i + 1, m - 1)
+            a, b = p[i - 1], p[i]
+            delta = dist[a, p[js]] + dist[b, p[js + 1]] - dist[a, b] - dist[p[js], p[js + 1]]
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-9:
+                j = int(js[k])
+                path[i:j + 1] = path[i:j + 1][::-1]
+                improved = True
+        if not improved:
+            break
+    return path
+
+
+@lru_cache(maxsize=EXACT_MAX_NODES + 1)
+def _permutations(k: int) -> np.ndarray:
+    return np.array(list(itertools.permutations(range(k))), dtype=np.intp)
+
+
+def _exact_segment(dist: np.ndarray, nodes: List[int], head: int, tail: int) -> List[int]:
+    seq = np.asarray(nodes)[_permutations(len(nodes))]
+    lengths = dist[head, seq[:, 0]] + dist[seq[:, :-1], seq[:, 1:]].sum(axis=1) + dist[seq[:, -1], tail]
+    return seq[int(np.argmin(lengths))].tolist()  # แถวแรกคือลำดับเดิม -> เสมอกันคงลำดับเดิม
+
+
+def _order_segment(dist: np.ndarray, nodes: List[int], head: int, tail: int) -> List[int]:
+    """เรียง nodes ให้เป็นเส้นทางสั้นสุดจาก head ไป tail (head/tail อาจเป็นจุดสมมุติระยะ 0)"""
+    if len(nodes) < 2:
+        return list(nodes)
+    if len(nodes) <= EXACT_MAX_NODES:
+        return _exact_segment(dist, nodes, head, tail)
+    path = [head, *_nearest_neighbour(dist, nodes, head), tail]
+    path = _two_opt(dist, path)
+    if _path_length(dist, path) >= _path_length(dist, [head, *nodes, tail]) - 1e-9:
+        return list(nodes)  # heuristic ไม่ดีกว่าลำดับเดิม — คงเดิม
+    return path[1:-1]
+
+
+def optimize_day(
+    stops: Sequence[Stop],
+    day_start_minutes: int = 9 * 60,
+    speed_kmh: float = 25.0,
+    buffer_minutes: int = 10,
+    unknown_travel_minutes: int = 30,
+) -> DayResult:
+    """จัดลำดับจุดที่ไม่ได้ปักหมุดในแต่ละช่วงระหว่างหมุด แล้วคำนวณเวลาเริ่มของทุกจุดใหม่"""
+    n = len(stops)
+    if n == 0:
+        return DayResult([], [], [], 0.0, 0.0)
+    lat = [s.lat if s.located else math.nan for s in stops]
+    lng = [s.lng if s.located else math.nan for s in stops]
+    # แถว/คอลัมน์สุดท้ายเป็นจุดสมมุติระยะ 0 — ใช้เป็นปลายเปิดของช่วงที่ไม่มีหมุด (หรือหมุดไม่มีพิกัด)
+    dist = np.zeros((n + 1, n + 1))
+    dist[:n, :n] = haversine_matrix(lat, lng)
+    virtual = n
+
+    order: List[int] = []
+    segment: List[int] = []
+    for i in range(n + 1):
+        if i < n and not stops[i].pinned and stops[i].located:
+            segment.append(i)
+            continue
+        if segment:
+            head = order[-1] if order and stops[order[-1]].located else virtual
+            tail = i if i < n and stops[i].located else virtual
+            order.extend(_order_segment(dist, segment, head, tail))
+            segment = []
+        if i < n:
+            order.append(i)
+
+    leg_km = [math.nan] + [float(dist[a, b]) for a, b in zip(order, order[1:])]
+    travel = [0] + [travel_minutes(km, speed_kmh, buffer_minutes, unknown_travel_minutes) for km in leg_km[1:]]
+    starts, t = [], day_start_minutes
+    for pos, i in enumerate(order):
+        t += travel[pos]
+        starts.append(t)
+        t += stops[i].stay_minutes
+
+    def located_length(path: Sequence[int]) -> float:
+        return float(np.nansum([dist[a, b] for a, b in zip(path, path[1:])]))
+
+    return DayResult(order, starts, travel, located_length(order), located_length(range(n)))
+
+
+def parse_hhmm(text: Optional[str]) -> Optional[int]:
+    try:
+        hours, minutes = (text or "").strip().split(":")[:2]
+        value = int(hours) * 60 + int(minutes[:2])
+    except ValueError:
+        return None
+    return value if 0 <= value < 24 * 60 else None
+
+
+def format_hhmm(minutes: int) -> str:
+    """นาทีนับจากเที่ยงคืน -> "HH:MM" — ต้องอยู่ในวันเดียวกัน (เลยเที่ยงคืน raise ValueError ไม่วนกลับเป็น 00:xx)"""
+    if not 0 <= minutes < 24 * 60:
+        raise ValueError(f"{minutes} minutes is outside a single day")
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
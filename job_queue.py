@@ -0,0 +1,333 @@
+"""คิวงานเบื้องหลังแบบ SQLite สำหรับงานที่ใช้เวลานาน (สร้าง/แก้แผน)
+
+client ส่งงานแล้วได้ job id ทันที worker (asyncio task ใน process) ดึงงานจากคิวมาทำ
+แล้วเก็บผลไว้ให้ GET /jobs/{id} มาอ่าน (หรือ long-poll) ใช้ไฟล์ SQLite เดียวกันได้หลาย process
+(claim งานใน transaction IMMEDIATE)
+
+งาน running แต่ละงานมีเจ้าของ (worker_id ของ JobQueue ที่ claim) และ lease ที่เจ้าของต่ออายุเรื่อย ๆ
+ระหว่างทำงาน — งานจะถูกนำกลับมาทำใหม่ก็ต่อเมื่อ lease หมดอายุ (process เจ้าของ crash/ค้าง)
+ไม่ใช่ทุกครั้งที่มี process ใหม่ start จึงไม่มีงานถูกทำซ้ำซ้อนระหว่าง worker
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from kv_cache import connect_sqlite
+from metrics import JOB_QUEUE_DEPTH, JOB_RUN_SECONDS, JOB_WAIT_SECONDS, JOBS_TOTAL
+
+logger = logging.getLogger("job_queue")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id           TEXT PRIMARY KEY,
+    kind         TEXT NOT NULL,
+    payload      TEXT NOT NULL,
+    status       TEXT NOT NULL,
+    result       TEXT,
+    error        TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    created_at   REAL NOT NULL,
+    available_at REAL NOT NULL,
+    started_at   REAL,
+    finished_at  REAL,
+    worker_id    TEXT,
+    lease_until  REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, available_at);
+"""
+# ไฟล์ที่สร้างก่อนมี lease — เพิ่มคอลัมน์ให้ (งาน running เดิมที่ lease_until เป็น NULL ถือว่าหมดอายุแล้ว)
+_LEASE_COLUMNS = {"worker_id": "TEXT", "lease_until": "REAL"}
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+Handler = Callable[[Dict[str, Any]], Awaitable[Any]]
+
+
+class JobQueue:
+    """คิวงานที่ persist ลง SQLite (path=None -> ใช้ฐานข้อมูลในหน่วยความจำ ไม่รอดข้าม restart)
+
+    handler ที่ raise exception ซึ่งมี attribute `retry_after` (เช่น UpstreamOverloaded)
+    จะถูกนำกลับเข้าคิวหลังเวลาดังกล่าว ไม่เกิน max_attempts ครั้ง
+
+    lease_seconds: อายุ lease ของงานที่กำลังทำ (ต่ออายุทุก lease_seconds / 3) — process ที่หายไป
+    นานกว่านี้ งานของมันจะถูก worker อื่น claim ต่อ
+    """
+
+    def __init__(
+        self,
+        handlers: Dict[str, Handler],
+        path: Optional[str] = None,
+        workers: int = 2,
+        result_ttl: float = 24 * 3600,
+        max_attempts: int = 3,
+        poll_interval: float = 1.0,
+        lease_seconds: float = 60.0,
+    ):
+        self.handlers = handlers
+        self.workers = max(1, workers)
+        self.result_ttl = result_ttl
+        self.max_attempts = max(1, max_attempts)
+        self.poll_interval = poll_interval
+        self.lease_seconds = max(1.0, lease_seconds)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._db = connect_sqlite(path or ":memory:")
+        self._db.executescript(_SCHEMA)
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for name, kind in _LEASE_COLUMNS.items():
+            if name not in columns:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._finished: Dict[str, asyncio.Event] = {}
+
+    # ------------------------------------------------------------------ lifecycle
+    async def start(self) -> None:
+        await asyncio.to_thread(self._requeue_expired, True)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._renew_leases()))
+        await self._update_depth()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ------------------------------------------------------------------ API
+    # การเรียก SQLite อาจรอ write lock ของ process อื่นได้นานถึง busy_timeout — เมธอด async
+    # ทำงานฐานข้อมูลใน thread (asyncio.to_thread) เพื่อไม่ให้ event loop ค้าง ส่วนเมธอด sync เป็น blocking
+    async def submit(self, kind: str, payload: Dict[str, Any]) -> str:
+        if kind not in self.handlers:
+            raise ValueError(f"unknown job kind: {kind}")
+        job_id = await asyncio.to_thread(self._insert, kind, payload)
+        await self._update_depth()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    def _insert(self, kind: str, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, payload, status, created_at, available_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), QUEUED, now, now),
+            )
+            self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", (DONE, FAILED, now - self.result_ttl)
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, kind, status, result, error, attempts, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, status, result, error, attempts, created_at, started_at, finished_at = row
+        job: Dict[str, Any] = {
+            "job_id": job_id,
+            "kind": kind,
+            "status": status,
+            "attempts": attempts,
+            "created_at": created_at,
+            "started_at": started_at,
+            "finished_at": finished_at,
+        }
+        if status == QUEUED:
+            job["queue_position"] = self._position(created_at)
+        if result is not None:
+            job["result"] = json.loads(result)
+        if error is not None:
+            job["error"] = error
+        return job
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """long-poll: รอจนงานเสร็จ (done/failed) หรือครบ timeout แล้วคืนสถานะล่าสุด"""
+        deadline = time.monotonic() + max(0.0, timeout)
+        job = await asyncio.to_thread(self.get, job_id)
+        while job is not None and job["status"] in (QUEUED, RUNNING):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            event = self._finished.setdefault(job_id, asyncio.Event())
+            try:
+                # poll เป็นระยะด้วย เผื่องานถูกทำโดย process อื่นที่ใช้ไฟล์เดียวกัน
+                await asyncio.wait_for(event.wait(), timeout=min(remaining, self.poll_interval))
+            except asyncio.TimeoutError:
+                pass
+            job = await asyncio.to_thread(self.get, job_id)
+        if job is not None and job["status"] in (DONE, FAILED):
+            self._finished.pop(job_id, None)
+        return job
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {"workers": self.workers, **{status: count for status, count in rows}}
+
+    # ------------------------------------------------------------------ internals
+    def _position(self, created_at: float) -> int:
+        with self._lock:
+            ahead = self._db.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?", (QUEUED, created_at)
+            ).fetchone()[0]
+        return ahead + 1
+
+    async def _update_depth(self) -> None:
+        JOB_QUEUE_DEPTH.set(await asyncio.to_thread(self.depth))
+
+    def _requeue_expired(self, include_own: bool = False) -> int:
+        """งาน running ที่ lease หมดอายุ (process เจ้าของ crash/ค้าง) กลับเข้าคิว
+
+        include_own: รวมงานที่ JobQueue นี้ claim ไว้เองด้วย (ตอน start — worker ของรอบก่อนไม่ได้ทำต่อแล้ว)
+        """
+        with self._lock:
+            cur = self._db.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, worker_id = NULL, lease_until = NULL "
+                "WHERE status = ? AND (lease_until IS NULL OR lease_until < ? OR worker_id = ?)",
+                (QUEUED, RUNNING, time.time(), self.worker_id if include_own else None),
+            )
+        if cur.rowcount:
+            logger.warning(f"JobQueue: requeued {cur.rowcount} interrupted job(s)")
+        return cur.rowcount
+
+    async def _renew_leases(self) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                if await asyncio.to_thread(self._renew) and self._wakeup is not None:
+                    self._wakeup.set()
+            except sqlite3.Error as e:
+                logger.error(f"JobQueue: lease renewal failed: {e}")
+
+    def _renew(self) -> int:
+        """ต่อ lease ของงานที่เราทำอยู่ แล้วนำงานของ process ที่หายไปกลับเข้าคิว — คืนจำนวนงานที่นำกลับ"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE status = ? AND worker_id = ?",
+                (time.time() + self.lease_seconds, RUNNING, self.worker_id),
+            )
+        return self._requeue_expired()
+
+    def _claim(self) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT id, kind, payload, created_at, available_at FROM jobs "
+                    "WHERE status = ? AND available_at <= ? ORDER BY available_at LIMIT 1",
+                    (QUEUED, now),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, started_at = ?, attempts = attempts + 1, "
+                        "worker_id = ?, lease_until = ? WHERE id = ?",
+                        (RUNNING, now, self.worker_id, now + self.lease_seconds, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return row
+
+    def _finish(self, job_id: str, status: str, result: Any = None, error: Optional[str] = None) -> None:
+        # เขียนผลเฉพาะงานที่ยังเป็นของเรา — ถ้า lease หลุดไปแล้ว งานนั้นเป็นของ worker ที่ claim ต่อ
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL "
+                "WHERE id = ? AND status = ? AND worker_id = ?",
+                (
+                    status,
+                    None if result is None else json.dumps(result, ensure_ascii=False),
+                    error,
+                    time.time(),
+                    job_id,
+                    RUNNING,
+                    self.worker_id,
+                ),
+            )
+
+    def _notify(self, job_id: str) -> None:
+        event = self._finished.pop(job_id, None)
+        if event is not None:
+            event.set()
+
+    def _requeue(self, job_id: str, delay: float, error: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, error = ?, started_at = NULL, available_at = ?, "
+                "worker_id = NULL, lease_until = NULL WHERE id = ? AND status = ? AND worker_id = ?",
+                (QUEUED, error, time.time() + delay, job_id, RUNNING, self.worker_id),
+            )
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            try:
+                row = await asyncio.to_thread(self._claim)
+            except sqlite3.Error as e:
+                logger.error(f"JobQueue worker {index}: claim failed: {e}")
+                row = None
+            if row is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, kind, payload, created_at, available_at = row
+            await self._update_depth()
+            JOB_WAIT_SECONDS.labels(kind).observe(max(0.0, time.time() - available_at))
+            t0 = time.perf_counter()
+            try:
+                result = await self.handlers[kind](json.loads(payload))
+            except asyncio.CancelledError:
+                # shutdown ระหว่างทำงาน — คืนงานเข้าคิวให้ process ถัดไปทำต่อ (task ถูก cancel แล้ว จึงเรียกตรง)
+                self._requeue(job_id, 0, "interrupted by shutdown")
+                raise
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                attempts = await asyncio.to_thread(self._attempts, job_id)
+                if retry_after is not None and attempts < self.max_attempts:
+                    logger.warning(f"JobQueue: {kind} {job_id} retry in {retry_after}s ({e})")
+                    await asyncio.to_thread(self._requeue, job_id, float(retry_after), str(e))
+                    JOBS_TOTAL.labels(kind, "requeued").inc()
+                    await self._update_depth()
+                    continue
+                logger.error(f"JobQueue: {kind} {job_id} failed: {e}")
+                await asyncio.to_thread(self._finish, job_id, FAILED, None, str(e) or type(e).__name__)
+                self._notify(job_id)
+                JOBS_TOTAL.labels(kind, FAILED).inc()
+            else:
+                await asyncio.to_thread(self._finish, job_id, DONE, result)
+                self._notify(job_id)
+                JOBS_TOTAL.labels(kind, DONE).inc()
+            finally:
+                JOB_RUN_SECONDS.labels(kind).observe(time.perf_counter() - t0)
+
+    def _attempts(self, job_id: str) -> int:
+        with self._lock:
+            row = self._db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else 0
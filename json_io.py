@@ -0,0 +1,38 @@
+"""JSON เข้า/ออกรอบเดียวผ่าน pydantic-core (Rust) ใช้ร่วมกันทั้ง main.py และ api.py
+
+- validate_json: ข้อความ/bytes จากโมเดล -> schema ตรง ๆ ไม่ผ่าน json.loads + dict (TypeAdapter cache ต่อ type)
+- dump_json: model, dict/list ที่มี model ปน หรือ dict ที่ dump ไว้แล้ว -> bytes UTF-8 (ไม่ escape ภาษาไทย)
+- JSONBytesResponse: return ตรงจาก endpoint แทน model เพื่อข้ามการ validate + serialize ซ้ำของ response_model
+  (response_model ยังใส่ไว้ที่ decorator ได้สำหรับ OpenAPI)
+
+JSON ที่เสียรูปก็ raise ValidationError (type 'json_invalid') เหมือน schema ไม่ตรง — จับที่เดียวพอ
+"""
+
+from functools import lru_cache
+from typing import Any, Union
+
+import pydantic_core
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def adapter(schema: Any) -> TypeAdapter:
+    return TypeAdapter(schema)
+
+
+def validate_json(schema: Any, raw: Union[str, bytes]) -> Any:
+    if isinstance(schema, type) and issubclass(schema, BaseModel):
+        return schema.model_validate_json(raw)  # validator ของ model เอง — เร็วกว่าห่อ TypeAdapter อีกชั้น
+    return adapter(schema).validate_json(raw)
+
+
+def dump_json(value: Any) -> bytes:
+    return pydantic_core.to_json(value)
+
+
+class JSONBytesResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return content if isinstance(content, bytes) else dump_json(content)
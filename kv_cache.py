@@ -0,0 +1,209 @@
+"""Key-value cache แบบ TTL + LRU สองชั้น (หน่วยความจำ + SQLite บนดิสก์)
+
+ใช้ร่วมกันได้ทั้ง main.py และ api.py — ค่าที่เก็บต้อง serialize เป็น JSON ได้
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger("kv_cache")
+
+SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# อ่าน hit จากดิสก์แล้วอัปเดต accessed_at เฉพาะเมื่อเก่ากว่าสัดส่วนนี้ของ TTL
+TOUCH_FRACTION: float = 0.1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv_cache (
+    namespace   TEXT NOT NULL,
+    key         TEXT NOT NULL,
+    value       TEXT NOT NULL,
+    expires_at  REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS kv_cache_lru ON kv_cache (namespace, accessed_at);
+"""
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """เปิด SQLite สำหรับใช้ร่วมกันหลาย worker process: WAL (อ่านไม่บล็อกการเขียน) + busy_timeout"""
+    db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    db.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    if path != ":memory:":
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class KVCache:
+    """Cache ต่อ namespace มี TTL และจำกัดจำนวนรายการ (evict ตัวที่ถูกใช้ล่าสุดนานที่สุดก่อน)
+
+    - ชั้นหน่วยความจำ: OrderedDict ขนาดไม่เกิน max_entries
+    - ชั้นดิสก์ (เมื่อกำหนด path): SQLite ไฟล์เดียวใช้ได้หลาย namespace อยู่รอดข้าม restart
+      และใช้ร่วมกันได้หลาย worker process (ค่าที่ process อื่นเขียนจะเห็นเมื่อชั้นหน่วยความจำ miss)
+    ปลอดภัยต่อการเรียกจากหลาย thread — โค้ดบน event loop ใช้ aget/aset (ชั้นดิสก์ทำใน thread
+    เพราะ SQLite อาจรอ write lock ของ process อื่นได้นานถึง busy_timeout)
+    """
+
+    def __init__(self, namespace: str, ttl: float, max_entries: int, path: Optional[str] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.path = path or None
+        self.hits = 0
+        self.misses = 0
+        # แยก lock: ชั้นหน่วยความจำใช้เวลาไม่กี่ไมโครวินาที ส่วน SQLite อาจรอ busy_timeout
+        # (worker อื่นถือ write lock) — การอ่านชั้นหน่วยความจำต้องไม่ต้องรอดิสก์
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._mem: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        if self.path:
+            try:
+                self._db = connect_sqlite(self.path)
+                self._db.executescript(_SCHEMA)
+            except sqlite3.Error as e:
+                logger.warning(f"KVCache[{namespace}]: disk layer disabled ({e})")
+                self._db = None
+
+    # ------------------------------------------------------------------ API
+    def get(self, key: str) -> Optional[Any]:
+        found, value = self._mem_get(key)
+        if found:
+            return value
+        return self._disk_get(key)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._mem_put(key, value, expires_at)
+        self._db_put(key, value, expires_at, now)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """get สำหรับโค้ดบน event loop: hit ชั้นหน่วยความจำตอบทันที ชั้นดิสก์อ่านใน thread"""
+        found, value = self._mem_get(key)
+        if found:
+            return value
+        if self._db is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return await asyncio.to_thread(self._disk_get, key)
+
+    async def aset(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._mem_put(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_put, key, value, expires_at, now)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._mem.pop(key, None)
+        if self._db is not None:
+            try:
+                with self._db_lock:
+                    self._db.execute("DELETE FROM kv_cache WHERE namespace=? AND key=?", (self.namespace, key))
+            except sqlite3.Error as e:
+                logger.warning(f"KVCache[{self.namespace}]: delete error {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "memory_entries": len(self._mem),
+            "persistent": self._db is not None,
+        }
+
+    # ------------------------------------------------------------ internals
+    def _mem_get(self, key: str) -> tuple[bool, Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._mem[key]
+        return False, None
+
+    def _disk_get(self, key: str) -> Optional[Any]:
+        row = self._db_get(key, time.time())
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            self._mem_put(key, value, expires_at)
+            self.hits += 1
+            return value
+
+    def _mem_put(self, key: str, value: Any, expires_at: float) -> None:
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _db_get(self, key: str, now: float) -> Optional[tuple[Any, float]]:
+        if self._db is None:
+            return None
+        try:
+            with self._db_lock:
+                row = self._db.execute(
+                    "SELECT value, expires_at, accessed_at FROM kv_cache WHERE namespace=? AND key=?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] <= now:
+                    self._db.execute("DELETE FROM kv_cache WHERE namespace=? AND key=?", (self.namespace, key))
+                    return None
+                # การอ่านเป็น write ด้วยเฉพาะเมื่อ accessed_at เก่าเกิน TOUCH_FRACTION ของ TTL
+                # (LRU บนดิสก์ไม่ต้องแม่นระดับวินาที — ลดการแย่ง write lock ระหว่าง worker)
+                if now - row[2] > self.ttl * TOUCH_FRACTION:
+                    self._db.execute(
+                        "UPDATE kv_cache SET accessed_at=? WHERE namespace=? AND key=?",
+                        (now, self.namespace, key),
+                    )
+            return json.loads(row[0]), row[1]
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.warning(f"KVCache[{self.namespace}]: read error {e}")
+            return None
+
+    def _db_put(self, key: str, value: Any, expires_at: float, now: float) -> None:
+        if self._db is None:
+            return
+        try:
+            text = json.dumps(value, ensure_ascii=False)
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO kv_cache (namespace, key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, text, expires_at, now),
+                )
+                # LRU บนดิสก์: ลบรายการที่หมดอายุ และตัดส่วนเกินที่ถูกใช้ล่าสุดนานที่สุด
+                self._db.execute(
+                    "DELETE FROM kv_cache WHERE namespace=? AND expires_at<=?",
+                    (self.namespace, now),
+                )
+                self._db.execute(
+                    """DELETE FROM kv_cache WHERE namespace=? AND key IN (
+                           SELECT key FROM kv_cache WHERE namespace=?
+                           ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                       )""",
+                    (self.namespace, self.namespace, self.max_entries),
+                )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"KVCache[{self.namespace}]: write error {e}")
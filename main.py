@@ -5,23 +5,54 @@ import os
 import re
 import sys
 import json
+import time
+import math
+import uuid
 import asyncio
 import logging
-import requests
-from datetime import datetime
+from datetime import date, datetime
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 
 from urllib.parse import quote_plus
-from typing import List, Optional, Literal
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Literal
 
-import uvicorn
-from fastapi import FastAPI
+import httpx
+import numpy as np
+from fastapi import FastAPI, Header, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
 
-from google import genai
 from google.genai import types
 
+import gazetteer
+import gemini_client
+import itinerary_optimizer
+import plan_feasibility
+import serve
+from circuit_breaker import CircuitBreaker
+from job_queue import JobQueue
+from json_io import JSONBytesResponse, dump_json, validate_json
+from kv_cache import KVCache
+from metrics import (
+    GAZETTEER_LOOKUPS,
+    MODEL_RETRIES,
+    PROMPT_TOKENS,
+    SPECULATIVE_RESEARCH,
+    SPECULATIVE_SAVED_SECONDS,
+    error_status,
+    metrics_response,
+    outbound_call,
+    stage_timer,
+)
+from request_memo import IdempotencyKeyMismatch, InflightCoalescer, body_hash, check_body, request_key
+from research_key import research_cache_key
+from retry_policy import is_retryable
+from textnorm import normalize_name
+from upstream_limiter import UpstreamOverloaded
+
 # -----------------------------------------------------------------------------
 # Settings (รวม env ทั้งหมดไว้ที่เดียว)
 # -----------------------------------------------------------------------------
@@ -30,10 +61,59 @@ class Settings:
     GEMINI_MODEL_HIGH: str = os.getenv("GEMINI_MODEL_HIGH", "gemini-3-flash-preview")
     GEMINI_MODEL_MED: str = os.getenv("GEMINI_MODEL_MED", "gemini-2.5-flash")
     GEMINI_MODEL_LOW: str = os.getenv("GEMINI_MODEL_LOW", "gemini-2.5-flash-lite")
+    GEMINI_FALLBACK_MODEL: Optional[str] = os.getenv("GEMINI_FALLBACK_MODEL") or None  # ใช้ตอน overload และ hedge
     GOOGLE_CLOUD_API_KEY: Optional[str] = os.getenv("GOOGLE_CLOUD_API_KEY")
     CX_ID: Optional[str] = os.getenv("CX_ID")
+    # endpoint ของ Google ที่ใช้ lookup (override ได้เพื่อชี้ไป server จำลองตอน benchmark)
+    GOOGLE_CUSTOMSEARCH_URL: str = os.getenv("GOOGLE_CUSTOMSEARCH_URL", "https://www.googleapis.com/customsearch/v1")
+    GOOGLE_MAPS_LOOKUP_URL: str = os.getenv("GOOGLE_MAPS_LOOKUP_URL", "https://www.google.com/maps/search/")
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    HOST: str = os.getenv("HOST", "127.0.0.1")
+    PORT: int = int(os.getenv("PORT", "8000"))
     MAX_INPUT_LENGTH: int = int(os.getenv("MAX_INPUT_LENGTH", "2000"))
+    # index พิกัดในเครื่อง (สร้างด้วย python gazetteer.py build ...) — ไม่มีไฟล์ = ข้ามไปใช้ Google Maps
+    GAZETTEER_PATH: Optional[str] = os.getenv("GAZETTEER_PATH", "gazetteer.idx")
+    GAZETTEER_FUZZY: bool = os.getenv("GAZETTEER_FUZZY", "true").lower() == "true"
+    ENRICH_CONCURRENCY: int = int(os.getenv("ENRICH_CONCURRENCY", "16"))
+    ENRICH_REQUEST_TIMEOUT: float = float(os.getenv("ENRICH_REQUEST_TIMEOUT", "10"))
+    ENRICH_DEADLINE: float = float(os.getenv("ENRICH_DEADLINE", "20"))
+    BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+    BREAKER_RESET_TIMEOUT: float = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+    CACHE_DB_PATH: Optional[str] = os.getenv("CACHE_DB_PATH", "planner_cache.sqlite3")  # ว่าง = ใช้เฉพาะหน่วยความจำ
+    PLACE_CACHE_TTL: float = float(os.getenv("PLACE_CACHE_TTL", str(30 * 24 * 3600)))
+    PLACE_CACHE_MAX_ENTRIES: int = int(os.getenv("PLACE_CACHE_MAX_ENTRIES", "20000"))
+    RESEARCH_CACHE_TTL: float = float(os.getenv("RESEARCH_CACHE_TTL", str(3 * 24 * 3600)))
+    RESEARCH_CACHE_MAX_ENTRIES: int = int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "500"))
+    RESEARCH_CACHE_BUCKET_DAYS: int = int(os.getenv("RESEARCH_CACHE_BUCKET_DAYS", "7"))
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "200"))
+    # แผนเดิมของ /changeplan แบบย่อ (คีย์สั้น ตัด None ย่อวันที่ไม่ถูกแก้) และงบ token ของแผนเดิม (0 = ไม่จำกัด)
+    CHANGEPLAN_COMPACT: bool = os.getenv("CHANGEPLAN_COMPACT", "true").lower() == "true"
+    CHANGEPLAN_MAX_PLAN_TOKENS: int = int(os.getenv("CHANGEPLAN_MAX_PLAN_TOKENS", "0"))
+    # คำสั่งที่ระบุวัน (เช่น "เปลี่ยนร้านวันที่ 2") -> ให้โมเดลสร้างใหม่เฉพาะวันนั้นแล้ว merge กลับ
+    CHANGEPLAN_INCREMENTAL: bool = os.getenv("CHANGEPLAN_INCREMENTAL", "true").lower() == "true"
+    # auto-fix (ไม่มีคำสั่ง) จัดลำดับ/เวลาในเครื่องก่อน — ยังส่งต่อให้โมเดลเมื่อมีสิ่งที่แก้ในเครื่องไม่ได้
+    # (จุดไม่มีพิกัด สถานที่ซ้ำ โรงแรมใน itinerary วันที่เลยเที่ยงคืน)
+    AUTOFIX_LOCAL: bool = os.getenv("AUTOFIX_LOCAL", "true").lower() == "true"
+    # true = จุดที่ขาด notes/opening_hours/price_info ก็ส่งให้โมเดลเติมด้วย (prompt ให้โมเดลเว้น None เมื่อไม่แน่ใจ
+    # แผนส่วนใหญ่จึงขาดอยู่แล้ว — เปิดแล้ว auto-fix แทบทุกครั้งจะไปที่โมเดล)
+    AUTOFIX_REQUIRE_DETAILS: bool = os.getenv("AUTOFIX_REQUIRE_DETAILS", "false").lower() == "true"
+    DAY_START: str = os.getenv("DAY_START", "09:00")
+    TRAVEL_SPEED_KMH: float = float(os.getenv("TRAVEL_SPEED_KMH", "25"))
+    TRAVEL_BUFFER_MIN: int = int(os.getenv("TRAVEL_BUFFER_MIN", "10"))
+    # ตรวจความเป็นไปได้ (เวลาทับ/เดินทางไม่ทัน/เวลาเปิด-ปิด) ในเครื่อง แนบใน plan_output[i].feasibility + X-Plan-* headers
+    PLAN_FEASIBILITY: bool = os.getenv("PLAN_FEASIBILITY", "true").lower() == "true"
+    # options > 1 -> สร้างแต่ละตัวเลือกด้วย call แยกกันพร้อมกัน (ใช้ research เดียวกัน) แล้วรวมตาม index
+    PARALLEL_OPTIONS: bool = os.getenv("PARALLEL_OPTIONS", "false").lower() == "true"
+    SPECULATIVE_RESEARCH: bool = os.getenv("SPECULATIVE_RESEARCH", "false").lower() == "true"
+    BATCH_CONCURRENCY: int = int(os.getenv("BATCH_CONCURRENCY", "4"))
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOBS_DB_PATH: Optional[str] = os.getenv("JOBS_DB_PATH", "planner_jobs.sqlite3")  # ว่าง = คิวในหน่วยความจำ
+    JOB_RESULT_TTL: float = float(os.getenv("JOB_RESULT_TTL", str(24 * 3600)))
+    JOB_MAX_WAIT: float = float(os.getenv("JOB_MAX_WAIT", "60"))  # long-poll สูงสุดของ GET /jobs/{id}?wait=
+    # งาน running ของ process ที่หายไปนานกว่านี้ (ไม่ต่อ lease) จะถูก worker อื่นนำกลับมาทำ
+    JOB_LEASE_SECONDS: float = float(os.getenv("JOB_LEASE_SECONDS", "60"))
 
 settings = Settings()
 
@@ -46,6 +126,7 @@ logging.basicConfig(
     handlers=[logging.StreamHandler(sys.stdout)],
 )
 logger = logging.getLogger("Travel Planner")
+METRICS_APP = "travel"
 
 # -----------------------------------------------------------------------------
 # Schemas (Pydantic)
@@ -63,6 +144,10 @@ class MakePlan(BaseModel):
     input: str = Field(..., description="คำสั่งจากผู้ใช้เพื่อสร้างแผนการเดินทาง (ภาษาไทย)", examples=["วางแผนไปเที่ยวทะเลที่จังหวัดจันทบุรี"])
     options: int = Field(default=1, ge=1, le=3, description="จำนวนตัวเลือกแผนการเดินทางที่ต้องการให้ระบบส่งกลับ (กำหนดได้ 1-3)")
 
+class MakePlanBatch(BaseModel):
+    items: List[MakePlan] = Field(..., min_length=1, description="รายการคำขอสร้างแผน (ประมวลผลพร้อมกันแบบจำกัดจำนวน)")
+    concurrency: Optional[int] = Field(None, ge=1, le=32, description="จำนวนแผนที่สร้างพร้อมกัน (ไม่ระบุ = ค่าตั้งต้นของระบบ)")
+
 class ChangePlan(BaseModel):
     input: Optional[str] = Field(None, description="คำสั่งหรือเงื่อนไขเพิ่มเติมที่ต้องการให้ปรับในแผน หากปล่อยว่างให้ระบบตรวจและแก้อัตโนมัติ")
     olddata: str = Field(..., description="ข้อมูลแผนการเดินทางเดิม (JSON/ข้อความ) ที่ต้องการให้ระบบนำมาแก้ไข อาจผ่านการแก้ไขด้วยตนเองมาแล้ว")
@@ -72,6 +157,7 @@ class Coordinates(BaseModel):
     lng: float = Field(..., description="ลองจิจูดของสถานที่ (ระบบพิกัด WGS84)")
 
 class PlaceDetail(BaseModel):
+    place_id: Optional[str] = Field(None, description="รหัสสถานที่ที่ระบบกำหนด ใช้จับคู่สถานที่เดิมตอนแก้แผน (ระบบเติมให้เอง)")
     type: PlaceType = Field(..., description="ประเภทของสถานที่: 'hotel', 'attraction', 'restaurant' หรือ 'other'")
     name: str = Field(..., description="ชื่อสถานที่จริงที่เฉพาะเจาะจง เช่น 'วัดพระแก้ว' หรือ 'ร้านเจ๊ไฝ' ห้ามใช้คำกว้าง เช่น 'วัดใกล้เคียง' หรือ 'ร้านอาหารท้องถิ่น'")
     short_description: str = Field(..., description="สรุปจุดเด่น 1-2 ประโยค เช่น 'วัดเก่าแก่สไตล์ล้านนา วิวพระอาทิตย์ตกสวยงาม'")
@@ -98,6 +184,22 @@ class DayPlan(BaseModel):
     summary: Optional[str] = Field(..., description="สรุปธีม ไฮไลต์ หรือย่านหลักของวัน เช่น 'ย่านเมืองเก่า + พิพิธภัณฑ์'")
     stops: List[ItineraryStop] = Field(..., description="รายการกิจกรรมของวันนั้น เรียงตามลำดับเวลา")
 
+class DayFeasibility(BaseModel):
+    day_index: int = Field(..., description="หมายเลขวันที่ในทริป")
+    stay_minutes: int = Field(..., description="เวลาอยู่ในทุกจุดรวมกัน (นาที)")
+    travel_minutes: int = Field(..., description="เวลาเดินทางระหว่างจุดโดยประมาณจากพิกัด (นาที)")
+    span_minutes: Optional[int] = Field(None, description="ตั้งแต่จุดแรกเริ่มจนจุดสุดท้ายจบตาม start_time (นาที) หรือ None ถ้าไม่มีเวลา")
+    overlaps: int = Field(0, description="จำนวนจุดที่เริ่มก่อนจุดก่อนหน้าจบ")
+    tight_transfers: int = Field(0, description="จำนวนจุดที่เวลาเดินทางจากจุดก่อนหน้าไม่พอ")
+    hours_conflicts: int = Field(0, description="จำนวนจุดที่เวลาไปไม่ตรงกับ opening_hours")
+
+class PlanFeasibility(BaseModel):
+    feasible: bool = Field(..., description="แผนนี้ทำได้จริงตามเวลา/ระยะทางหรือไม่")
+    difficulty: Literal["EASY", "MEDIUM", "HARD", "IMPOSSIBLE"]
+    warnings: List[str] = Field(default_factory=list, description="ความเสี่ยงที่ยังทำได้ เช่น เดินทางไม่ทัน วันยาวเกินไป")
+    reasons: List[str] = Field(default_factory=list, description="เหตุที่ทำไม่ได้ เช่น เวลาทับกัน ไปตอนสถานที่ปิด")
+    days: List[DayFeasibility] = Field(default_factory=list)
+
 class OutputPlan(BaseModel):
     name: Optional[str] = Field(..., description="ชื่อหรือหัวข้อของแผนทริปนี้")
     overview: Optional[str] = Field(..., description="สรุปภาพรวม 2-3 ประโยค ครอบคลุมไฮไลต์หลัก จุดเด่นของแต่ละวัน และกลุ่มเป้าหมาย")
@@ -105,6 +207,7 @@ class OutputPlan(BaseModel):
     style: Optional[str] = Field(..., description="คำอธิบายสั้น ๆ ของสไตล์ทริป (เช่น leisure, adventure)")
     itinerary: List[DayPlan] = Field(..., description="รายละเอียดแผนรายวัน ครอบคลุมลำดับเวลาและสถานที่ในแต่ละวัน")
     warnings: Optional[List[str]] = Field(None, description="รายการคำเตือนหรือข้อควรทราบเกี่ยวกับทริปนี้")
+    feasibility: Optional[PlanFeasibility] = Field(None, description="ผลตรวจความเป็นไปได้ที่ระบบคำนวณเอง (ตั้งเป็น None เสมอ)")
 
 class PlanResponse(BaseModel):
     status: Status = Field(..., description="สถานะการตอบกลับ: 'success' เมื่อประมวลผลได้ หรือ 'error' เมื่อเกิดปัญหา")
@@ -112,6 +215,11 @@ class PlanResponse(BaseModel):
     plan_output: Optional[List[OutputPlan]] = Field(None, description="รายการแผนการท่องเที่ยวที่สร้างตามลำดับแนะนำ หรือ None หากเกิด error")
     hotel_output: Optional[List[List[PlaceDetail]]] = Field(None, description="รายการโรงแรมที่จับคู่กับแต่ละแผน (index เดียวกับ plan_output) หรือ None หากเกิด error")
 
+class DayPatch(BaseModel):
+    status: Status = Field(..., description="สถานะการตอบกลับ: 'success' เมื่อแก้ได้ หรือ 'error' เมื่อทำตามคำสั่งไม่ได้")
+    description: str = Field(..., description="ข้อความสรุปสิ่งที่แก้ไข หรืออธิบายสาเหตุเมื่อเกิดข้อผิดพลาด")
+    itinerary: List[DayPlan] = Field(..., description="เฉพาะวันที่ถูกแก้ไข (คง day_index เดิม) เรียงตามวัน")
+
 # -----------------------------------------------------------------------------
 # System Instructions
 # -----------------------------------------------------------------------------
@@ -163,7 +271,8 @@ PLANNER_INSTRUCTIONS = """
 - hotel_output: แนะนำโรงแรมเสมอ 1-3 แห่งต่อแผน ไม่ว่าจะเป็นทริปกี่วัน (ผู้ใช้เลือกเอง)
 
 ฟิลด์ที่ระบบเติมให้อัตโนมัติ (ตั้งเป็น None เสมอ):
-- coordinates, google_maps_url, image_url → ระบบจะเติมให้ทีหลังจาก API ภายนอก ห้าม AI กรอกเอง
+- place_id, coordinates, google_maps_url, image_url → ระบบจะเติมให้ทีหลังจาก API ภายนอก ห้าม AI กรอกเอง
+- feasibility → ระบบตรวจเวลา/ระยะทางให้เอง ห้าม AI กรอกเอง
 
 ข้อห้าม:
 - ห้ามสร้างข้อมูลเท็จ — ถ้าไม่แน่ใจให้ใช้ None
@@ -190,7 +299,26 @@ CHANGE_PLANNER_INSTRUCTIONS = """
 - ห้ามลบข้อมูลที่ผู้ใช้ระบุไว้หากไม่ขัดข้อเท็จจริง
 - plan_output ต้องมีแผนเดียว (หรือ [] หากไม่สามารถสร้างได้)
 - hotel_output แนะนำ 1-3 แห่ง ใกล้ย่านท่องเที่ยวหลัก
+- coordinates, google_maps_url, image_url, feasibility → ตั้งเป็น None เสมอ (ระบบเติมให้อัตโนมัติ)
+- place_id → สถานที่เดิมที่ยังคงอยู่ในแผนต้องคง place_id เดิมไว้ทุกตัวอักษร ห้ามย้ายไปใส่สถานที่อื่น สถานที่ใหม่ให้เป็น None
+- แผนเดิมแบบย่อ (มีบรรทัด "คีย์ย่อ:" นำหน้า) → คีย์ที่ไม่ปรากฏคือ None หรือถูกตัดเพื่อประหยัด token, ข้อความที่ลงท้ายด้วย "…" ถูกย่อไว้
+  ตอบกลับด้วยชื่อฟิลด์เต็มตาม schema เสมอ สถานที่เดิมที่ไม่ได้แก้ให้คงข้อความตามที่เห็นหรือใส่ None — ระบบจะคืนรายละเอียดเต็มให้ตาม place_id
+- ห้ามสร้างข้อมูลเท็จ ถ้าไม่รู้ให้ใช้ None
+"""
+
+CHANGE_DAYS_INSTRUCTIONS = """
+คุณคือผู้ช่วยแก้ไขแผนท่องเที่ยวของประเทศไทยแบบรายวัน ตอบเป็น JSON ตาม DayPatch เท่านั้น
+
+อินพุต: คำสั่งแก้ไขจากผู้ใช้, วันที่ต้องแก้ (JSON เต็ม) และโครงร่างวันอื่นของทริป (ใช้อ้างอิงเท่านั้น)
+
+กฎสำคัญ:
+- itinerary ต้องมีเฉพาะวันที่ได้รับมาให้แก้ ครบทุกวันและคง day_index เดิม ห้ามส่งวันอื่นกลับมา
+- แก้เฉพาะตามคำสั่ง ส่วนที่คำสั่งไม่ได้พูดถึงให้คงเดิม (รวม place_id, start_time, order_in_day)
+- ห้ามเลือกสถานที่ซ้ำกับที่มีอยู่แล้วในวันอื่นของโครงร่าง
+- เฉพาะประเทศไทย ห้ามใส่โรงแรมใน itinerary
+- สถานที่ใหม่ให้ isnewplan = 'new_plan' และ place_id = None สถานที่เดิมคง place_id ไว้ทุกตัวอักษร
 - coordinates, google_maps_url, image_url → ตั้งเป็น None เสมอ (ระบบเติมให้อัตโนมัติ)
+- แผนแบบย่อ (มีบรรทัด "คีย์ย่อ:" นำหน้า) → คีย์ที่ไม่ปรากฏคือ None ตอบกลับด้วยชื่อฟิลด์เต็มตาม schema เสมอ
 - ห้ามสร้างข้อมูลเท็จ ถ้าไม่รู้ให้ใช้ None
 """
 
@@ -233,7 +361,48 @@ def _error_response(description: str) -> PlanResponse:
     return PlanResponse(status="error", description=description, plan_output=None, hotel_output=None)
 
 
-def _call_gemini_json(
+# header ที่ pipeline อยากแนบไปกับ response ของ request ปัจจุบัน (endpoint เป็นผู้สร้าง dict ให้)
+_response_meta: ContextVar[Optional[Dict[str, str]]] = ContextVar("response_meta", default=None)
+
+
+def _set_response_meta(header: str, value: str) -> None:
+    meta = _response_meta.get()
+    if meta is not None:
+        meta[header] = value
+
+
+def _report_prompt_tokens(caller_name: str, system_instruction: str, prompt: str) -> None:
+    """ประมาณ token ของ prompt ก่อนเรียกโมเดล -> metric + header X-Prompt-Tokens-Est"""
+    prompt_tokens = estimate_tokens(system_instruction) + estimate_tokens(prompt)
+    PROMPT_TOKENS.labels(METRICS_APP, caller_name).observe(prompt_tokens)
+    _set_response_meta("X-Prompt-Tokens-Est", str(prompt_tokens))
+    logger.info(f"{caller_name}: prompt ~{prompt_tokens} tokens")
+
+
+def _json_config(system_instruction: str, schema: type) -> types.GenerateContentConfig:
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema,
+        system_instruction=system_instruction,
+        thinking_config=types.ThinkingConfig(thinking_budget=0),
+    )
+
+
+def _parse_json_output(raw: str, schema: type, caller_name: str) -> tuple[Optional[str], Optional[BaseModel]]:
+    """แปลงข้อความ JSON จากโมเดลเป็น schema — return (error_description | None, parsed_result | None)"""
+    raw = (raw or "").strip()
+    if not raw:
+        return "Output Error", None
+    try:
+        with stage_timer(METRICS_APP, "parse_validate"):
+            parsed = validate_json(schema, raw)
+    except ValidationError as exc:
+        logger.error(f"{caller_name}: schema/json error: {exc}")
+        return "Schema Validation Error", None
+    return None, parsed
+
+
+async def _call_gemini_json(
     model: str,
     prompt: str,
     system_instruction: str,
@@ -241,34 +410,165 @@ def _call_gemini_json(
     caller_name: str = "gemini",
 ) -> tuple[Optional[str], Optional[BaseModel]]:
     """เรียก Gemini ด้วย JSON schema แล้ว return (error_description | None, parsed_result | None)"""
-    client = genai.Client()
-    resp = client.models.generate_content(
-        model=model,
-        contents=prompt,
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json",
-            response_schema=schema,
-            system_instruction=system_instruction,
-            thinking_config=types.ThinkingConfig(thinking_budget=0),
-        ),
+    client = gemini_client.get_client()
+    config = _json_config(system_instruction, schema)
+    resp = await gemini_client.call_model(
+        model,
+        lambda m: client.aio.models.generate_content(model=m, contents=prompt, config=config),
+        fallback_model=settings.GEMINI_FALLBACK_MODEL,
     )
-    raw = (resp.text or "").strip()
-    if not raw:
-        return "Output Error", None
-    try:
-        parsed = schema(**json.loads(raw))
-    except (ValidationError, json.JSONDecodeError) as exc:
-        logger.error(f"{caller_name}: schema/json error: {exc}")
-        return "Schema Validation Error", None
-    return None, parsed
+    return _parse_json_output(resp.text, schema, caller_name)
+
+
+async def _stream_gemini_text(model: str, prompt: str, system_instruction: str, schema: type) -> AsyncIterator[str]:
+    """เรียก Gemini แบบ streaming ด้วย JSON schema แล้ว yield ข้อความทีละ chunk
+
+    retry ได้เฉพาะก่อนได้ chunk แรก (หลังจากนั้นผู้รับได้ข้อความบางส่วนไปแล้ว) และไม่ hedge
+    """
+    client = gemini_client.get_client()
+    policy = gemini_client.DEFAULT_RETRY_POLICY
+    deadline = time.monotonic() + policy.deadline
+    attempt = 1
+    while True:
+        started = False
+        try:
+            async with gemini_client.limiter(model).slot():
+                with outbound_call(f"gemini:{model}"):
+                    stream = await client.aio.models.generate_content_stream(
+                        model=model,
+                        contents=prompt,
+                        config=_json_config(system_instruction, schema),
+                    )
+                    async for chunk in stream:
+                        if chunk.text:
+                            started = True
+                            yield chunk.text
+            return
+        except Exception as exc:
+            delay = policy.backoff(attempt)
+            if started or attempt >= policy.max_attempts or not is_retryable(exc) or time.monotonic() + delay >= deadline:
+                raise
+            MODEL_RETRIES.labels(f"gemini:{model}", error_status(exc)).inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class _ArrayItemScanner:
+    """ดึง object ที่ปิดวงเล็บครบแล้วใน array `key` ระดับบนสุด จาก JSON ที่ทยอย stream เข้ามา
+
+    ใช้เพื่อส่ง OutputPlan แต่ละตัวออกไปได้ทันทีโดยไม่ต้องรอให้ PlanResponse ทั้งก้อนเสร็จ
+    """
+
+    def __init__(self, key: str):
+        self.text = ""
+        self._key = key
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._escape = False
+        self._str_start: Optional[int] = None
+        self._last_key: Optional[str] = None
+        self._in_array = False
+        self._array_done = False
+        self._item_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[str]:
+        self.text += chunk
+        items: List[str] = []
+        buf = self.text
+        for i in range(self._pos, len(buf)):
+            c = buf[i]
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_str = False
+                    if self._str_start is not None:
+                        self._last_key = buf[self._str_start:i]
+                        self._str_start = None
+                continue
+            if c == '"':
+                self._in_str = True
+                self._str_start = i + 1 if self._depth == 1 else None
+            elif c == "[":
+                if self._depth == 1 and not self._array_done and self._last_key == self._key:
+                    self._in_array = True
+                self._depth += 1
+            elif c == "{":
+                if self._in_array and self._depth == 2:
+                    self._item_start = i
+                self._depth += 1
+            elif c == "}":
+                self._depth -= 1
+                if self._in_array and self._depth == 2 and self._item_start is not None:
+                    items.append(buf[self._item_start:i + 1])
+                    self._item_start = None
+            elif c == "]":
+                self._depth -= 1
+                if self._in_array and self._depth == 1:
+                    self._in_array = False
+                    self._array_done = True
+        self._pos = len(buf)
+        return items
 
 
 # -----------------------------------------------------------------------------
 # Helpers — External Data
 # -----------------------------------------------------------------------------
-def get_image(name: str) -> tuple[Optional[str], List[str]]:
+# cache ผล lookup ข้าม request/restart (key = ชื่อสถานที่ที่ normalize แล้ว) — เก็บเฉพาะผลที่สำเร็จ
+_coords_cache = KVCache("place_coords", settings.PLACE_CACHE_TTL, settings.PLACE_CACHE_MAX_ENTRIES, settings.CACHE_DB_PATH)
+_image_cache = KVCache("place_images", settings.PLACE_CACHE_TTL, settings.PLACE_CACHE_MAX_ENTRIES, settings.CACHE_DB_PATH)
+
+# gazetteer ในเครื่อง (mmap, read-only) — ลองก่อน scrape Google Maps
+try:
+    _gazetteer = gazetteer.open_index(settings.GAZETTEER_PATH)
+except (OSError, ValueError) as e:
+    logger.warning(f"Gazetteer: cannot open {settings.GAZETTEER_PATH}: {e}")
+    _gazetteer = None
+
+# HTTP client กลางสำหรับ Google Custom Search / Maps (async + keep-alive) — ปิดใน lifespan
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=settings.ENRICH_REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=settings.ENRICH_CONCURRENCY * 2),
+        )
+    return _http_client
+
+
+async def _close_http_client() -> None:
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+# circuit breaker ต่อ host: Google throttle/บล็อก -> ตอบ fallback ทันทีแทนการรอ timeout ทุกสถานที่
+_search_breaker = CircuitBreaker("google_customsearch", settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_TIMEOUT)
+_maps_breaker = CircuitBreaker("google_maps", settings.BREAKER_FAILURE_THRESHOLD, settings.BREAKER_RESET_TIMEOUT)
+
+
+def _is_upstream_failure(response: httpx.Response) -> bool:
+    """throttle/บล็อก/ล่ม: 403, 429, 5xx หรือถูก redirect ไปหน้า /sorry/ (captcha ของ Google)"""
+    if response.status_code in (403, 429) or response.status_code >= 500:
+        return True
+    return "/sorry/" in response.headers.get("location", "")
+
+
+async def get_image(name: str) -> tuple[Optional[str], List[str]]:
     """ค้นหารูปภาพจาก Google Custom Search API — คืน (error_msg | None, image_urls)"""
-    url = "https://www.googleapis.com/customsearch/v1"
+    cache_key = normalize_name(name)
+    cached = await _image_cache.aget(cache_key)
+    if cached:
+        return None, cached
+
+    url = settings.GOOGLE_CUSTOMSEARCH_URL
     params = {
         "q": name,
         "cx": settings.CX_ID,
@@ -278,8 +578,18 @@ def get_image(name: str) -> tuple[Optional[str], List[str]]:
         "safe": "active",
     }
 
+    if not _search_breaker.allow():
+        return "Google Custom Search: circuit open", _FALLBACK_IMAGES
+
     try:
-        response = requests.get(url, params=params, timeout=10)
+        try:
+            with outbound_call("google_customsearch") as call:
+                response = await _get_http_client().get(url, params=params)
+                call.status = str(response.status_code)
+        except httpx.HTTPError:
+            _search_breaker.record_failure()
+            raise
+        _search_breaker.record(_is_upstream_failure(response))
         response.raise_for_status()
         data = response.json()
 
@@ -290,6 +600,7 @@ def get_image(name: str) -> tuple[Optional[str], List[str]]:
             return f"ไม่พบรูปภาพสำหรับคำว่า: {name}", _FALLBACK_IMAGES
 
         image_urls = [item["link"] for item in data["items"]]
+        await _image_cache.aset(cache_key, image_urls)
         return None, image_urls
 
     except Exception as e:
@@ -301,17 +612,50 @@ def get_map_url(name: str) -> str:
     return f"https://www.google.com/maps/search/?api=1&query={quote_plus(name or '')}"
 
 
-def get_coordinates(name: str) -> Optional[Coordinates]:
-    """พยายามดึงพิกัดจาก Google Maps redirect"""
+def _gazetteer_coordinates(name: str) -> Optional[Coordinates]:
+    if _gazetteer is None or not name:
+        return None
+    hit = _gazetteer.lookup(name, fuzzy=settings.GAZETTEER_FUZZY)
+    GAZETTEER_LOOKUPS.labels(hit.match if hit else "miss").inc()
+    if hit is None:
+        return None
+    if hit.match != "exact":
+        logger.debug(f"Coordinates: gazetteer {hit.match} match '{name}' -> '{hit.key}'")
+    return Coordinates(lat=hit.lat, lng=hit.lng)
+
+
+async def get_coordinates(name: str) -> Optional[Coordinates]:
+    """หาพิกัด: cache -> gazetteer ในเครื่อง -> Google Maps redirect"""
+    cache_key = normalize_name(name)
+    cached = await _coords_cache.aget(cache_key)
+    if cached:
+        return Coordinates(**cached)
+
+    coords = _gazetteer_coordinates(name)
+    if coords is not None:
+        return coords
+
+    if not _maps_breaker.allow():
+        return None
+
     try:
         encoded_name = quote_plus(name or "")
-        url = f"https://www.google.com/maps/search/?api=1&query={encoded_name}"
+        url = f"{settings.GOOGLE_MAPS_LOOKUP_URL}?api=1&query={encoded_name}"
         headers = {"User-Agent": "Mozilla/5.0"}
-        response = requests.get(url, headers=headers, allow_redirects=False, timeout=10)
+        try:
+            with outbound_call("google_maps") as call:
+                response = await _get_http_client().get(url, headers=headers, follow_redirects=False)
+                call.status = str(response.status_code)
+        except httpx.HTTPError:
+            _maps_breaker.record_failure()
+            raise
+        _maps_breaker.record(_is_upstream_failure(response))
         matches = re.findall(r"(?<=center=)(.*?)(?=&)", response.text)
         if matches:
             lat, lon = matches[0].split("%2C")
-            return Coordinates(lat=float(lat), lng=float(lon))
+            coords = Coordinates(lat=float(lat), lng=float(lon))
+            await _coords_cache.aset(cache_key, coords.model_dump())
+            return coords
         else:
             logger.warning(f"Coordinates: Could not find coordinates in redirect for '{name}'")
             return None
@@ -320,45 +664,111 @@ def get_coordinates(name: str) -> Optional[Coordinates]:
         return None
 
 
-def enrich_place_detail(p: PlaceDetail) -> PlaceDetail:
+# สถานที่ชื่อซ้ำที่ lookup พร้อมกัน (หลายตัวเลือก/หลายแผนใน batch) ใช้ request เดียวกัน
+_lookup_inflight = InflightCoalescer()
+
+
+async def enrich_place_detail(p: PlaceDetail) -> PlaceDetail:
     """เติมข้อมูลที่ขาด (พิกัด, แผนที่, รูปภาพ) ให้ PlaceDetail"""
     try:
+        name_key = normalize_name(p.name)
         if p.coordinates is None:
-            coords = get_coordinates(p.name)
+            coords, _ = await _lookup_inflight.run(f"coords:{name_key}", lambda: get_coordinates(p.name))
             if coords:
-                p.coordinates = coords
+                p.coordinates = coords.model_copy()
         if not p.google_maps_url:
             p.google_maps_url = get_map_url(p.name)
         if not p.image_url and settings.GOOGLE_CLOUD_API_KEY and settings.CX_ID:
-            error, img = get_image(p.name)
+            (error, img), _ = await _lookup_inflight.run(f"image:{name_key}", lambda: get_image(p.name))
             if error:
                 logger.warning(error)
-            p.image_url = img if img else None
+            p.image_url = list(img) if img else None
     except Exception as e:
         logger.warning(f"enrich_place_detail: error for '{p.name}': {e}")
     return p
 
 
-def enrich_all_places(plan: PlanResponse) -> PlanResponse:
-    """เติมข้อมูลสถานที่ในทั้งแผน (เฉพาะรายการใหม่)"""
+# จำกัดจำนวน lookup ที่วิ่งพร้อมกันทั้ง process (ทุก request ของ API ใช้ร่วมกัน)
+_enrich_semaphore = asyncio.Semaphore(settings.ENRICH_CONCURRENCY)
+
+
+def _needs_enrich(p: Optional[PlaceDetail]) -> bool:
+    return p is not None and (p.isnewplan is None or p.isnewplan == "new_plan")
+
+
+async def _enrich_bounded(p: PlaceDetail) -> PlaceDetail:
+    async with _enrich_semaphore:
+        with stage_timer(METRICS_APP, "enrich_place"):
+            return await enrich_place_detail(p)
+
+
+def iter_places(plan: PlanResponse) -> Iterator[tuple[Dict[str, Any], PlaceDetail]]:
+    """ไล่ทุกสถานที่ในแผน (จุดแวะทุกวัน + โรงแรม) พร้อมตำแหน่ง {"option","day","stop"} หรือ {"option","hotel"}"""
+    for oi, option in enumerate(plan.plan_output or []):
+        for di, day in enumerate(option.itinerary):
+            for si, stop in enumerate(day.stops):
+                if stop.places is not None:
+                    yield {"option": oi, "day": di, "stop": si}, stop.places
+    for oi, hotel_list in enumerate(plan.hotel_output or []):
+        for hi, hotel in enumerate(hotel_list):
+            if hotel is not None:
+                yield {"option": oi, "hotel": hi}, hotel
+
+
+def _new_place_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+
+def assign_place_ids(plan: PlanResponse) -> PlanResponse:
+    """ให้ place_id กับสถานที่ที่ยังไม่มี (หรือ id ซ้ำกับสถานที่ก่อนหน้า) — id คงเดิมข้ามการแก้แผน"""
+    seen = set()
+    for _, place in iter_places(plan):
+        if not place.place_id or place.place_id in seen:
+            place.place_id = _new_place_id()
+        seen.add(place.place_id)
+    return plan
+
+
+def _enrich_targets(plan: PlanResponse) -> List[tuple[Dict[str, Any], PlaceDetail]]:
+    """รายการสถานที่ที่ต้องเติมข้อมูล พร้อมตำแหน่ง (index ใน plan_output/hotel_output)"""
+    return [(path, place) for path, place in iter_places(plan) if _needs_enrich(place)]
+
+
+async def iter_enriched_places(plan: PlanResponse) -> AsyncIterator[tuple[Dict[str, Any], PlaceDetail]]:
+    """เติมข้อมูลสถานที่ในทั้งแผน (เฉพาะรายการใหม่) แบบขนาน แล้ว yield (ตำแหน่ง, สถานที่) ตามลำดับที่เสร็จ
+
+    สถานที่ที่ยังไม่เสร็จภายใน ENRICH_DEADLINE จะถูกยกเลิกและคงค่าเท่าที่เติมได้ (ไม่รอให้ช้าทั้งแผน)
+    """
+    targets = _enrich_targets(plan)
+    if not targets:
+        return
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.ENRICH_DEADLINE
+    tasks = {asyncio.create_task(_enrich_bounded(p)): path for path, p in targets}
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    yield tasks[task], task.result()
+    finally:
+        if pending:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"enrich_all_places: {len(pending)}/{len(tasks)} places exceeded deadline {settings.ENRICH_DEADLINE}s")
+
+
+async def enrich_all_places(plan: PlanResponse) -> PlanResponse:
+    """เติมข้อมูลสถานที่ในทั้งแผน (เฉพาะรายการใหม่) — ดู iter_enriched_places"""
     try:
-        if plan.plan_output:
-            for option in plan.plan_output:
-                for day in option.itinerary:
-                    for stop in day.stops:
-                        if stop.places and (stop.places.isnewplan is None or stop.places.isnewplan == "new_plan"):
-                            stop.places = enrich_place_detail(stop.places)
-        if plan.hotel_output:
-            enriched_hotels: List[List[PlaceDetail]] = []
-            for hotel_list in plan.hotel_output:
-                current: List[PlaceDetail] = []
-                for hotel in hotel_list:
-                    if hotel.isnewplan is None or hotel.isnewplan == "new_plan":
-                        current.append(enrich_place_detail(hotel))
-                    else:
-                        current.append(hotel)
-                enriched_hotels.append(current)
-            plan.hotel_output = enriched_hotels
+        with stage_timer(METRICS_APP, "enrich"):
+            async for _ in iter_enriched_places(plan):
+                pass
     except Exception as e:
         logger.warning(f"enrich_all_places: {e}")
     return plan
@@ -366,8 +776,27 @@ def enrich_all_places(plan: PlanResponse) -> PlanResponse:
 # -----------------------------------------------------------------------------
 # Google Research (เปิด tools เฉพาะเฟสนี้)
 # -----------------------------------------------------------------------------
-def research_from_user_input(user_input: str) -> str:
-    client = genai.Client()
+# cache ผล research — key เชิงความหมาย (ปลายทาง/จำนวนวัน/เดือน/สไตล์ + ช่วงวันที่) ดู research_key.py
+_research_cache = KVCache("research", settings.RESEARCH_CACHE_TTL, settings.RESEARCH_CACHE_MAX_ENTRIES, settings.CACHE_DB_PATH)
+# คำขอปลายทางเดียวกันที่มาพร้อมกัน (เช่น ใน batch) รอผล research ชุดเดียว
+_research_inflight = InflightCoalescer()
+
+
+async def research_from_user_input(user_input: str) -> str:
+    cache_key = research_cache_key(user_input, date.today(), settings.RESEARCH_CACHE_BUCKET_DAYS)
+    cached = await _research_cache.aget(cache_key)
+    if cached:
+        logger.info(f"research cache hit: {cache_key}")
+        _set_response_meta("X-Research-Cache", "hit")
+        return cached
+
+    research, shared = await _research_inflight.run(cache_key, lambda: _research_uncached(user_input, cache_key))
+    _set_response_meta("X-Research-Cache", "shared" if shared else "miss")
+    return research
+
+
+async def _research_uncached(user_input: str, cache_key: str) -> str:
+    client = gemini_client.get_client()
     google_search_tool = types.Tool(google_search=types.GoogleSearch())
 
     now = datetime.now()
@@ -385,38 +814,52 @@ def research_from_user_input(user_input: str) -> str:
         "- สรุปผลเป็นข้อความ plain text เพื่อนำไปใช้สร้างแผนต่อ โดยไม่สร้างแผนเอง"
     )
 
-    resp = client.models.generate_content(
-        model=settings.GEMINI_MODEL_MED,
-        contents=prompt,
-        config=types.GenerateContentConfig(
-            system_instruction=SEARCH_INSTRUCTIONS,
-            thinking_config=types.ThinkingConfig(thinking_budget=0),
-            tools=[google_search_tool],
-        ),
+    config = types.GenerateContentConfig(
+        system_instruction=SEARCH_INSTRUCTIONS,
+        thinking_config=types.ThinkingConfig(thinking_budget=0),
+        tools=[google_search_tool],
     )
-
-    return (resp.text or "").strip()
+    with stage_timer(METRICS_APP, "research"):
+        resp = await gemini_client.call_model(
+            settings.GEMINI_MODEL_MED,
+            lambda m: client.aio.models.generate_content(model=m, contents=prompt, config=config),
+            fallback_model=settings.GEMINI_FALLBACK_MODEL,
+        )
+
+    research = (resp.text or "").strip()
+    if research:
+        await _research_cache.aset(cache_key, research)
+    return research
 
 # -----------------------------------------------------------------------------
 # Gemini helpers (ไม่มี tools ในเฟสสร้าง/แก้แผน)
 # -----------------------------------------------------------------------------
-def intent_check(user_input: str) -> CheckResponse:
-    err, result = _call_gemini_json(
-        model=settings.GEMINI_MODEL_LOW,
-        prompt=user_input,
-        system_instruction=PLANNER_CHECK,
-        schema=CheckResponse,
-        caller_name="intent_check",
-    )
+async def intent_check(user_input: str) -> CheckResponse:
+    with stage_timer(METRICS_APP, "intent"):
+        err, result = await _call_gemini_json(
+            model=settings.GEMINI_MODEL_LOW,
+            prompt=user_input,
+            system_instruction=PLANNER_CHECK,
+            schema=CheckResponse,
+            caller_name="intent_check",
+        )
     if err or result is None:
         raise ValueError(f"intent_check: {err or 'empty response'}")
     return result
 
 
-def create_plan(user_input: str, research: str = "", options: int = 1) -> PlanResponse:
-    options = max(1, min(options, 3))
+# แนวทางของแต่ละตัวเลือกเมื่อสร้างแยก call กัน (โมเดลไม่เห็นตัวเลือกอื่น จึงต้องกำหนดให้ต่างกันตั้งแต่แรก)
+_OPTION_HINTS = (
+    "แผนหลัก: สถานที่ยอดนิยมที่ตรงคำขอที่สุด จัดเวลาสมดุล",
+    "ทางเลือกที่ต่างจากแผนหลัก: เน้นธรรมชาติ ชุมชน และร้านท้องถิ่นที่คนไม่พลุกพล่าน เลี่ยงสถานที่ยอดนิยมอันดับต้น ๆ",
+    "ทางเลือกที่ต่างจากแผนหลัก: เน้นคาเฟ่ ศิลปะ ตลาด และกิจกรรมช่วงเย็น/กลางคืน เลี่ยงสถานที่ยอดนิยมอันดับต้น ๆ",
+)
+
+
+def _build_create_prompt(user_input: str, research: str, options: int, option_hint: Optional[str] = None) -> str:
     research_text = research.strip() if research and research.strip() else "(ไม่มีข้อมูลเพิ่มเติมจากการค้นหา)"
     current_date = datetime.now().strftime("%Y-%m-%d")
+    hint_text = f"\nแนวทางของตัวเลือกนี้: {option_hint}\n" if option_hint else ""
     prompt = f"""โหมดสร้างแผนท่องเที่ยวใหม่
 วันที่ปัจจุบัน: {current_date}
 คำขอของผู้ใช้:
@@ -425,16 +868,22 @@ def create_plan(user_input: str, research: str = "", options: int = 1) -> PlanRe
 จำนวนตัวเลือกแผน (options): {options}
 → plan_output ต้องมีความยาวเท่ากับ {options} เท่านั้น ห้ามสร้างเกินหรือน้อยกว่า
 → hotel_output ต้องมีจำนวนลิสต์เท่ากับ plan_output (จับคู่ index)
-
+{hint_text}
 --- ข้อมูลจาก Google Search (ใช้เป็นแหล่งอ้างอิง ห้ามสร้างข้อมูลเกินนี้) ---
 {research_text}
 --- สิ้นสุดข้อมูลสืบค้น ---
 
 โปรดสร้างแผนตามข้อกำหนดที่ได้รับ โดยใช้ข้อมูลจากการสืบค้นข้างต้นเป็นหลัก และเพิ่มคำเตือนเมื่อจำเป็น"""
+    return prompt
 
-    err, plan = _call_gemini_json(
+
+async def create_plan(user_input: str, research: str = "", options: int = 1, option_hint: Optional[str] = None) -> PlanResponse:
+    options = max(1, min(options, 3))
+    if options > 1 and settings.PARALLEL_OPTIONS:
+        return _merge_options(await _create_options(user_input, research, options))
+    err, plan = await _call_gemini_json(
         model=settings.GEMINI_MODEL_HIGH,
-        prompt=prompt,
+        prompt=_build_create_prompt(user_input, research, options, option_hint),
         system_instruction=PLANNER_INSTRUCTIONS,
         schema=PlanResponse,
         caller_name="create_plan",
@@ -444,7 +893,99 @@ def create_plan(user_input: str, research: str = "", options: int = 1) -> PlanRe
     return plan
 
 
-def modify_plan_with_ai(instruction: Optional[str], old_json_text: str, research: str = "") -> PlanResponse:
+def _create_option_tasks(user_input: str, research: str, options: int) -> List[asyncio.Task]:
+    """หนึ่ง call ต่อหนึ่งตัวเลือก (options=1 + แนวทางเฉพาะของตัวเลือกนั้น) รันพร้อมกัน — task ที่ i คือตัวเลือก index i"""
+    return [
+        asyncio.ensure_future(create_plan(user_input, research, options=1, option_hint=_OPTION_HINTS[i]))
+        for i in range(options)
+    ]
+
+
+async def _create_options(user_input: str, research: str, options: int) -> List[Any]:
+    tasks = _create_option_tasks(user_input, research, options)
+    try:
+        return await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def _merge_options(results: List[Any]) -> PlanResponse:
+    """รวมผลของแต่ละตัวเลือกเป็น plan_output/hotel_output ตามลำดับใน results — ตัวเลือกที่ล้มถูกข้าม (ล้มหมด = error)"""
+    plans: List[OutputPlan] = []
+    hotels: List[List[PlaceDetail]] = []
+    description = None
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException) or result.status != "success" or not result.plan_output:
+            reason = result if isinstance(result, BaseException) else result.description
+            logger.warning(f"create_plan: option {index} failed ({reason})")
+            continue
+        plans.append(result.plan_output[0])
+        hotels.append((result.hotel_output or [[]])[0])
+        description = description or result.description
+    if plans:
+        return PlanResponse(status="success", description=description, plan_output=plans, hotel_output=hotels)
+    overloaded = [r for r in results if isinstance(r, UpstreamOverloaded)]
+    if overloaded:
+        raise overloaded[0]
+    errors = [r for r in results if isinstance(r, PlanResponse)]
+    return errors[0] if errors else _error_response("Output Error")
+
+
+async def create_plan_stream(user_input: str, research: str = "", options: int = 1) -> AsyncIterator[Any]:
+    """เหมือน create_plan แต่ yield (index, OutputPlan) ทันทีที่แต่ละตัวเลือกพร้อม และปิดท้ายด้วย PlanResponse ฉบับเต็ม
+
+    index คือตำแหน่งของตัวเลือกนั้นใน plan_output ของ PlanResponse ฉบับเต็มเสมอ (path ของ event อื่นอ้างตาม index นี้)
+    โหมด PARALLEL_OPTIONS: ตัวเลือกเรียงตามลำดับที่เสร็จ ตัวเลือกที่ล้มไม่มีช่อง — index จึงเป็นตัวนับตัวเลือกที่สำเร็จ
+    """
+    options = max(1, min(options, 3))
+    if options > 1 and settings.PARALLEL_OPTIONS:
+        tasks = _create_option_tasks(user_input, research, options)
+        results: List[Any] = [None] * options
+
+        async def indexed(index: int) -> int:
+            try:
+                results[index] = await tasks[index]
+            except Exception as e:
+                results[index] = e
+            return index
+
+        try:
+            # ตัวเลือกที่ล้มอาจเสร็จทีหลังตัวที่ส่งไปแล้ว — plan ฉบับเต็มจึงรวมตามลำดับที่เสร็จ ไม่ใช่ตาม index ที่ขอ
+            completed: List[Any] = []
+            sent = 0
+            for next_done in asyncio.as_completed([indexed(i) for i in range(options)]):
+                result = results[await next_done]
+                completed.append(result)
+                if isinstance(result, PlanResponse) and result.status == "success" and result.plan_output:
+                    yield sent, result.plan_output[0]
+                    sent += 1
+            yield _merge_options(completed)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return
+
+    scanner = _ArrayItemScanner("plan_output")
+    stream = _stream_gemini_text(
+        model=settings.GEMINI_MODEL_HIGH,
+        prompt=_build_create_prompt(user_input, research, options),
+        system_instruction=PLANNER_INSTRUCTIONS,
+        schema=PlanResponse,
+    )
+    index = 0
+    async for chunk in stream:
+        for item in scanner.feed(chunk):
+            try:
+                yield index, validate_json(OutputPlan, item)
+                index += 1
+            except ValidationError as exc:
+                logger.warning(f"create_plan_stream: skip partial option: {exc}")
+    err, plan = _parse_json_output(scanner.text, PlanResponse, "create_plan_stream")
+    yield _error_response(err or "Output Error") if err or plan is None else plan
+
+
+async def modify_plan_with_ai(instruction: Optional[str], old_json_text: str, research: str = "") -> PlanResponse:
     instruction_text = (instruction or "").strip()
     user_instruction = instruction_text if instruction_text else "(auto-fix mode: ไม่มีคำสั่งเพิ่มเติม)"
     research_text = research.strip() if research and research.strip() else "(ไม่มีข้อมูลเพิ่มเติมจากการค้นหา)"
@@ -461,8 +1002,9 @@ Instruction จากผู้ใช้: {user_instruction}
 {research_text}
 --- สิ้นสุดข้อมูลสืบค้น ---
 """
+    _report_prompt_tokens("modify_plan_with_ai", CHANGE_PLANNER_INSTRUCTIONS, prompt)
 
-    err, new_plan = _call_gemini_json(
+    err, new_plan = await _call_gemini_json(
         model=settings.GEMINI_MODEL_HIGH,
         prompt=prompt,
         system_instruction=CHANGE_PLANNER_INSTRUCTIONS,
@@ -473,119 +1015,639 @@ Instruction จากผู้ใช้: {user_instruction}
         return _error_response(err or "Output Error")
     return new_plan
 
+
+async def modify_days_with_ai(instruction: str, data: Dict[str, Any], days: set, compact: bool = False) -> DayPatch:
+    """ให้โมเดลสร้างใหม่เฉพาะวันที่คำสั่งพูดถึง (data = แผนเดิมที่ strip แล้ว) — วันอื่นส่งไปเป็นโครงร่างสั้น ๆ"""
+    option = data["plan_output"][0]
+    target = [day for day in option["itinerary"] if day.get("day_index") in days]
+    outline = [
+        f"วันที่ {day.get('day_index')}: "
+        + ", ".join(str(stop["places"].get("name")) for stop in day.get("stops") or [] if isinstance((stop or {}).get("places"), dict))
+        for day in option["itinerary"]
+        if day.get("day_index") not in days
+    ]
+    hotels = [h.get("name") for hotel_list in data.get("hotel_output") or [] for h in hotel_list or [] if isinstance(h, dict)]
+    if compact:
+        days_text = f"{_COMPACT_LEGEND}\n" + json.dumps(_compact_value({"itinerary": target}), ensure_ascii=False, separators=(",", ":"))
+    else:
+        days_text = json.dumps({"itinerary": target}, ensure_ascii=False)
+    current_date = datetime.now().strftime("%Y-%m-%d")
+    prompt = f"""โหมดแก้ไขแผนท่องเที่ยวรายวัน
+วันที่ปัจจุบัน: {current_date}
+Instruction จากผู้ใช้: {instruction}
+ทริป: {option.get("name") or "-"} ({len(option["itinerary"])} วัน) โรงแรม: {", ".join(filter(None, hotels)) or "-"}
+
+--- วันที่ต้องแก้ ({", ".join(str(d) for d in sorted(days))}) ---
+{days_text}
+--- สิ้นสุดวันที่ต้องแก้ ---
+
+--- โครงร่างวันอื่น (ห้ามแก้ ใช้อ้างอิงเท่านั้น) ---
+{chr(10).join(outline) or "-"}
+--- สิ้นสุดโครงร่าง ---
+"""
+    _report_prompt_tokens("modify_days_with_ai", CHANGE_DAYS_INSTRUCTIONS, prompt)
+
+    err, patch = await _call_gemini_json(
+        model=settings.GEMINI_MODEL_HIGH,
+        prompt=prompt,
+        system_instruction=CHANGE_DAYS_INSTRUCTIONS,
+        schema=DayPatch,
+        caller_name="modify_days_with_ai",
+    )
+    if err or patch is None:
+        return DayPatch(status="error", description=err or "Output Error", itinerary=[])
+    return patch
+
 # -----------------------------------------------------------------------------
 # Token & Quota Optimization
 # -----------------------------------------------------------------------------
-def extract_and_strip_old_plan(olddata_text: str) -> tuple[str, dict]:
-    """สกัดข้อมูลพิกัด/ลิงก์ออกเพื่อประหยัด Token และเก็บไว้คืนค่าทีหลังเพื่อประหยัด Quota API"""
-    old_places_map = {}
+# ข้อมูลจาก API ภายนอกที่ถอดออกก่อนส่งให้โมเดล แล้วคืนกลับตาม place_id
+_ENRICHED_FIELDS = ("coordinates", "google_maps_url", "image_url")
+_PLACE_FIELD_ADAPTERS = {field: TypeAdapter(info.annotation) for field, info in PlaceDetail.model_fields.items()}
+
+# คีย์ย่อของแผนเดิมแบบ compact (คำอธิบายคีย์นำหน้า JSON ใน prompt — โมเดลตอบกลับด้วยชื่อเต็มตาม schema)
+_COMPACT_KEYS = {
+    "plan_output": "P", "hotel_output": "H",
+    "name": "n", "overview": "ov", "budget_price": "b", "style": "sy", "itinerary": "it", "warnings": "w",
+    "day_index": "d", "summary": "sm", "stops": "s",
+    "order_in_day": "o", "places": "p", "start_time": "t", "stay_duration": "m",
+    "place_id": "id", "type": "ty", "short_description": "ds", "notes": "nt", "opening_hours": "oh",
+    "price_info": "pr", "reservation_recommended": "rv", "isnewplan": "np", "des_warnings": "dw",
+}
+_COMPACT_LEGEND = "คีย์ย่อ: " + ", ".join(f"{alias}={key}" for key, alias in _COMPACT_KEYS.items())
+# ฟิลด์ที่ตัดออกเมื่อเกินงบ token เรียงจากคุณค่าต่ำสุด (วันที่คำสั่งไม่ได้พูดถึงถูกตัดก่อน)
+# ตัดได้เฉพาะฟิลด์ Optional — short_description บังคับใน schema ถ้าตัดเป็น None โมเดลต้องแต่งข้อความใหม่มาแทน
+_TRIM_ORDER = ("notes", "price_info", "des_warnings", "opening_hours")
+_SUMMARY_CHARS = 40
+
+# "วันที่ 2", "วัน 3", "day 1" — ไม่นับ "3 วัน 2 คืน" (ตัวเลขนำหน้าคือระยะเวลา) และ "Sunday 2pm" (day ท้ายชื่อวัน)
+_DAY_REF_RE = re.compile(r"(?<!\d)(?<!\d )(?:วันที่|วัน|(?<![a-z])day)\s*(\d{1,2})", re.IGNORECASE)
+# วันที่ตามปฏิทิน ("วันที่ 2 ธันวาคม", "ไปวันที่ 1/12", "5 ธ.ค.") ไม่ใช่วันของทริป — คำสั่งที่มีวันที่ต้องสร้างใหม่ทั้งแผน
+_MONTH_NAMES = (
+    r"มกราคม|กุมภาพันธ์|มีนาคม|เมษายน|พฤษภาคม|มิถุนายน|กรกฎาคม|สิงหาคม|กันยายน|ตุลาคม|พฤศจิกายน|ธันวาคม"
+    r"|ม\.?ค\.|ก\.?พ\.|มี\.?ค\.|เม\.?ย\.|พ\.?ค\.|มิ\.?ย\.|ก\.?ค\.|ส\.?ค\.|ก\.?ย\.|ต\.?ค\.|พ\.?ย\.|ธ\.?ค\."
+    r"|(?:january|february|march|april|may|june|july|august|september|october|november|december"
+    r"|jan|feb|mar|apr|jun|jul|aug|sept?|oct|nov|dec)\b"
+)
+_CALENDAR_DATE_RE = re.compile(
+    rf"(?<!\d)\d{{1,2}}\s*(?:{_MONTH_NAMES})|(?:วันที่|วัน|(?<![a-z])day)\s*\d{{1,2}}\s*[/.\-]\s*\d", re.IGNORECASE
+)
+_FIRST_DAY_RE = re.compile(r"วันแรก|first day", re.IGNORECASE)
+_LAST_DAY_RE = re.compile(r"วันสุดท้าย|last day", re.IGNORECASE)
+
+
+def estimate_tokens(text: str) -> int:
+    """ประมาณจำนวน token โดยไม่เรียก API: ASCII ~4 ตัวอักษร/token, อักษรไทย ~2 ตัวอักษร/token"""
+    chars = len(text)
+    wide = (len(text.encode("utf-8")) - chars) // 2  # อักษรไทยใช้ 3 ไบต์ใน UTF-8
+    return math.ceil((chars - wide) / 4 + wide / 2)
+
+
+def referenced_days(instruction: Optional[str], n_days: int) -> Optional[set]:
+    """วันที่คำสั่งพูดถึง (เช่น 'วันที่ 2', 'day 3', 'วันสุดท้าย') — None = ไม่ระบุวัน (ถือว่าแก้ได้ทุกวัน)
+
+    คำสั่งที่มีวันที่ตามปฏิทิน (เช่น 'เลื่อนไปวันที่ 2 ธันวาคม', 'ไปวันที่ 1/12') ได้ None เช่นกัน
+    """
+    if not instruction or n_days < 1 or _CALENDAR_DATE_RE.search(instruction):
+        return None
+    days = {int(d) for d in _DAY_REF_RE.findall(instruction)}
+    if _FIRST_DAY_RE.search(instruction):
+        days.add(1)
+    if _LAST_DAY_RE.search(instruction):
+        days.add(n_days)
+    days = {d for d in days if 1 <= d <= n_days}
+    return days or None
+
+
+def _iter_place_dicts(data: Dict[str, Any]) -> Iterator[tuple[Optional[int], Dict[str, Any]]]:
+    """เหมือน iter_places แต่ไล่บน JSON ดิบ — แผนเดิมอาจถูกแก้ด้วยมือจนไม่ตรง schema ทั้งหมด
+
+    yield (day_index, place) — โรงแรมใน hotel_output ไม่ผูกกับวัน จึงได้ day_index เป็น None
+    """
+    for option in data.get("plan_output") or []:
+        for day in (option or {}).get("itinerary") or []:
+            for stop in (day or {}).get("stops") or []:
+                place = (stop or {}).get("places")
+                if isinstance(place, dict):
+                    yield day.get("day_index"), place
+    for hotel_list in data.get("hotel_output") or []:
+        for hotel in hotel_list or []:
+            if isinstance(hotel, dict):
+                yield None, hotel
+
+
+def _stash_field(old_places: Dict[str, Dict[str, Any]], place: Dict[str, Any], field: str, sent: Any) -> None:
+    """เก็บค่าเดิมของฟิลด์ไว้คืนทีหลัง คู่กับค่าที่ส่งให้โมเดลจริง (None = ไม่ได้ส่ง)"""
+    entry = old_places.setdefault(place["place_id"], {"name": place.get("name"), "fields": {}})
+    original = entry["fields"][field][0] if field in entry["fields"] else place.get(field)
+    if original is not None:
+        entry["fields"][field] = (original, sent)
+
+
+def _compact_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {
+            _COMPACT_KEYS.get(key, key): _compact_value(item)
+            for key, item in value.items()
+            if item is not None and item != "" and item != []
+        }
+    if isinstance(value, list):
+        return [_compact_value(item) for item in value]
+    return value
+
+
+def compact_old_plan(
+    data: Dict[str, Any], old_places: Dict[str, Dict[str, Any]], instruction: Optional[str], max_tokens: int = 0
+) -> str:
+    """เข้ารหัสแผนเดิม (ที่ strip แล้ว) แบบย่อสำหรับ prompt: คีย์สั้น ตัด None/ค่าว่าง ย่อคำอธิบายของวันที่คำสั่งไม่ได้พูดถึง
+
+    ถ้าเกิน max_tokens (> 0) จะตัดฟิลด์ตาม _TRIM_ORDER ทีละฟิลด์จนกว่าจะอยู่ในงบ
+    ค่าที่ย่อ/ตัดทั้งหมดถูกเก็บใน old_places เพื่อให้ restore_old_places คืนค่าเต็มหลังโมเดลตอบ
+    """
+    places = list(_iter_place_dicts(data))
+    n_days = max((d for d, _ in places if isinstance(d, int)), default=0)
+    touched = referenced_days(instruction, n_days)
+    untouched = [place for d, place in places if touched is not None and d is not None and d not in touched]
+
+    for place in untouched:
+        text = place.get("short_description")
+        if isinstance(text, str) and len(text) > _SUMMARY_CHARS:
+            summary = text[:_SUMMARY_CHARS].rstrip() + "…"
+            _stash_field(old_places, place, "short_description", summary)
+            place["short_description"] = summary
+        _stash_field(old_places, place, "notes", None)
+        place["notes"] = None
+
+    payload = {"plan_output": data.get("plan_output"), "hotel_output": data.get("hotel_output")}
+    encoded = json.dumps(_compact_value(payload), ensure_ascii=False, separators=(",", ":"))
+    if max_tokens > 0:
+        tokens = estimate_tokens(encoded)
+        trimmed = []
+        everything = [place for _, place in places]
+        for field in _TRIM_ORDER:
+            for scope in (untouched, everything):
+                if tokens <= max_tokens:
+                    break
+                for place in scope:
+                    value = place.get(field)
+                    if value is None:
+                        continue
+                    tokens -= estimate_tokens(json.dumps(value, ensure_ascii=False)) + 2
+                    _stash_field(old_places, place, field, None)
+                    place[field] = None
+                    if field not in trimmed:
+                        trimmed.append(field)
+        if trimmed:
+            encoded = json.dumps(_compact_value(payload), ensure_ascii=False, separators=(",", ":"))
+            _set_response_meta("X-Prompt-Trimmed", ",".join(trimmed))
+            logger.info(f"compact_old_plan: trimmed {trimmed} to fit {max_tokens} tokens (now ~{estimate_tokens(encoded)})")
+    return f"{_COMPACT_LEGEND}\n{encoded}"
+
+
+def _load_plan_dict(olddata_text: str) -> Optional[Dict[str, Any]]:
     try:
         data = json.loads(olddata_text)
-        if "plan_output" in data:
-            for plan in data["plan_output"]:
-                if "itinerary" in plan:
-                    for day in plan["itinerary"]:
-                        if "stops" in day:
-                            for stop in day["stops"]:
-                                if "places" in stop and stop["places"]:
-                                    p = stop["places"]
-                                    name = p.get("name")
-                                    if name:
-                                        old_places_map[name] = {
-                                            "coordinates": p.get("coordinates"),
-                                            "google_maps_url": p.get("google_maps_url"),
-                                            "image_url": p.get("image_url")
-                                        }
-                                        p["coordinates"] = None
-                                        p["google_maps_url"] = None
-                                        p["image_url"] = None
-
-        if "hotel_output" in data:
-            for hotel_list in data["hotel_output"]:
-                for h in hotel_list:
-                    name = h.get("name")
-                    if name:
-                        old_places_map[name] = {
-                            "coordinates": h.get("coordinates"),
-                            "google_maps_url": h.get("google_maps_url"),
-                            "image_url": h.get("image_url")
-                        }
-                        h["coordinates"] = None
-                        h["google_maps_url"] = None
-                        h["image_url"] = None
-                        
-        return json.dumps(data, ensure_ascii=False), old_places_map
-    except Exception as e:
-        logger.warning(f"extract_and_strip_old_plan error: {e}")
-        return olddata_text, old_places_map
+    except json.JSONDecodeError as e:
+        logger.warning(f"extract_and_strip_old_plan: olddata is not JSON, sending as-is ({e})")
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def strip_old_plan(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """ไล่ทุกสถานที่รอบเดียว (รวมสถานที่ไม่มีชื่อ): ให้ place_id กับสถานที่ที่ยังไม่มีหรือ id ซ้ำ
+    แล้วย้ายฟิลด์ที่เติมจาก API ออกจาก data ไปเก็บใน map ตาม place_id
+    """
+    old_places: Dict[str, Dict[str, Any]] = {}
+    seen = set()
+    for option in data.get("plan_output") or []:
+        if isinstance(option, dict):
+            option.pop("feasibility", None)  # คำนวณใหม่หลังแก้ — ไม่ต้องส่งให้โมเดล
+    for _, place in _iter_place_dicts(data):
+        pid = place.get("place_id")
+        if not isinstance(pid, str) or not pid or pid in seen:
+            pid = place["place_id"] = _new_place_id()
+        seen.add(pid)
+        for field in _ENRICHED_FIELDS:
+            _stash_field(old_places, place, field, None)
+            place[field] = None
+    return old_places
+
+
+def extract_and_strip_old_plan(
+    olddata_text: str, instruction: Optional[str] = None, compact: bool = False, max_tokens: int = 0
+) -> tuple[str, Dict[str, Dict[str, Any]]]:
+    """สกัดข้อมูลพิกัด/ลิงก์ออกเพื่อประหยัด Token และเก็บไว้คืนค่าทีหลังเพื่อประหยัด Quota API
+
+    คืน (แผนเดิมที่ส่งให้โมเดล, map ตาม place_id) — compact=True -> เข้ารหัสแบบย่อด้วย compact_old_plan
+    olddata ที่ไม่ใช่ JSON object ส่งต่อไปตามเดิม
+    """
+    data = _load_plan_dict(olddata_text)
+    if data is None:
+        return olddata_text, {}
+    old_places = strip_old_plan(data)
+    if compact:
+        return compact_old_plan(data, old_places, instruction, max_tokens), old_places
+    return json.dumps(data, ensure_ascii=False), old_places
+
+
+# คำสั่งที่กระทบทั้งทริป (โรงแรม งบ จำนวนวัน) ต้องสร้างใหม่ทั้งแผนแม้จะระบุวัน
+_GLOBAL_EDIT_RE = re.compile(
+    r"โรงแรม|ที่พัก|hotel|งบ|budget|ทั้งทริป|ทุกวัน|เพิ่มวัน|ลดวัน|ตัดวัน|สลับวัน|every day|all days|whole trip",
+    re.IGNORECASE,
+)
 
 
-def restore_old_places(plan: PlanResponse, old_places_map: dict) -> PlanResponse:
-    """คืนค่าพิกัด/ลิงก์ให้กับสถานที่เดิม เพื่อจะได้ไม่ต้องเรียก Google API ใหม่ (ประหยัด Quota)"""
-    try:
-        if plan.plan_output:
-            for option in plan.plan_output:
-                for day in option.itinerary:
-                    for stop in day.stops:
-                        if stop.places and stop.places.name in old_places_map:
-                            cached = old_places_map[stop.places.name]
-                            if cached.get("coordinates"):
-                                c = cached["coordinates"]
-                                if isinstance(c, dict) and "lat" in c and "lng" in c:
-                                    stop.places.coordinates = Coordinates(lat=c["lat"], lng=c["lng"])
-                            if cached.get("google_maps_url"):
-                                stop.places.google_maps_url = cached["google_maps_url"]
-                            if cached.get("image_url"):
-                                stop.places.image_url = cached["image_url"]
-
-        if plan.hotel_output:
-            for hotel_list in plan.hotel_output:
-                for h in hotel_list:
-                    if h.name in old_places_map:
-                        cached = old_places_map[h.name]
-                        if cached.get("coordinates"):
-                            c = cached["coordinates"]
-                            if isinstance(c, dict) and "lat" in c and "lng" in c:
-                                h.coordinates = Coordinates(lat=c["lat"], lng=c["lng"])
-                        if cached.get("google_maps_url"):
-                            h.google_maps_url = cached["google_maps_url"]
-                        if cached.get("image_url"):
-                            h.image_url = cached["image_url"]
-    except Exception as e:
-        logger.warning(f"restore_old_places error: {e}")
+def select_patch_days(data: Optional[Dict[str, Any]], instruction: Optional[str]) -> Optional[set]:
+    """วันที่สร้างใหม่แบบ incremental ได้ — None = ต้องสร้างใหม่ทั้งแผน
+
+    ใช้ได้เมื่อแผนเดิมมีตัวเลือกเดียว day_index ไม่ซ้ำ และคำสั่งระบุวันชัดเจนเพียงบางวัน
+    """
+    if not data or not instruction or _GLOBAL_EDIT_RE.search(instruction):
+        return None
+    options = data.get("plan_output") or []
+    if len(options) != 1 or not isinstance(options[0], dict):
+        return None
+    day_indexes = [day.get("day_index") for day in options[0].get("itinerary") or [] if isinstance(day, dict)]
+    if not day_indexes or not all(isinstance(d, int) for d in day_indexes) or len(set(day_indexes)) != len(day_indexes):
+        return None
+    touched = referenced_days(instruction, max(day_indexes))
+    if touched is None or not touched < set(day_indexes):
+        return None
+    return touched
+
+
+def merge_day_patch(data: Dict[str, Any], patch: DayPatch, days: set) -> PlanResponse:
+    """แทนวันที่แก้ลงในแผนเดิม (ที่ strip แล้ว) วันอื่นและ hotel_output คงเดิม — raise ValidationError ถ้าแผนเดิมไม่ตรง schema"""
+    new_days = {day.day_index: day for day in patch.itinerary if day.day_index in days}
+    missing = days - new_days.keys()
+    if missing:
+        logger.warning(f"merge_day_patch: model skipped day(s) {sorted(missing)}, keeping the old version")
+    option = dict(data["plan_output"][0])
+    option["itinerary"] = [
+        new_days[day["day_index"]] if day["day_index"] in new_days else day for day in option["itinerary"]
+    ]
+    return PlanResponse(
+        status="success",
+        description=patch.description,
+        plan_output=[OutputPlan(**option)],
+        hotel_output=data.get("hotel_output"),
+    )
+
+
+def restore_old_places(plan: PlanResponse, old_places: Dict[str, Dict[str, Any]]) -> PlanResponse:
+    """คืนค่าพิกัด/ลิงก์ (และข้อความที่ถูกย่อ/ตัดตอน compact) ให้กับสถานที่เดิม โดยไม่ต้องเรียก Google API ใหม่
+
+    จับคู่ด้วย place_id ในรอบเดียว — ถ้าโมเดลทิ้ง place_id ไป จะจับคู่ด้วยชื่อเฉพาะเมื่อชื่อนั้นไม่ซ้ำในแผนเดิม
+    พิกัด/ลิงก์/รูป (_ENRICHED_FIELDS) ได้ค่าเดิมคืนเสมอ ส่วนข้อความที่โมเดลปล่อยว่างหรือตอบค่าเดิมที่ส่งไป
+    จะได้ค่าเต็มคืน (ข้อความที่โมเดลแก้เองคงไว้) ส่วนสถานที่ใหม่ (จับคู่ไม่ได้) จะได้ place_id ใหม่
+    """
+    name_counts: Dict[str, int] = {}
+    for stored in old_places.values():
+        if stored["name"]:
+            name_counts[stored["name"]] = name_counts.get(stored["name"], 0) + 1
+    by_unique_name = {stored["name"]: pid for pid, stored in old_places.items() if name_counts.get(stored["name"]) == 1}
+
+    seen = set()
+    for _, place in iter_places(plan):
+        pid = place.place_id if place.place_id in old_places else by_unique_name.get(place.name)
+        if pid is not None and pid not in seen:
+            place.place_id = pid
+            for field, (original, sent) in old_places[pid]["fields"].items():
+                current = getattr(place, field)
+                # ฟิลด์ที่เติมจาก API ส่งไปเป็น None เสมอ ค่าที่โมเดลตอบมาจึงเป็นค่าที่แต่งขึ้น — คืนค่าเดิมทุกครั้ง
+                if field not in _ENRICHED_FIELDS and current is not None and current != "" and current != sent:
+                    continue
+                try:
+                    setattr(place, field, _PLACE_FIELD_ADAPTERS[field].validate_python(original))
+                except ValidationError:
+                    logger.warning(f"restore_old_places: invalid {field} for '{place.name}'")
+        else:
+            place.place_id = _new_place_id()
+        seen.add(place.place_id)
+    return plan
+
+# -----------------------------------------------------------------------------
+# Local Auto-fix (จัดลำดับ/เวลาในเครื่อง แทนการเรียกโมเดล)
+# -----------------------------------------------------------------------------
+# stay_duration ตั้งต้นเมื่อแผนไม่ได้ระบุ (นาที)
+_DEFAULT_STAY = {"attraction": 90, "restaurant": 60, "hotel": 0, "other": 60}
+
+
+def autofix_leftovers(plan: PlanResponse) -> List[str]:
+    """หน้าที่ของ auto-fix ที่การจัดลำดับในเครื่องทำแทนโมเดลไม่ได้ — ว่าง = แก้ในเครื่องได้ครบ
+
+    ข้อมูลที่ขาด (notes/opening_hours/price_info) นับเฉพาะเมื่อเปิด AUTOFIX_REQUIRE_DETAILS
+    """
+    leftovers = []
+    missing = hotels = duplicates = 0
+    for option in plan.plan_output or []:
+        seen = set()
+        for day in option.itinerary:
+            for stop in day.stops:
+                place = stop.places
+                if settings.AUTOFIX_REQUIRE_DETAILS and any(
+                    not getattr(place, field) for field in ("notes", "opening_hours", "price_info")
+                ):
+                    missing += 1
+                if place.type == "hotel":
+                    hotels += 1
+                key = normalize_name(place.name)
+                duplicates += key in seen
+                seen.add(key)
+    if missing:
+        leftovers.append(f"ข้อมูลไม่ครบ (notes/opening_hours/price_info) {missing} จุด")
+    if duplicates:
+        leftovers.append(f"สถานที่ซ้ำ {duplicates} จุด")
+    if hotels:
+        leftovers.append(f"โรงแรมใน itinerary {hotels} จุด")
+    return leftovers
+
+
+def autofix_locally(plan: PlanResponse) -> tuple[Optional[str], List[str]]:
+    """จัดลำดับจุดแวะแต่ละวันให้ระยะทางสั้นลง แล้วคำนวณ start_time/stay_duration/order_in_day ใหม่
+
+    จุดแรกของวันและร้านอาหาร (ยึดมื้ออาหาร) อยู่ตำแหน่งเดิม — คืน (คำอธิบายสิ่งที่แก้, สิ่งที่ยังต้องให้โมเดลแก้)
+    คำอธิบายเป็น None ถ้าจัดลำดับในเครื่องไม่ได้ (มีจุดที่ไม่มีพิกัด) วันที่จัดแล้วเลยเที่ยงคืนคงเวลาเดิมไว้
+    และถูกแจ้งใน warnings ของตัวเลือกนั้นพร้อมรายการที่ต้องให้โมเดลแก้ (ไม่วนเวลาเป็น 00:xx)
+    """
+    days = [(option, day) for option in plan.plan_output or [] for day in option.itinerary]
+    if any(stop.places.coordinates is None for _, day in days for stop in day.stops):
+        return None, autofix_leftovers(plan)
+
+    default_start = itinerary_optimizer.parse_hhmm(settings.DAY_START) or 9 * 60
+    leftovers = autofix_leftovers(plan)
+    reordered, saved_km = 0, 0.0
+    for option, day in days:
+        stops = sorted(day.stops, key=lambda s: s.order_in_day)
+        inputs = [
+            itinerary_optimizer.Stop(
+                lat=stop.places.coordinates.lat,
+                lng=stop.places.coordinates.lng,
+                stay_minutes=stop.stay_duration or _DEFAULT_STAY.get(stop.places.type, 60),
+                pinned=i == 0 or stop.places.type == "restaurant",
+            )
+            for i, stop in enumerate(stops)
+        ]
+        start = itinerary_optimizer.parse_hhmm(stops[0].start_time) if stops else None
+        result = itinerary_optimizer.optimize_day(
+            inputs,
+            day_start_minutes=start if start is not None else default_start,
+            speed_kmh=settings.TRAVEL_SPEED_KMH,
+            buffer_minutes=settings.TRAVEL_BUFFER_MIN,
+        )
+        day_end = result.start_minutes[-1] + inputs[result.order[-1]].stay_minutes if stops else 0
+        if day_end > 24 * 60:
+            warning = f"วันที่ {day.day_index}: กิจกรรมยาวเลยเที่ยงคืน (จบราว {_format_minutes(day_end - 24 * 60)} หลังเที่ยงคืน)"
+            option.warnings = [*(option.warnings or []), warning]
+            leftovers.append(warning)
+            continue
+        day.stops = [stops[i] for i in result.order]
+        for position, (stop, start_minutes) in enumerate(zip(day.stops, result.start_minutes), start=1):
+            stop.order_in_day = position
+            stop.start_time = itinerary_optimizer.format_hhmm(start_minutes)
+            stop.stay_duration = inputs[result.order[position - 1]].stay_minutes
+        if result.reordered:
+            reordered += 1
+            saved_km += result.original_distance_km - result.distance_km
+    if reordered:
+        return f"ปรับลำดับ {reordered} วันให้ระยะทางรวมสั้นลง {saved_km:.1f} กม. และคำนวณเวลาใหม่", leftovers
+    return "ลำดับเดิมเหมาะสมแล้ว คำนวณเวลาเริ่มและระยะเวลาแต่ละจุดใหม่", leftovers
+
+
+# -----------------------------------------------------------------------------
+# Feasibility (ตรวจเวลา/ระยะทาง/เวลาเปิด-ปิดของทุกตัวเลือกในเครื่อง — ไม่เรียกโมเดล)
+# -----------------------------------------------------------------------------
+_BUSY_DAY_MINUTES = 9 * 60    # อยู่ + เดินทางเกินนี้ -> MEDIUM
+_LONG_DAY_MINUTES = 12 * 60   # เกินนี้ -> HARD
+_ISSUE_KEYS = ("overlap", "closed", "hours", "weekday", "tight", "long_day")
+
+
+def _format_minutes(minutes: float) -> str:
+    return f"{minutes / 60:.1f} ชม." if minutes >= 90 else f"{minutes:.0f} นาที"
+
+
+def assess_plan_feasibility(plan: PlanResponse) -> List[PlanFeasibility]:
+    """ประเมินทุกตัวเลือกทุกวันด้วย plan_feasibility.assess รอบเดียว แล้วแปลงเป็น PlanFeasibility ต่อตัวเลือก
+
+    stay_duration ที่ไม่ระบุใช้ค่าตั้งต้นตามประเภท (_DEFAULT_STAY), start_time ที่อ่านไม่ได้ข้ามการตรวจเวลาทับ/เวลาเปิด
+    """
+    options = plan.plan_output or []
+    rows, stops, groups = [], [], []  # groups[g] = (option index, day)
+    for o, option in enumerate(options):
+        for day in option.itinerary:
+            g = len(groups)
+            groups.append((o, day))
+            for stop in sorted(day.stops, key=lambda s: s.order_in_day):
+                coords = stop.places.coordinates
+                rows.append((
+                    g,
+                    coords.lat if coords else None,
+                    coords.lng if coords else None,
+                    itinerary_optimizer.parse_hhmm(stop.start_time),
+                    stop.stay_duration if stop.stay_duration is not None else _DEFAULT_STAY.get(stop.places.type, 60),
+                    stop.places.opening_hours,
+                ))
+                stops.append(stop)
+
+    arrays = plan_feasibility.build_arrays(rows)
+    result = plan_feasibility.assess(arrays, len(groups), settings.TRAVEL_SPEED_KMH, settings.TRAVEL_BUFFER_MIN)
+
+    reports = [PlanFeasibility(feasible=True, difficulty="EASY") for _ in options]
+    issues = [dict.fromkeys(_ISSUE_KEYS, 0) for _ in options]
+
+    def flag(kind: str, index: int, text: str) -> None:
+        o, day = groups[rows[index][0]]
+        issues[o][kind] += 1
+        target = reports[o].reasons if kind in ("overlap", "closed") else reports[o].warnings
+        target.append(f"วันที่ {day.day_index}: {text}")
+
+    for i in np.flatnonzero(result.overlap > 0):
+        flag("overlap", i, f"'{stops[i].places.name}' เริ่ม {stops[i].start_time} ก่อนจุดก่อนหน้าจบ {_format_minutes(result.overlap[i])}")
+    for i in np.flatnonzero(result.shortfall > 0):
+        flag("tight", i, f"เวลาเดินทางไป '{stops[i].places.name}' ไม่พอ (ต้องใช้ ~{result.travel_before[i]:.0f} นาที ขาด {result.shortfall[i]:.0f} นาที)")
+    for i in np.flatnonzero(result.hours == plan_feasibility.HOURS_CLOSED):
+        flag("closed", i, f"'{stops[i].places.name}' ไปช่วงที่ปิด ({stops[i].places.opening_hours})")
+    for i in np.flatnonzero(result.hours == plan_feasibility.HOURS_PARTIAL):
+        flag("hours", i, f"'{stops[i].places.name}' อยู่เกินช่วงเปิด ({stops[i].places.opening_hours})")
+    for i in np.flatnonzero(result.hours == plan_feasibility.HOURS_SOME_DAYS):
+        flag("weekday", i, f"'{stops[i].places.name}' ปิดบางวันในสัปดาห์ ({stops[i].places.opening_hours}) — ตรวจวันเดินทาง")
+
+    load = result.stay_total + result.travel_total
+    per_day = [
+        np.bincount(arrays.group, weights=mask, minlength=len(groups)).astype(int)
+        for mask in (result.overlap > 0, result.shortfall > 0, result.hours != plan_feasibility.HOURS_OK)
+    ]
+    for g, (o, day) in enumerate(groups):
+        report = reports[o]
+        report.days.append(DayFeasibility(
+            day_index=day.day_index,
+            stay_minutes=int(result.stay_total[g]),
+            travel_minutes=int(result.travel_total[g]),
+            span_minutes=None if np.isnan(result.span[g]) else int(result.span[g]),
+            overlaps=int(per_day[0][g]),
+            tight_transfers=int(per_day[1][g]),
+            hours_conflicts=int(per_day[2][g]),
+        ))
+        if load[g] > _LONG_DAY_MINUTES:
+            issues[o]["long_day"] += 1
+            report.warnings.append(
+                f"วันที่ {day.day_index}: ใช้เวลารวม {_format_minutes(load[g])} "
+                f"(อยู่ {_format_minutes(result.stay_total[g])} + เดินทาง {_format_minutes(result.travel_total[g])})"
+            )
+
+    for o, report in enumerate(reports):
+        busiest = max((load[g] for g, (og, _) in enumerate(groups) if og == o), default=0.0)
+        if report.reasons:
+            report.feasible, report.difficulty = False, "IMPOSSIBLE"
+        elif report.warnings:
+            report.difficulty = "HARD"
+        elif busiest > _BUSY_DAY_MINUTES:
+            report.difficulty = "MEDIUM"
+        options[o].feasibility = report
+    if reports:
+        # header สรุปตัวเลือกแรก (ลำดับแนะนำ) — รายละเอียดทุกตัวเลือกอยู่ใน plan_output[i].feasibility
+        _set_response_meta("X-Plan-Feasible", "true" if reports[0].feasible else "false")
+        _set_response_meta("X-Plan-Difficulty", reports[0].difficulty)
+        counts = ",".join(f"{k}={v}" for k, v in issues[0].items() if v)
+        if counts:
+            _set_response_meta("X-Plan-Issues", counts)
+    return reports
+
+
+def attach_feasibility(plan: PlanResponse) -> PlanResponse:
+    if settings.PLAN_FEASIBILITY and plan.status == "success" and plan.plan_output:
+        with stage_timer(METRICS_APP, "feasibility"):
+            assess_plan_feasibility(plan)
     return plan
 
+
 # -----------------------------------------------------------------------------
 # Orchestrators (intent → research → plan/change → enrich)
 # -----------------------------------------------------------------------------
-def planner_makeplan(user_input: str, options: int = 1) -> PlanResponse:
+async def _timed(coro) -> tuple[object, float]:
+    t0 = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - t0
+
+
+async def _intent_and_research(user_input: str) -> tuple[CheckResponse, Optional[str]]:
+    """ตรวจ intent แล้วสืบค้น — คืน research=None เมื่อ intent ไม่ใช่ travel_reasonable"""
+    research_task: Optional[asyncio.Task] = None
+    awaited = False
+    try:
+        if settings.SPECULATIVE_RESEARCH:
+            # เริ่มสืบค้นไปพร้อมกับ intent_check — traffic ส่วนใหญ่เป็น travel_reasonable อยู่แล้ว
+            research_task = asyncio.create_task(_timed(research_from_user_input(user_input)))
+
+        ic, intent_sec = await _timed(intent_check(user_input))
+        logger.info(f"intent = {ic.intent} : {ic.description}")
+        if ic.intent != "travel_reasonable":
+            return ic, None
+
+        if research_task is not None:
+            # latency ที่ประหยัดได้ = ช่วงที่ research วิ่งซ้อนกับ intent_check
+            awaited = True
+            research, research_sec = await research_task
+            SPECULATIVE_RESEARCH.labels("used").inc()
+            SPECULATIVE_SAVED_SECONDS.inc(min(intent_sec, research_sec))
+        else:
+            research = await research_from_user_input(user_input)
+        return ic, research
+    finally:
+        if research_task is not None and not awaited:
+            # ทิ้งผลสืบค้นล่วงหน้า (intent ไม่ผ่าน หรือ intent_check ล้มเอง)
+            SPECULATIVE_RESEARCH.labels("discarded").inc()
+            if not research_task.done():
+                research_task.cancel()
+            elif not research_task.cancelled():
+                research_task.exception()  # อ่าน exception ทิ้ง กัน "Task exception was never retrieved"
+
+
+async def planner_makeplan(user_input: str, options: int = 1) -> PlanResponse:
     if not user_input:
         return _error_response("Input Error: empty input")
     try:
         options = max(1, min(options, 3))
-        ic = intent_check(user_input)
-        logger.info(f"intent = {ic.intent} : {ic.description}")
-        if ic.intent != "travel_reasonable":
-            return _error_response(ic.description)
 
-        # 1) สืบค้นก่อน (เปิด tools)
-        research = research_from_user_input(user_input)
+        # 1) ตรวจ intent + สืบค้น (เปิด tools)
+        ic, research = await _intent_and_research(user_input)
+        if research is None:
+            return _error_response(ic.description)
 
         # 2) ให้โมเดลสร้างแผนด้วย schema โดยอาศัยบริบทสืบค้น (ไม่เปิด tools)
-        plan = create_plan(user_input, research=research, options=options)
+        with stage_timer(METRICS_APP, "generation"):
+            plan = await create_plan(user_input, research=research, options=options)
         if plan.status != "success":
             return plan
+        assign_place_ids(plan)
 
-        # 3) เติมข้อมูล
-        plan = enrich_all_places(plan)
+        # 3) เติมข้อมูล แล้วตรวจความเป็นไปได้จากพิกัด/เวลา
+        plan = await enrich_all_places(plan)
 
-        return plan
+        return attach_feasibility(plan)
+    except UpstreamOverloaded:
+        raise
     except Exception as e:
         logger.error(f"planner_makeplan error: {e}")
         return _error_response("Output Error")
 
 
-def planner_changeplan(instruction: Optional[str], olddata: str) -> PlanResponse:
+def _error_event(description: str) -> Dict[str, Any]:
+    return {"event": "error", "data": _error_response(description).model_dump(mode="json")}
+
+
+async def planner_makeplan_stream(user_input: str, options: int = 1) -> AsyncIterator[Dict[str, Any]]:
+    """planner_makeplan แบบทยอยส่งผล: intent → research → option แต่ละแผน → plan (ก่อนเติมข้อมูล) → place patch → done
+
+    index ของ event "option" และ path["option"] ของ event "place" คือตำแหน่งใน plan_output ของ event "plan"/"done"
+    (ตัวเลือกที่สร้างไม่สำเร็จไม่มีช่อง — index ไม่ข้ามเลข)
+    """
+    _response_meta.set({})
+    if not user_input:
+        yield _error_event("Input Error: empty input")
+        return
+    try:
+        options = max(1, min(options, 3))
+        ic, research = await _intent_and_research(user_input)
+        yield {"event": "intent", "data": ic.model_dump(mode="json")}
+        if research is None:
+            yield _error_event(ic.description)
+            return
+
+        yield {"event": "research", "cache": (_response_meta.get() or {}).get("X-Research-Cache", "miss")}
+
+        plan: Optional[PlanResponse] = None
+        async for item in create_plan_stream(user_input, research=research, options=options):
+            if isinstance(item, PlanResponse):
+                plan = item
+            else:
+                index, option = item
+                yield {"event": "option", "index": index, "data": option}
+        if plan is None or plan.status != "success":
+            yield {"event": "error", "data": plan or _error_response("Output Error")}
+            return
+        assign_place_ids(plan)
+        yield {"event": "plan", "data": plan}
+
+        async for path, place in iter_enriched_places(plan):
+            yield {
+                "event": "place",
+                "path": path,
+                "data": place.model_dump(mode="json", include={"coordinates", "google_maps_url", "image_url"}),
+            }
+        attach_feasibility(plan)
+        yield {"event": "done", "data": plan}
+    except UpstreamOverloaded as e:
+        logger.warning(f"planner_makeplan_stream: {e}")
+        event = _error_event("Service Busy: please retry later")
+        event["retry_after"] = e.retry_after
+        yield event
+    except Exception as e:
+        logger.error(f"planner_makeplan_stream error: {e}")
+        yield _error_event("Output Error")
+
+
+async def planner_changeplan(instruction: Optional[str], olddata: str) -> PlanResponse:
     if not olddata:
         return _error_response("Input Error: olddata is empty")
     try:
@@ -596,12 +1658,56 @@ def planner_changeplan(instruction: Optional[str], olddata: str) -> PlanResponse
 
         pass
 
-        stripped_olddata, old_places_map = extract_and_strip_old_plan(olddata)
-        logger.info(f"Stripped {len(old_places_map)} places from olddata to save tokens")
-        logger.info("=== STRIPPED OLDDATA ===")
-        # 2) แก้แผนโดยมีบริบทสืบค้น และ JSON ที่เล็กลง
-
-        new_plan = modify_plan_with_ai(instruction, stripped_olddata)
+        data = _load_plan_dict(olddata)
+
+        # auto-fix: จัดลำดับ/เวลาในเครื่องก่อน ถ้าแก้ได้ครบก็ไม่ต้องเรียกโมเดล
+        # ไม่ครบ (ข้อมูลขาด/ซ้ำ/โรงแรม/เลยเที่ยงคืน) -> ส่งแผนที่จัดลำดับแล้วให้โมเดลทำหน้าที่ auto-fix ที่เหลือ
+        if not instruction and settings.AUTOFIX_LOCAL and data is not None:
+            with stage_timer(METRICS_APP, "autofix_local"):
+                try:
+                    plan = PlanResponse(**data)
+                    summary, leftovers = autofix_locally(plan) if plan.status == "success" else (None, [])
+                except ValidationError as e:
+                    logger.info(f"planner_changeplan: local auto-fix skipped, old plan does not fit the schema ({e})")
+                    summary, leftovers = None, []
+            if summary is not None and not leftovers:
+                _set_response_meta("X-Changeplan-Scope", "local")
+                plan.description = summary
+                assign_place_ids(plan)
+                return attach_feasibility(await enrich_all_places(plan))
+            if summary is not None:
+                logger.info(f"planner_changeplan: local auto-fix applied, model still needed for: {'; '.join(leftovers)}")
+                data = plan.model_dump(mode="json")
+
+        with stage_timer(METRICS_APP, "strip"):
+            old_places_map = strip_old_plan(data) if data is not None else {}
+        logger.info(f"Stripped {len(old_places_map)} places in olddata to save tokens")
+
+        # 2) คำสั่งที่ระบุวัน -> สร้างใหม่เฉพาะวันนั้นแล้ว merge กลับ (ถ้าไม่ได้ค่อยสร้างใหม่ทั้งแผน)
+        new_plan = None
+        patch_days = select_patch_days(data, instruction) if settings.CHANGEPLAN_INCREMENTAL else None
+        if patch_days:
+            _set_response_meta("X-Changeplan-Scope", "days=" + ",".join(str(d) for d in sorted(patch_days)))
+            with stage_timer(METRICS_APP, "change_days_generation"):
+                patch = await modify_days_with_ai(instruction, data, patch_days, compact=settings.CHANGEPLAN_COMPACT)
+            if patch.status != "success":
+                return _error_response(patch.description)
+            try:
+                new_plan = merge_day_patch(data, patch, patch_days)
+            except ValidationError as e:
+                logger.warning(f"planner_changeplan: old plan does not fit the schema, regenerating in full ({e})")
+
+        # 3) แก้แผนทั้งแผนโดยใช้ JSON ที่เล็กลง
+        if new_plan is None:
+            _set_response_meta("X-Changeplan-Scope", "full")
+            if data is None:
+                stripped_olddata = olddata
+            elif settings.CHANGEPLAN_COMPACT:
+                stripped_olddata = compact_old_plan(data, old_places_map, instruction, settings.CHANGEPLAN_MAX_PLAN_TOKENS)
+            else:
+                stripped_olddata = json.dumps(data, ensure_ascii=False)
+            with stage_timer(METRICS_APP, "change_generation"):
+                new_plan = await modify_plan_with_ai(instruction, stripped_olddata)
 
         logger.info("=== AI RAW RESULT ===")
         logger.info(new_plan.model_dump_json(indent=2))
@@ -609,13 +1715,16 @@ def planner_changeplan(instruction: Optional[str], olddata: str) -> PlanResponse
         if new_plan.status != "success":
             return new_plan
 
-        # 3) คืนค่าข้อมูลที่ดึงไว้ ให้กับสถานที่เดิม (ประหยัด Quota API)
-        new_plan = restore_old_places(new_plan, old_places_map)
+        # 4) คืนค่าข้อมูลที่ดึงไว้ ให้กับสถานที่เดิม (ประหยัด Quota API)
+        with stage_timer(METRICS_APP, "restore"):
+            new_plan = restore_old_places(new_plan, old_places_map)
 
-        # 4) เติมข้อมูลเฉพาะสถานที่ใหม่ (ที่ไม่มีใน cached)
-        new_plan = enrich_all_places(new_plan)
+        # 5) เติมข้อมูลเฉพาะสถานที่ใหม่ (ที่ไม่มีใน cached)
+        new_plan = await enrich_all_places(new_plan)
 
-        return new_plan
+        return attach_feasibility(new_plan)
+    except UpstreamOverloaded:
+        raise
     except Exception as e:
         logger.error(f"planner_changeplan error: {e}")
         return _error_response("Output Error")
@@ -623,10 +1732,25 @@ def planner_changeplan(instruction: Optional[str], olddata: str) -> PlanResponse
 # -----------------------------------------------------------------------------
 # FastAPI
 # -----------------------------------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        gemini_client.init_client()
+    except ValueError as e:
+        # ไม่มี API key — ให้แอปยังขึ้นได้ (request จะตอบ error เหมือนเดิม)
+        logger.error(f"Gemini client init failed: {e}")
+    await _job_queue.start()
+    yield
+    await _job_queue.stop()
+    await _close_http_client()
+    await gemini_client.close_client()
+
+
 app = FastAPI(
     title="Travel Planner API",
     version="1.0.0",
     description="AI-powered travel itinerary planner for Thailand",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -637,6 +1761,26 @@ app.add_middleware(
 )
 
 
+@app.exception_handler(UpstreamOverloaded)
+async def upstream_overloaded_handler(request, exc: UpstreamOverloaded):
+    # คิวของโมเดลเต็ม — ตอบทันทีแทนการรอจน timeout ให้ client ถอยตาม Retry-After
+    logger.warning(f"{request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content=_error_response("Service Busy: please retry later").model_dump(mode="json"),
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(IdempotencyKeyMismatch)
+async def idempotency_key_mismatch_handler(request, exc: IdempotencyKeyMismatch):
+    logger.warning(f"{request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=422,
+        content=_error_response("Input Error: Idempotency-Key was already used with a different request").model_dump(mode="json"),
+    )
+
+
 @app.get("/")
 def root():
     logger.info("ROOT CHECK")
@@ -646,11 +1790,105 @@ def root():
 @app.get("/health")
 async def health():
     logger.info("HEALTH CHECK")
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "cache": {
+            "place_coords": _coords_cache.stats(),
+            "place_images": _image_cache.stats(),
+            "research": _research_cache.stats(),
+            "response_makeplan": _makeplan_cache.stats(),
+        },
+        "inflight_makeplan": len(_makeplan_inflight),
+        "speculative_research": {"enabled": settings.SPECULATIVE_RESEARCH},
+        "gemini_limiters": gemini_client.limiter_stats(),
+        "circuit_breakers": {b.name: b.stats() for b in (_search_breaker, _maps_breaker)},
+        "gazetteer": {"path": _gazetteer.path, "entries": len(_gazetteer)} if _gazetteer else None,
+        "jobs": await asyncio.to_thread(_job_queue.stats),
+    }
+
+
+# memoization ของ /makeplan: request ซ้ำที่กำลังทำอยู่ใช้งานร่วมกัน + cache ผลสำเร็จช่วงสั้น ๆ
+_makeplan_cache = KVCache("response_makeplan", settings.RESPONSE_CACHE_TTL, settings.RESPONSE_CACHE_MAX_ENTRIES, settings.CACHE_DB_PATH)
+_makeplan_inflight = InflightCoalescer()
+
+
+async def _makeplan_with_meta(user_input: str, options: int) -> tuple[PlanResponse, Dict[str, str]]:
+    meta: Dict[str, str] = {}
+    _response_meta.set(meta)
+    plan = await planner_makeplan(user_input, options)
+    return plan, meta
+
+
+async def _memoized_makeplan(
+    user_input: str, options: int, idempotency_key: Optional[str] = None
+) -> tuple[Any, Dict[str, str], str]:
+    """planner_makeplan ผ่าน cache/coalescing — คืน (plan, response headers, "hit" | "shared" | "miss")
+
+    cache hit คืน plan เป็น dict ที่ dump ไว้ตอนเก็บ (validate แล้ว) โดยไม่สร้าง PlanResponse ซ้ำ — ส่งต่อให้ dump_json ได้ตรง ๆ
+    """
+    key = request_key(
+        "makeplan", normalize_name(user_input), options, date.today().isoformat(), idempotency_key=idempotency_key
+    )
+    body = body_hash(normalize_name(user_input), options)
+    cached = await _makeplan_cache.aget(key)
+    if cached:
+        check_body(key, cached.get("body"), body)
+        return cached["plan"], cached["headers"], "hit"
+
+    (plan, meta), shared = await _makeplan_inflight.run(key, lambda: _makeplan_with_meta(user_input, options), body)
+    if not shared and plan.status == "success":
+        await _makeplan_cache.aset(key, {"plan": plan.model_dump(mode="json"), "headers": meta, "body": body})
+    return plan, meta, "shared" if shared else "miss"
+
+
+async def planner_makeplan_batch(items: List[MakePlan], concurrency: int) -> AsyncIterator[Dict[str, Any]]:
+    """สร้างหลายแผนพร้อมกัน (ไม่เกิน concurrency) — yield event "item" ตามลำดับที่เสร็จ แล้วปิดด้วย "done"
+
+    คำขอซ้ำกันใช้ผลร่วมกันผ่าน cache/coalescing ของ /makeplan ส่วน research และ lookup สถานที่
+    ที่ซ้ำข้าม item ถูกรวมที่ research_from_user_input / enrich_place_detail อยู่แล้ว
+    """
+    semaphore = asyncio.Semaphore(max(1, min(concurrency, len(items))))
+
+    async def run_one(index: int, item: MakePlan) -> tuple[Dict[str, Any], bool]:
+        ok = False
+        user_input = (item.input or "").strip()
+        options = max(1, min(item.options, 3))
+        if len(user_input) > settings.MAX_INPUT_LENGTH:
+            event = _error_event(f"Input too long (max {settings.MAX_INPUT_LENGTH} characters)")
+        elif not user_input:
+            event = _error_event("Input Error: empty input")
+        else:
+            async with semaphore:
+                try:
+                    plan, _, cache_state = await _memoized_makeplan(user_input, options)
+                    event = {"event": "item", "cache": cache_state, "data": plan}
+                    ok = cache_state == "hit" or plan.status == "success"  # cache เก็บเฉพาะแผนที่สำเร็จ
+                except UpstreamOverloaded as e:
+                    event = _error_event("Service Busy: please retry later")
+                    event["retry_after"] = e.retry_after
+        event["index"] = index
+        return event, ok
+
+    tasks = [asyncio.ensure_future(run_one(i, item)) for i, item in enumerate(items)]
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            event, ok = await next_done
+            succeeded += ok
+            yield event
+        yield {"event": "done", "total": len(items), "succeeded": succeeded, "failed": len(items) - succeeded}
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.get("/metrics")
+async def metrics():
+    return metrics_response()
 
 
 @app.post("/makeplan", response_model=PlanResponse)
-async def makeplan(request: MakePlan):
+async def makeplan(request: MakePlan, response: Response, idempotency_key: Optional[str] = Header(default=None)):
     user_input = (request.input or "").strip()
     options = max(1, min(request.options, 3))
 
@@ -660,21 +1898,170 @@ async def makeplan(request: MakePlan):
     logger.info(
         f"MakePlan: input len={len(user_input)} preview='{user_input.replace(chr(10), ' ')[:100]}' options={options}"
     )
-    return await asyncio.to_thread(planner_makeplan, user_input, options)
+    plan, meta, cache_state = await _memoized_makeplan(user_input, options, idempotency_key)
+    headers = {**meta, "X-Response-Cache": cache_state}
+    if cache_state == "hit":
+        # dict จาก cache ผ่าน validate มาแล้วตอนเก็บ — ส่ง bytes ตรง ๆ ข้าม response_model
+        return JSONBytesResponse(plan, headers=headers)
+    response.headers.update(headers)
+    return plan
+
+
+def _ndjson_line(event: Dict[str, Any]) -> bytes:
+    # event อาจมี PlanResponse/OutputPlan ปนอยู่ — serialize ตรงจาก model ไม่ผ่าน model_dump + json.dumps
+    return dump_json(event) + b"\n"
+
+
+async def _ndjson(events: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[bytes]:
+    async for event in events:
+        yield _ndjson_line(event)
+
+
+@app.post("/makeplan/stream")
+async def makeplan_stream(request: MakePlan):
+    """เหมือน /makeplan แต่ส่งผลเป็น NDJSON ทีละ event (intent, research, option, plan, place, done | error)"""
+    user_input = (request.input or "").strip()
+    options = max(1, min(request.options, 3))
+
+    if len(user_input) > settings.MAX_INPUT_LENGTH:
+        error = _error_event(f"Input too long (max {settings.MAX_INPUT_LENGTH} characters)")
+        return StreamingResponse(iter([_ndjson_line(error)]), media_type="application/x-ndjson")
+
+    logger.info(f"MakePlanStream: input len={len(user_input)} options={options}")
+    return StreamingResponse(_ndjson(planner_makeplan_stream(user_input, options)), media_type="application/x-ndjson")
+
+
+@app.post("/makeplan/batch")
+async def makeplan_batch(request: MakePlanBatch):
+    """สร้างหลายแผนในคำขอเดียว ส่งผลเป็น NDJSON: item (มี index ตามลำดับใน items) ... แล้วปิดด้วย done"""
+    if len(request.items) > settings.BATCH_MAX_ITEMS:
+        error = _error_event(f"Too many items (max {settings.BATCH_MAX_ITEMS})")
+        return StreamingResponse(iter([_ndjson_line(error)]), media_type="application/x-ndjson")
+
+    # ไม่เปิด worker เกินจำนวน item จริง (BATCH_MAX_ITEMS เป็นเพดานจำนวน item ไม่ใช่ concurrency)
+    concurrency = max(1, min(request.concurrency or settings.BATCH_CONCURRENCY, len(request.items)))
+    logger.info(f"MakePlanBatch: items={len(request.items)} concurrency={concurrency}")
+    return StreamingResponse(
+        _ndjson(planner_makeplan_batch(request.items, concurrency)), media_type="application/x-ndjson"
+    )
 
 
 @app.post("/changeplan", response_model=PlanResponse)
-async def changeplan(request: ChangePlan):
+async def changeplan(request: ChangePlan, response: Response):
     logger.info(request)
     instruction = (request.input or "").strip() if request.input else None
     olddata = (request.olddata or "").strip()
     has_instruction = "Yes" if instruction else "No (auto-fix mode)"
     logger.info(f"ChangePlan: has_instruction={has_instruction} olddata len={len(olddata)}")
-    return await asyncio.to_thread(planner_changeplan, instruction, olddata)
+    meta: Dict[str, str] = {}
+    _response_meta.set(meta)
+    plan = await planner_changeplan(instruction, olddata)
+    response.headers.update(meta)
+    return plan
+
+# -----------------------------------------------------------------------------
+# Jobs (ส่งงานแล้วได้ job id ทันที — worker ในคิวทำ planner ต่อแม้ client หลุดไป)
+# -----------------------------------------------------------------------------
+async def _job_makeplan(payload: Dict[str, Any]) -> Dict[str, Any]:
+    plan, _, cache_state = await _memoized_makeplan(payload["input"], payload["options"])
+    return plan if cache_state == "hit" else plan.model_dump(mode="json")
+
+
+async def _job_changeplan(payload: Dict[str, Any]) -> Dict[str, Any]:
+    plan = await planner_changeplan(payload.get("input"), payload["olddata"])
+    return plan.model_dump(mode="json")
+
+
+_job_queue = JobQueue(
+    {"makeplan": _job_makeplan, "changeplan": _job_changeplan},
+    path=settings.JOBS_DB_PATH,
+    workers=settings.JOB_WORKERS,
+    result_ttl=settings.JOB_RESULT_TTL,
+    lease_seconds=settings.JOB_LEASE_SECONDS,
+)
+
+
+def _job_accepted(job_id: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"},
+        headers={"Location": f"/jobs/{job_id}"},
+    )
+
+
+@app.post("/jobs/makeplan", status_code=202)
+async def submit_makeplan_job(request: MakePlan):
+    """เหมือน /makeplan แต่คืน job id ทันที (ดูผลที่ GET /jobs/{job_id})"""
+    user_input = (request.input or "").strip()
+    if not user_input or len(user_input) > settings.MAX_INPUT_LENGTH:
+        description = "Input Error: empty input" if not user_input else f"Input too long (max {settings.MAX_INPUT_LENGTH} characters)"
+        return JSONResponse(status_code=400, content=_error_response(description).model_dump(mode="json"))
+    job_id = await _job_queue.submit("makeplan", {"input": user_input, "options": max(1, min(request.options, 3))})
+    logger.info(f"Job makeplan queued: {job_id}")
+    return _job_accepted(job_id)
+
+
+@app.post("/jobs/changeplan", status_code=202)
+async def submit_changeplan_job(request: ChangePlan):
+    """เหมือน /changeplan แต่คืน job id ทันที (ดูผลที่ GET /jobs/{job_id})"""
+    olddata = (request.olddata or "").strip()
+    if not olddata:
+        return JSONResponse(status_code=400, content=_error_response("Input Error: olddata is empty").model_dump(mode="json"))
+    instruction = (request.input or "").strip() or None
+    job_id = await _job_queue.submit("changeplan", {"input": instruction, "olddata": olddata})
+    logger.info(f"Job changeplan queued: {job_id}")
+    return _job_accepted(job_id)
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, description="long-poll: รอผลได้สูงสุดกี่วินาที")):
+    """สถานะงาน (queued/running/done/failed) — ถ้า done จะมี result เป็น PlanResponse"""
+    job = await _job_queue.wait(job_id, min(wait, settings.JOB_MAX_WAIT))
+    if job is None:
+        return JSONResponse(status_code=404, content={"detail": "job not found"})
+    return job
 
 # -----------------------------------------------------------------------------
 # Entrypoint
 # -----------------------------------------------------------------------------
+def _load_batch_file(path: str) -> List[MakePlan]:
+    """อ่านไฟล์ batch: JSON array, {"items": [...]} หรือ JSON Lines (หนึ่ง MakePlan ต่อบรรทัด)"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        data = data.get("items", [data])
+    return [MakePlan(**row) for row in data]
+
+
+async def _run_batch_cli(path: str, concurrency: int, out_path: Optional[str]) -> None:
+    items = _load_batch_file(path)
+    out = open(out_path, "w", encoding="utf-8") if out_path else sys.stdout
+    try:
+        async with lifespan(app):
+            async for event in planner_makeplan_batch(items, concurrency):
+                out.write(_ndjson_line(event).decode("utf-8"))
+                out.flush()
+    finally:
+        if out_path:
+            out.close()
+
+
 if __name__ == "__main__":
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        # python main.py batch items.jsonl [--concurrency 4] [--out results.ndjson]
+        import argparse
+
+        parser = argparse.ArgumentParser(prog="main.py batch", description="สร้างแผนหลายรายการจากไฟล์ แล้วเขียนผลเป็น NDJSON")
+        parser.add_argument("file", help="JSON array / JSON Lines ของ MakePlan ({\"input\": ..., \"options\": ...})")
+        parser.add_argument("--concurrency", type=int, default=settings.BATCH_CONCURRENCY)
+        parser.add_argument("--out", default=None, help="ไฟล์ผลลัพธ์ (ไม่ระบุ = stdout)")
+        args = parser.parse_args(sys.argv[2:])
+        asyncio.run(_run_batch_cli(args.file, args.concurrency, args.out))
+    else:
+        # WEB_CONCURRENCY>1 -> หลาย worker process ใช้ cache SQLite ร่วมกัน (ดู serve.py / gunicorn.conf.py)
+        serve.run("main:app", app, host=settings.HOST, port=settings.PORT)
 
@@ -0,0 +1,164 @@
+"""Prometheus metrics ที่ใช้ร่วมกันทั้ง main.py และ api.py (เปิดดูได้ที่ GET /metrics)
+
+รันหลาย worker process: ตั้ง PROMETHEUS_MULTIPROC_DIR (serve.py ตั้งให้อัตโนมัติ) แล้ว /metrics
+จะรวมค่าจากทุก worker
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from fastapi import Response
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "planner_stage_duration_seconds",
+    "Latency ของแต่ละขั้นใน pipeline",
+    ["app", "stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+OUTBOUND_CALLS = Counter(
+    "planner_outbound_calls_total",
+    "จำนวนการเรียกบริการภายนอก แยกตามปลายทางและสถานะ",
+    ["destination", "status"],
+)
+OUTBOUND_SECONDS = Histogram(
+    "planner_outbound_duration_seconds",
+    "Latency ของการเรียกบริการภายนอก",
+    ["destination"],
+    buckets=_LATENCY_BUCKETS,
+)
+SPECULATIVE_RESEARCH = Counter(
+    "planner_speculative_research_total",
+    "research ที่เริ่มล่วงหน้าพร้อม intent_check แยกตามผล (used/discarded)",
+    ["outcome"],
+)
+SPECULATIVE_SAVED_SECONDS = Counter(
+    "planner_speculative_saved_seconds_total",
+    "latency ที่ประหยัดได้จากการรัน research ซ้อนกับ intent_check",
+)
+LIMITER_WINDOW = Gauge(
+    "planner_upstream_limiter_window",
+    "ขนาดหน้าต่าง concurrency ปัจจุบันของ limiter ต่อโมเดล",
+    ["limiter"],
+    multiprocess_mode="liveall",
+)
+LIMITER_QUEUE = Gauge(
+    "planner_upstream_limiter_queued",
+    "จำนวน request ที่รอคิว limiter อยู่",
+    ["limiter"],
+    multiprocess_mode="livesum",
+)
+LIMITER_SHED = Counter(
+    "planner_upstream_limiter_shed_total",
+    "request ที่ถูกตัดทิ้งก่อนถึง upstream (queue_full/queue_timeout)",
+    ["limiter", "reason"],
+)
+MODEL_RETRIES = Counter(
+    "planner_model_retries_total",
+    "จำนวนครั้งที่ retry การเรียกโมเดล แยกตามปลายทางและสาเหตุ",
+    ["destination", "reason"],
+)
+MODEL_HEDGES = Counter(
+    "planner_model_hedges_total",
+    "hedged request ไปยัง fallback model (sent / primary_won / hedge_won)",
+    ["destination", "outcome"],
+)
+BREAKER_STATE = Gauge(
+    "planner_circuit_breaker_state",
+    "สถานะ circuit breaker ต่อปลายทาง (0=closed, 1=half_open, 2=open)",
+    ["breaker"],
+    multiprocess_mode="liveall",
+)
+BREAKER_SHORT_CIRCUITS = Counter(
+    "planner_circuit_breaker_short_circuits_total",
+    "จำนวนครั้งที่ตอบ fallback ทันทีเพราะวงจรเปิดอยู่",
+    ["breaker"],
+)
+JOB_QUEUE_DEPTH = Gauge(
+    "planner_job_queue_depth",
+    "จำนวนงานที่รออยู่ในคิว (status=queued)",
+    multiprocess_mode="livemax",  # ทุก worker อ่านคิว SQLite เดียวกัน
+)
+JOB_WAIT_SECONDS = Histogram(
+    "planner_job_wait_seconds",
+    "เวลาที่งานรอในคิวก่อน worker เริ่มทำ",
+    ["kind"],
+    buckets=_LATENCY_BUCKETS,
+)
+JOB_RUN_SECONDS = Histogram(
+    "planner_job_run_seconds",
+    "เวลาที่ worker ใช้ทำงานหนึ่งงาน",
+    ["kind"],
+    buckets=_LATENCY_BUCKETS,
+)
+JOBS_TOTAL = Counter(
+    "planner_jobs_total",
+    "จำนวนงานที่จบแล้ว แยกตามชนิดและผล (done/failed/requeued)",
+    ["kind", "status"],
+)
+
+GAZETTEER_LOOKUPS = Counter(
+    "planner_gazetteer_lookups_total",
+    "lookup พิกัดจาก gazetteer ในเครื่อง แยกตามชนิดที่จับคู่ได้ (exact/prefix/contained/fuzzy/miss)",
+    ["match"],
+)
+PROMPT_TOKENS = Histogram(
+    "planner_prompt_tokens_estimate",
+    "จำนวน token โดยประมาณของ prompt ที่ส่งให้โมเดล (ก่อนเรียกจริง)",
+    ["app", "caller"],
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000),
+)
+
+
+@contextmanager
+def stage_timer(app: str, stage: str) -> Iterator[None]:
+    """จับเวลาขั้นหนึ่งของ pipeline (ใช้ครอบ await ได้)"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(app, stage).observe(time.perf_counter() - t0)
+
+
+class OutboundCall:
+    """สถานะของการเรียกหนึ่งครั้ง — ตั้ง status เองได้ (เช่น HTTP status code) ก่อนออกจาก block"""
+
+    def __init__(self):
+        self.status: Optional[str] = None
+
+
+def error_status(exc: BaseException) -> str:
+    """แปลง exception เป็น label สั้น ๆ: HTTP/API code ถ้ามี ไม่งั้นใช้ชื่อคลาส"""
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int):
+        return str(code)
+    if "Timeout" in type(exc).__name__:
+        return "timeout"
+    return type(exc).__name__
+
+
+@contextmanager
+def outbound_call(destination: str) -> Iterator[OutboundCall]:
+    """นับ + จับเวลาการเรียกบริการภายนอก (status = "ok" ถ้าไม่ได้ตั้งและไม่มี exception)"""
+    call = OutboundCall()
+    t0 = time.perf_counter()
+    try:
+        yield call
+    except BaseException as exc:
+        call.status = call.status or error_status(exc)
+        raise
+    finally:
+        OUTBOUND_SECONDS.labels(destination).observe(time.perf_counter() - t0)
+        OUTBOUND_CALLS.labels(destination, call.status or "ok").inc()
+
+
+def metrics_response() -> Response:
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
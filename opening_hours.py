@@ -0,0 +1,227 @@
+"""แปลงข้อความเวลาเปิด-ปิด (PlaceDetail.opening_hours) เป็น bitmap รายนาทีของทั้งสัปดาห์
+
+รองรับชื่อวันไทย/อังกฤษ (เต็ม ย่อ ช่วงวัน รายการวัน ทุกวัน วันธรรมดา สุดสัปดาห์) หลายช่วงเวลาต่อวัน
+เวลาข้ามเที่ยงคืน, am/pm, "24 ชม." และข้อยกเว้นแบบ "closed Mon" / "ปิดวันจันทร์" / "Mon closed"
+
+    >>> hours = compile_hours("Mon-Sun 10:00-18:00 (closed Wed)")
+    >>> is_open(hours, 0, (600, 720)), is_open(hours, 2, (600, 720))
+    (True, False)
+
+bitmap เป็น int ขนาด 7 * 1440 บิต (บิต i = นาทีที่ i นับจากเที่ยงคืนวันจันทร์) ข้อความเดียวกันถูก compile
+ครั้งเดียวผ่าน lru_cache — query หนึ่งครั้งเป็น shift/and/bit_count ไม่กี่ไมโครวินาที
+ข้อความที่ไม่พบช่วงเวลาเลย (เช่น "ไม่ทราบ โปรดตรวจสอบ") ได้ None = ไม่ทราบ
+"""
+
+import re
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, List, Optional, Tuple
+
+DAY_MINUTES = 24 * 60
+WEEK_MINUTES = 7 * DAY_MINUTES
+ALL_DAYS = frozenset(range(7))  # 0 = จันทร์ ตรงกับ datetime.weekday()
+
+_EN_DAYS = [
+    r"mon(?:day)?s?", r"tue(?:s(?:day)?)?s?", r"wed(?:nesday)?s?", r"thu(?:r(?:s(?:day)?)?)?s?",
+    r"fri(?:day)?s?", r"sat(?:urday)?s?", r"sun(?:day)?s?",
+]
+_TH_DAYS = [r"จันทร์|จ\.", r"อังคาร|อ\.", r"พุธ|พ\.", r"พฤหัสบดี|พฤหัส|พฤ\.", r"ศุกร์|ศ\.", r"เสาร์|ส\.", r"อาทิตย์|อา\."]
+# ตัวย่อที่ยาวกว่าต้องมาก่อน (พฤ. ก่อน พ., อา. ก่อน อ.)
+_TH_DAY = "|".join(sorted((alt for names in _TH_DAYS for alt in names.split("|")), key=len, reverse=True))
+_DAY = rf"(?:วัน)?(?:\b(?:{'|'.join(_EN_DAYS)})\b\.?|{_TH_DAY})"
+_RANGE_SEP = r"\s*(?:-|–|—|~|to|through|thru|until|till|ถึง)\s*"
+_CLOCK = r"(\d{1,2})(?:[:.](\d{2}))?\s*(a\.?m\.?|p\.?m\.?)?"
+
+_TOKEN_RE = re.compile(
+    rf"(?P<allday>24\s*(?:hours?|hrs?|h\b|ชม\.?|ชั่วโมง)|24/7|ตลอดวัน|ทั้งวัน)"
+    rf"|(?P<time>{_CLOCK}{_RANGE_SEP}{_CLOCK})"
+    rf"|(?P<dayrange>{_DAY}{_RANGE_SEP}{_DAY})"
+    rf"|(?P<every>daily|every\s*day|everyday|all\s*week|ทุกวัน(?!\s*(?:{_TH_DAY}|หยุด)))"
+    rf"|(?P<weekdays>\bweekdays?\b|วันธรรมดา)"
+    rf"|(?P<weekends>\bweekends?\b|สุดสัปดาห์)"
+    rf"|(?P<day>{_DAY})"
+    rf"|(?P<ignore>วันหยุด(?:นักขัตฤกษ์|ราชการ)?|นักขัตฤกษ์|(?:public\s+)?holidays?)"
+    rf"|(?P<closed>\bclos(?:ed|e|ing)\b|(?<!เ)ปิด|หยุด)"
+    rf"|(?P<sep>,)"
+    r"|(?P<brk>[;\n|()\[\]])",
+    re.IGNORECASE,
+)
+_DAY_PATTERNS = [re.compile(rf"(?:วัน)?(?:{en}|{th})\.?", re.IGNORECASE) for en, th in zip(_EN_DAYS, _TH_DAYS)]
+
+
+def _weekday(token: str) -> int:
+    token = token.strip()
+    for weekday, pattern in enumerate(_DAY_PATTERNS):
+        if pattern.fullmatch(token):
+            return weekday
+    raise ValueError(token)
+
+
+def _days(match: re.Match) -> frozenset:
+    kind = match.lastgroup
+    if kind == "every":
+        return ALL_DAYS
+    if kind == "weekdays":
+        return frozenset(range(5))
+    if kind == "weekends":
+        return frozenset((5, 6))
+    if kind == "day":
+        return frozenset((_weekday(match.group()),))
+    first, last = (_weekday(t) for t in re.split(_RANGE_SEP, match.group(), maxsplit=1))
+    return frozenset((first + i) % 7 for i in range((last - first) % 7 + 1))  # รองรับช่วงข้ามสัปดาห์ เช่น Fri-Mon
+
+
+def _minutes(hour: str, minute: Optional[str], meridiem: Optional[str]) -> Optional[int]:
+    h, m = int(hour), int(minute or 0)
+    if m > 59:
+        return None
+    if meridiem:
+        if h > 12:
+            return None
+        h = h % 12 + (12 if meridiem.lower().startswith("p") else 0)
+    return h * 60 + m if h * 60 + m <= DAY_MINUTES else None
+
+
+def _time_range(match: re.Match) -> Optional[Tuple[int, int]]:
+    h1, m1, ap1, h2, m2, ap2 = match.group(*range(match.re.groupindex["time"] + 1, match.re.groupindex["time"] + 7))
+    if ap2 and not ap1:
+        # "9-5pm": ใช้ am/pm เดียวกันถ้ายังได้ช่วงที่เริ่มก่อนปิด ไม่อย่างนั้นตีเป็น am
+        same = _minutes(h1, m1, ap2)
+        ap1 = ap2 if same is not None and same < (_minutes(h2, m2, ap2) or 0) else "am"
+    opens, closes = _minutes(h1, m1, ap1), _minutes(h2, m2, ap2)
+    if opens is None or closes is None:
+        return None
+    if closes <= opens:
+        closes += DAY_MINUTES  # ปิดหลังเที่ยงคืน — บิตล้นไปวันถัดไป
+    return opens, closes
+
+
+def _span_mask(start: int, length: int) -> int:
+    """บิต [start, start + length) บนวงรอบสัปดาห์"""
+    length = max(0, min(length, WEEK_MINUTES))
+    start %= WEEK_MINUTES
+    head = min(length, WEEK_MINUTES - start)
+    mask = ((1 << head) - 1) << start
+    return mask | ((1 << (length - head)) - 1)
+
+
+@dataclass(frozen=True)
+class WeeklyHours:
+    mask: int
+    # bitmap 2 วัน (วันนั้น + วันถัดไป) ต่อ weekday — query ช่วงในวันทำบน int เล็กแทนทั้งสัปดาห์
+    _windows: Tuple[int, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        wrapped = self.mask | (self.mask << WEEK_MINUTES)
+        window = (1 << 2 * DAY_MINUTES) - 1
+        object.__setattr__(self, "_windows", tuple((wrapped >> d * DAY_MINUTES) & window for d in range(7)))
+
+    def open_minutes(self, weekday: int, start: int, end: int) -> int:
+        """จำนวนนาทีที่เปิดในช่วง [start, end) ของวัน weekday (end เกิน 1440 = ล้นไปวันถัดไป)"""
+        if 0 <= start <= end <= 2 * DAY_MINUTES:
+            return (self._windows[weekday % 7] & (((1 << (end - start)) - 1) << start)).bit_count()
+        return (self.mask & _span_mask(weekday * DAY_MINUTES + start, end - start)).bit_count()
+
+    def covers(self, weekday: int, start: int, end: int) -> bool:
+        return self.open_minutes(weekday, start, max(end, start + 1)) == max(end - start, 1)
+
+    def coverage(self, start: int, end: int) -> List[int]:
+        """open_minutes ของช่วงเดียวกันในทุกวัน จันทร์-อาทิตย์ (ใช้เมื่อไม่รู้วันที่เดินทางจริง)"""
+        if 0 <= start <= end <= 2 * DAY_MINUTES:
+            span = ((1 << (end - start)) - 1) << start
+            return [(window & span).bit_count() for window in self._windows]
+        return [self.open_minutes(weekday, start, end) for weekday in range(7)]
+
+    def intervals(self, weekday: int) -> List[Tuple[int, int]]:
+        """ช่วงที่เปิดของวันนั้นเป็นนาที [(เปิด, ปิด), ...]"""
+        day = (self.mask >> (weekday * DAY_MINUTES)) & ((1 << DAY_MINUTES) - 1)
+        spans, minute = [], 0
+        while day:
+            skip = (day & -day).bit_length() - 1
+            day >>= skip
+            run = (~day & (day + 1)).bit_length() - 1
+            spans.append((minute + skip, minute + skip + run))
+            day >>= run
+            minute += skip + run
+        return spans
+
+
+@lru_cache(maxsize=4096)
+def compile_hours(text: Optional[str]) -> Optional[WeeklyHours]:
+    """แปลงข้อความเวลาเปิด-ปิดเป็น WeeklyHours — None ถ้าไม่พบช่วงเวลาใดเลย"""
+    if not text:
+        return None
+    opened, closed_mask = 0, 0
+    found = False
+    days: set = set()
+    times: List[Tuple[int, int]] = []
+    closed = carry = False
+
+    def apply(target_days, spans) -> int:
+        mask = 0
+        for weekday in target_days:
+            for start, end in spans:
+                mask |= _span_mask(weekday * DAY_MINUTES + start, end - start)
+        return mask
+
+    def flush() -> None:
+        nonlocal opened, closed_mask, closed, carry
+        if closed:
+            if times:
+                closed_mask |= apply(days or ALL_DAYS, times)  # เช่น "ปิด 12:00-13:00" = พักกลางวัน
+            elif days:
+                closed_mask |= apply(days, [(0, DAY_MINUTES)])
+                carry = True  # "closed Mon, Tue" -> วันที่ตามมาโดยไม่มีเวลาก็ปิดด้วย
+        elif times:
+            opened |= apply(days or ALL_DAYS, times)
+            carry = False
+        elif days and carry:
+            closed_mask |= apply(days, [(0, DAY_MINUTES)])
+        days.clear()
+        times.clear()
+        closed = False
+
+    for match in _TOKEN_RE.finditer(text):
+        kind = match.lastgroup
+        if kind in ("time", "allday"):
+            if closed and days and not times:
+                flush()  # "ปิดทุกวันพุธ 10:00-20:00" — ปิดทั้งวันพุธ ส่วนเวลาที่ตามมาคือเวลาเปิดของวันอื่น
+            span = (0, DAY_MINUTES) if kind == "allday" else _time_range(match)
+            if span is not None:
+                times.append(span)
+                found = True
+        elif kind in ("day", "dayrange", "every", "weekdays", "weekends"):
+            if times:
+                flush()
+            days.update(_days(match))
+        elif kind == "closed":
+            postfix = bool(days) and not times and not closed  # "Mon closed" — วันมาก่อนคำว่าปิด
+            if times:
+                flush()
+            closed = True
+            if postfix:
+                flush()
+        elif kind == "sep":
+            if closed:
+                flush()
+        elif kind == "brk":
+            flush()
+    flush()
+    if not found:
+        return None
+    return WeeklyHours(opened & ~closed_mask)
+
+
+def is_open(place: Any, weekday: int, time_range: Tuple[int, int]) -> Optional[bool]:
+    """เปิดตลอดช่วง time_range = (เริ่ม, จบ) นาทีนับจากเที่ยงคืนของวัน weekday (0 = จันทร์) หรือไม่
+
+    place เป็น PlaceDetail (อ่าน opening_hours), ข้อความ หรือ WeeklyHours — None = ไม่ทราบเวลาเปิด-ปิด
+    """
+    if isinstance(place, WeeklyHours):
+        hours = place
+    else:
+        hours = compile_hours(place if isinstance(place, str) or place is None else getattr(place, "opening_hours", None))
+    if hours is None:
+        return None
+    start, end = time_range
+    return hours.covers(weekday, start, end)
@@ -0,0 +1,129 @@
+"""ประเมินความเป็นไปได้ของแผนเที่ยวแบบ batch: ทุกตัวเลือกทุกวันในการคำนวณ NumPy รอบเดียว
+
+อินพุตเป็นจุดแวะทั้งหมดเรียงต่อกัน (แบนราบ) พร้อม group id ของ (ตัวเลือก, วัน) — ไม่เรียกโมเดล
+ต่อจุด: เวลาเดินทางจากจุดก่อนหน้า (haversine), เวลาที่ทับกับจุดก่อนหน้า, เวลาไม่พอเดินทาง, ขัดกับเวลาเปิด-ปิด
+ต่อวัน: รวมเวลาอยู่ + เวลาเดินทาง และช่วงเวลาตั้งแต่จุดแรกเริ่มจนจุดสุดท้ายจบ
+
+แผนไม่มีวันที่จริง (มีแค่ day_index) จึงตรวจเวลาเปิด-ปิด (opening_hours.compile_hours) กับทุกวันในสัปดาห์
+"""
+
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from itinerary_optimizer import EARTH_RADIUS_KM
+from opening_hours import compile_hours
+
+# ขัดกับเวลาเปิด-ปิด: 0 = ไม่ขัด/ไม่ทราบ, 1 = อยู่เกินเวลาเปิดบางส่วน, 2 = ปิดตลอดช่วงทุกวัน,
+# 3 = ปิดบางวันในสัปดาห์ (ขึ้นกับวันที่เดินทางจริง)
+HOURS_OK, HOURS_PARTIAL, HOURS_CLOSED, HOURS_SOME_DAYS = 0, 1, 2, 3
+_NO_HOURS = [np.nan] * 7
+
+
+@dataclass
+class StopArrays:
+    """จุดแวะทั้งหมดแบบแบนราบ (ยาว S) เรียงตาม group แล้วตามลำดับในวัน — ค่าที่ไม่ทราบเป็น NaN"""
+    group: np.ndarray     # int, group id ของ (ตัวเลือก, วัน) ใน [0, G) ไม่ลดลง (วันที่ไม่มีจุดแวะไม่มีแถว)
+    lat: np.ndarray
+    lng: np.ndarray
+    start: np.ndarray     # นาทีนับจากเที่ยงคืน
+    stay: np.ndarray      # นาที
+    open_minutes: np.ndarray  # (S, 7) นาทีที่เปิดในช่วงที่อยู่ ของแต่ละวัน จันทร์-อาทิตย์
+
+
+@dataclass
+class FeasibilityArrays:
+    # ต่อจุด (ยาว S)
+    travel_before: np.ndarray   # นาทีจากจุดก่อนหน้าในวันเดียวกัน (จุดแรก = 0)
+    overlap: np.ndarray         # นาทีที่เริ่มก่อนจุดก่อนหน้าจบ (> 0 = ทับกัน)
+    shortfall: np.ndarray       # นาทีที่ขาดสำหรับการเดินทางจากจุดก่อนหน้า (> 0 = ไม่ทัน, ไม่รวมที่ทับกัน)
+    hours: np.ndarray           # HOURS_OK / HOURS_PARTIAL / HOURS_CLOSED / HOURS_SOME_DAYS
+    # ต่อ group (ยาว G)
+    stay_total: np.ndarray
+    travel_total: np.ndarray
+    span: np.ndarray            # นาทีตั้งแต่จุดแรกเริ่มจนจุดสุดท้ายจบ (ไม่ทราบเวลา = NaN)
+    stops: np.ndarray
+
+
+def _visit_minutes(stay) -> int:
+    # stay 0/ไม่ทราบ (เช่น แวะถ่ายรูป) ตรวจเป็นนาทีเดียว ณ เวลาเริ่ม
+    return max(int(stay or 0), 1)
+
+
+def build_arrays(rows: Sequence[Tuple[int, Optional[float], Optional[float], Optional[float], Optional[float], Optional[str]]]) -> StopArrays:
+    """rows = (group, lat, lng, start_minutes, stay_minutes, opening_hours) เรียงตาม group แล้วตามลำดับในวัน"""
+    def column(i: int) -> np.ndarray:
+        return np.array([np.nan if r[i] is None else r[i] for r in rows], dtype=np.float64)
+
+    def coverage(row) -> list:
+        hours = compile_hours(row[5])
+        if hours is None or row[3] is None:
+            return _NO_HOURS
+        start = int(row[3])
+        return hours.coverage(start, start + _visit_minutes(row[4]))
+
+    return StopArrays(
+        group=np.array([r[0] for r in rows], dtype=np.intp),
+        lat=column(1),
+        lng=column(2),
+        start=column(3),
+        stay=column(4),
+        open_minutes=np.array([coverage(r) for r in rows], dtype=np.float64).reshape(-1, 7),
+    )
+
+
+def assess(
+    stops: StopArrays, groups: int, speed_kmh: float, buffer_minutes: float, unknown_travel_minutes: float = 30.0
+) -> FeasibilityArrays:
+    """groups = จำนวน (ตัวเลือก, วัน) ทั้งหมด G รวมวันที่ไม่มีจุดแวะ — ผลต่อ group ยาว G เสมอ"""
+    n = len(stops.group)
+    same_day = np.zeros(n, dtype=bool)
+    same_day[1:] = stops.group[1:] == stops.group[:-1]
+
+    # ระยะทางเฉพาะคู่ที่ติดกัน (ไม่ต้องสร้าง matrix เต็ม)
+    phi = np.radians(stops.lat)
+    lam = np.radians(stops.lng)
+    a = np.sin((phi[1:] - phi[:-1]) / 2) ** 2 + np.cos(phi[1:]) * np.cos(phi[:-1]) * np.sin((lam[1:] - lam[:-1]) / 2) ** 2
+    km = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+    leg = np.ceil((km / max(speed_kmh, 1e-6) * 60 + buffer_minutes) / 5) * 5
+    travel = np.zeros(n)
+    travel[1:] = np.where(np.isnan(leg), unknown_travel_minutes, leg)
+    travel[~same_day] = 0.0
+
+    end = stops.start + stops.stay
+    prev_end = np.full(n, np.nan)
+    prev_end[1:] = end[:-1]
+    prev_end[~same_day] = np.nan
+    with np.errstate(invalid="ignore"):
+        gap = stops.start - prev_end  # NaN ถ้าไม่ทราบเวลา -> ไม่นับเป็นปัญหา
+        overlap = np.where(gap < 0, -gap, 0.0)
+        shortfall = np.where((gap >= 0) & (gap < travel), travel - gap, 0.0)
+
+        known = ~np.isnan(stops.open_minutes[:, 0])
+        visit = np.maximum(np.nan_to_num(stops.stay), 1)[:, None]
+        full = stops.open_minutes >= visit
+        shut = stops.open_minutes <= 0
+        closed = known & shut.all(axis=1)
+        partial = known & ~closed & (~full & ~shut).any(axis=1)
+        some_days = known & ~closed & ~partial & shut.any(axis=1)
+    hours = np.select([closed, partial, some_days], [HOURS_CLOSED, HOURS_PARTIAL, HOURS_SOME_DAYS], HOURS_OK)
+
+    stay = np.nan_to_num(stops.stay)
+    first_start = np.full(groups, np.nan)
+    last_end = np.full(groups, np.nan)
+    if n:
+        starts_at = np.flatnonzero(~same_day)
+        ends_at = np.append(starts_at[1:], n) - 1
+        first_start[stops.group[starts_at]] = stops.start[starts_at]
+        last_end[stops.group[ends_at]] = end[ends_at]
+    return FeasibilityArrays(
+        travel_before=travel,
+        overlap=overlap,
+        shortfall=shortfall,
+        hours=hours,
+        stay_total=np.bincount(stops.group, weights=stay, minlength=groups),
+        travel_total=np.bincount(stops.group, weights=travel, minlength=groups),
+        span=last_end - first_start,
+        stops=np.bincount(stops.group, minlength=groups),
+    )
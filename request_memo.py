@@ -0,0 +1,75 @@
+"""Memoization ระดับ response: รวม request ซ้ำที่กำลังประมวลผลอยู่ให้ใช้งานร่วมกัน + key จาก input ที่ normalize แล้ว
+
+ใช้คู่กับ KVCache (เก็บผลลัพธ์สุดท้ายช่วงสั้น ๆ) ทั้งใน main.py และ api.py
+Idempotency-Key เดียวกันต้องมากับ body เดิม — ผลที่ cache/กำลังทำอยู่เก็บ body_hash ไว้เทียบ ไม่ตรง -> 422
+"""
+
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class IdempotencyKeyMismatch(Exception):
+    """Idempotency-Key ถูกใช้ซ้ำกับ body ที่ต่างจากครั้งแรก — ควรตอบ 422"""
+
+    def __init__(self, key: str):
+        super().__init__(f"Idempotency-Key reused with a different request body ({key})")
+        self.key = key
+
+
+def body_hash(*parts: Any) -> str:
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def request_key(namespace: str, *parts: Any, idempotency_key: Optional[str] = None) -> str:
+    """สร้าง key จากส่วนประกอบของ request — ถ้ามี Idempotency-Key จะใช้ค่านั้นแทน body"""
+    if idempotency_key:
+        return f"{namespace}:idem:{idempotency_key.strip()}"
+    return f"{namespace}:{body_hash(*parts)}"
+
+
+def check_body(key: str, stored: Optional[str], body: Optional[str]) -> None:
+    """raise IdempotencyKeyMismatch ถ้า body_hash ที่เก็บไว้กับ key ไม่ตรงกับ request นี้ (None = ไม่ได้เก็บ/ไม่เทียบ)"""
+    if stored is not None and body is not None and stored != body:
+        raise IdempotencyKeyMismatch(key)
+
+
+class InflightCoalescer:
+    """request ที่ key ซ้ำกันขณะยังประมวลผลอยู่ จะรอผลจากงานเดียวกัน (ไม่เรียก upstream ซ้ำ)
+
+    งานจริงรันเป็น task แยก จึงไม่ถูกยกเลิกตาม request ใด request หนึ่งที่หลุดไปก่อน
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._bodies: Dict[str, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]], body: Optional[str] = None) -> Tuple[T, bool]:
+        """คืน (ผลลัพธ์, shared) — shared=True เมื่อใช้ผลร่วมกับ request อื่นที่เริ่มไปก่อน
+
+        body (body_hash) ไม่ตรงกับของงานที่กำลังทำอยู่ใต้ key เดียวกัน -> raise IdempotencyKeyMismatch
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._bodies[key] = body
+            task.add_done_callback(lambda t, k=key: self._done(k, t))
+        else:
+            check_body(key, self._bodies.get(key), body)
+        return await asyncio.shield(task), shared
+
+    def _done(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            self._bodies.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # กัน warning "exception was never retrieved" เมื่อทุก request หลุดไปก่อน
@@ -0,0 +1,214 @@
+"""สกัด key เชิงความหมายจากคำขอท่องเที่ยว เพื่อใช้ cache ผล research
+
+คำขอที่ต่างกันแค่ถ้อยคำ เช่น "เที่ยวเชียงใหม่ 3 วัน" กับ "ไปเชียงใหม่ 3 วัน" ควรได้ key เดียวกัน:
+key = ปลายทาง + จำนวนวัน + เดือนที่ระบุ + สไตล์ + ช่วงวันที่ปัจจุบัน (bucket)
+"""
+
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from textnorm import normalize_name
+
+# canonical -> ชื่อ/alias (ไทย + อังกฤษ) — 77 จังหวัด + ปลายทางยอดนิยมที่ควรแยก research จากจังหวัด
+_DESTINATIONS: Dict[str, Tuple[str, ...]] = {
+    "bangkok": ("กรุงเทพ", "กทม", "bangkok", "bkk"),
+    "krabi": ("กระบี่", "krabi", "อ่าวนาง", "ao nang"),
+    "kanchanaburi": ("กาญจนบุรี", "kanchanaburi"),
+    "kalasin": ("กาฬสินธุ์", "kalasin"),
+    "kamphaeng phet": ("กำแพงเพชร", "kamphaeng phet"),
+    "khon kaen": ("ขอนแก่น", "khon kaen"),
+    "chanthaburi": ("จันทบุรี", "chanthaburi"),
+    "chachoengsao": ("ฉะเชิงเทรา", "chachoengsao"),
+    "chonburi": ("ชลบุรี", "chonburi", "บางแสน", "bang saen"),
+    "chai nat": ("ชัยนาท", "chai nat"),
+    "chaiyaphum": ("ชัยภูมิ", "chaiyaphum"),
+    "chumphon": ("ชุมพร", "chumphon"),
+    "chiang rai": ("เชียงราย", "chiang rai"),
+    "chiang mai": ("เชียงใหม่", "chiang mai", "chiangmai"),
+    "trang": ("ตรัง", "trang"),
+    "trat": ("ตราด", "trat"),
+    "tak": ("จังหวัดตาก", "จ.ตาก", "แม่สอด", "tak province", "mae sot"),
+    "nakhon nayok": ("นครนายก", "nakhon nayok"),
+    "nakhon pathom": ("นครปฐม", "nakhon pathom"),
+    "nakhon phanom": ("นครพนม", "nakhon phanom"),
+    "nakhon ratchasima": ("นครราชสีมา", "โคราช", "nakhon ratchasima", "korat"),
+    "nakhon si thammarat": ("นครศรีธรรมราช", "nakhon si thammarat"),
+    "nakhon sawan": ("นครสวรรค์", "nakhon sawan"),
+    "nonthaburi": ("นนทบุรี", "nonthaburi"),
+    "narathiwat": ("นราธิวาส", "narathiwat"),
+    "nan": ("น่าน", "nan province"),
+    "bueng kan": ("บึงกาฬ", "bueng kan"),
+    "buriram": ("บุรีรัมย์", "buriram"),
+    "pathum thani": ("ปทุมธานี", "pathum thani"),
+    "prachuap khiri khan": ("ประจวบคีรีขันธ์", "ประจวบ", "prachuap khiri khan"),
+    "prachinburi": ("ปราจีนบุรี", "prachinburi"),
+    "pattani": ("ปัตตานี", "pattani"),
+    "ayutthaya": ("พระนครศรีอยุธยา", "อยุธยา", "ayutthaya"),
+    "phayao": ("พะเยา", "phayao"),
+    "phang nga": ("พังงา", "phang nga", "เขาหลัก", "khao lak"),
+    "phatthalung": ("พัทลุง", "phatthalung"),
+    "phichit": ("พิจิตร", "phichit"),
+    "phitsanulok": ("พิษณุโลก", "phitsanulok"),
+    "phetchaburi": ("เพชรบุรี", "phetchaburi"),
+    "phetchabun": ("เพชรบูรณ์", "phetchabun", "เขาค้อ", "khao kho"),
+    "phrae": ("จังหวัดแพร่", "จ.แพร่", "phrae"),
+    "phuket": ("ภูเก็ต", "phuket"),
+    "maha sarakham": ("มหาสารคาม", "maha sarakham"),
+    "mukdahan": ("มุกดาหาร", "mukdahan"),
+    "mae hong son": ("แม่ฮ่องสอน", "mae hong son"),
+    "yasothon": ("ยโสธร", "yasothon"),
+    "yala": ("ยะลา", "yala", "เบตง", "betong"),
+    "roi et": ("ร้อยเอ็ด", "roi et"),
+    "ranong": ("ระนอง", "ranong"),
+    "rayong": ("ระยอง", "rayong", "เกาะเสม็ด", "koh samet"),
+    "ratchaburi": ("ราชบุรี", "ratchaburi", "สวนผึ้ง", "suan phueng"),
+    "lopburi": ("ลพบุรี", "lopburi"),
+    "lampang": ("ลำปาง", "lampang"),
+    "lamphun": ("ลำพูน", "lamphun"),
+    "loei": ("จังหวัดเลย", "จ.เลย", "เชียงคาน", "ภูกระดึง", "loei", "chiang khan"),
+    "sisaket": ("ศรีสะเกษ", "sisaket"),
+    "sakon nakhon": ("สกลนคร", "sakon nakhon"),
+    "songkhla": ("สงขลา", "หาดใหญ่", "songkhla", "hat yai"),
+    "satun": ("สตูล", "เกาะหลีเป๊ะ", "satun", "koh lipe"),
+    "samut prakan": ("สมุทรปราการ", "samut prakan"),
+    "samut songkhram": ("สมุทรสงคราม", "อัมพวา", "samut songkhram", "amphawa"),
+    "samut sakhon": ("สมุทรสาคร", "samut sakhon"),
+    "sa kaeo": ("สระแก้ว", "sa kaeo"),
+    "saraburi": ("สระบุรี", "saraburi"),
+    "sing buri": ("สิงห์บุรี", "sing buri"),
+    "sukhothai": ("สุโขทัย", "sukhothai"),
+    "suphanburi": ("สุพรรณบุรี", "suphanburi"),
+    "surat thani": ("สุราษฎร์ธานี", "surat thani", "เขาสก", "khao sok"),
+    "surin": ("สุรินทร์", "surin"),
+    "nong khai": ("หนองคาย", "nong khai"),
+    "nong bua lamphu": ("หนองบัวลำภู", "nong bua lamphu"),
+    "ang thong": ("อ่างทอง", "ang thong"),
+    "amnat charoen": ("อำนาจเจริญ", "amnat charoen"),
+    "udon thani": ("อุดรธานี", "udon thani"),
+    "uttaradit": ("อุตรดิตถ์", "uttaradit"),
+    "uthai thani": ("อุทัยธานี", "uthai thani"),
+    "ubon ratchathani": ("อุบลราชธานี", "อุบล", "ubon ratchathani"),
+    # ปลายทางยอดนิยมที่ research ต่างจากตัวจังหวัดชัดเจน
+    "pattaya": ("พัทยา", "pattaya"),
+    "hua hin": ("หัวหิน", "hua hin"),
+    "pai": ("ปาย", "pai"),
+    "koh samui": ("เกาะสมุย", "สมุย", "koh samui", "samui"),
+    "koh phangan": ("เกาะพะงัน", "koh phangan"),
+    "koh tao": ("เกาะเต่า", "koh tao"),
+    "koh phi phi": ("เกาะพีพี", "พีพี", "phi phi"),
+    "koh chang": ("เกาะช้าง", "koh chang"),
+    "koh kood": ("เกาะกูด", "koh kood", "koh kut"),
+    "khao yai": ("เขาใหญ่", "khao yai"),
+}
+
+# สไตล์ทริป: canonical -> คำสำคัญ
+_STYLES: Dict[str, Tuple[str, ...]] = {
+    "beach": ("ทะเล", "ชายหาด", "หาด", "เกาะ", "ดำน้ำ", "beach", "sea", "island", "snorkel", "diving"),
+    "nature": ("ธรรมชาติ", "ภูเขา", "น้ำตก", "เดินป่า", "แคมป์", "กางเต็นท์", "nature", "mountain", "waterfall", "hiking", "camping"),
+    "cafe": ("คาเฟ่", "กาแฟ", "cafe", "coffee"),
+    "food": ("ของกิน", "อาหาร", "ร้านอร่อย", "สตรีทฟู้ด", "food", "eat", "street food"),
+    "temple": ("วัด", "ไหว้พระ", "ทำบุญ", "temple"),
+    "culture": ("ประวัติศาสตร์", "พิพิธภัณฑ์", "เมืองเก่า", "วัฒนธรรม", "history", "museum", "old town", "culture"),
+    "nightlife": ("ไนท์ไลฟ์", "บาร์", "ผับ", "ตลาดนัดกลางคืน", "nightlife", "bar", "night market"),
+    "shopping": ("ช้อปปิ้ง", "ห้าง", "ตลาด", "shopping", "mall", "market"),
+    "family": ("ครอบครัว", "เด็ก", "family", "kids"),
+    "couple": ("แฟน", "คู่รัก", "ฮันนีมูน", "couple", "honeymoon", "romantic"),
+    "budget": ("ประหยัด", "งบน้อย", "ราคาถูก", "budget", "cheap"),
+    "luxury": ("หรู", "ลักชัวรี", "5 ดาว", "luxury", "5-star"),
+}
+
+_MONTHS: Dict[int, Tuple[str, ...]] = {
+    1: ("มกราคม", "ม.ค.", "january", "jan"),
+    2: ("กุมภาพันธ์", "ก.พ.", "february", "feb"),
+    3: ("มีนาคม", "มี.ค.", "march"),
+    4: ("เมษายน", "เม.ย.", "สงกรานต์", "april", "songkran"),
+    5: ("พฤษภาคม", "พ.ค."),
+    6: ("มิถุนายน", "มิ.ย.", "june"),
+    7: ("กรกฎาคม", "ก.ค.", "july"),
+    8: ("สิงหาคม", "ส.ค.", "august"),
+    9: ("กันยายน", "ก.ย.", "september"),
+    10: ("ตุลาคม", "ต.ค.", "october"),
+    11: ("พฤศจิกายน", "พ.ย.", "ลอยกระทง", "november"),
+    12: ("ธันวาคม", "ธ.ค.", "december", "dec"),
+}
+
+_DAYS_RE = re.compile(r"(\d+)\s*(?:วัน|days?\b|d\b)")
+_NIGHTS_RE = re.compile(r"(\d+)\s*(?:คืน|nights?\b|n\b)")
+_ASCII_RE = re.compile(r"^[a-z0-9 .\-]+$")
+
+
+def _contains(text: str, alias: str) -> bool:
+    # alias อังกฤษต้องตรงทั้งคำ (กัน "nan" ไปโดน "banana"), alias ไทยไม่มีช่องว่างระหว่างคำจึงใช้ substring
+    if _ASCII_RE.match(alias):
+        return re.search(rf"(?<![a-z]){re.escape(alias)}(?![a-z])", text) is not None
+    return alias in text
+
+
+def _matches(text: str, table: Dict) -> List:
+    return sorted(k for k, aliases in table.items() if any(_contains(text, a) for a in aliases))
+
+
+def _alias_pattern(alias: str) -> str:
+    return rf"(?<![a-z]){re.escape(alias)}(?![a-z])" if _ASCII_RE.match(alias) else re.escape(alias)
+
+
+# ชื่อปลายทางและคำนำหน้าเขตปกครอง (ยาวก่อน) — ภาษาไทยไม่มีช่องว่างคั่นคำ คำสไตล์จึงซ้อนอยู่ในชื่อได้
+# เช่น "วัด" ใน "จังหวัด", "หาด" ใน "หาดใหญ่", "เกาะ" ใน "เกาะช้าง" ต้องตัดออกก่อนหาสไตล์
+_PLACE_WORDS_RE = re.compile("|".join(
+    _alias_pattern(word)
+    for word in sorted({"จังหวัด", "อำเภอ", "ตำบล", *(a for aliases in _DESTINATIONS.values() for a in aliases)}, key=len, reverse=True)
+))
+
+
+def _styles(text: str) -> List[str]:
+    return _matches(_PLACE_WORDS_RE.sub(" ", text), _STYLES)
+
+
+@dataclass(frozen=True)
+class TripKey:
+    destinations: Tuple[str, ...]
+    days: Optional[int]
+    months: Tuple[int, ...]
+    styles: Tuple[str, ...]
+
+    def as_key(self) -> str:
+        return "|".join([
+            ",".join(self.destinations),
+            str(self.days or ""),
+            ",".join(str(m) for m in self.months),
+            ",".join(self.styles),
+        ])
+
+
+def extract_trip_key(user_input: str) -> Optional[TripKey]:
+    """สกัดปลายทาง/จำนวนวัน/เดือน/สไตล์ — คืน None ถ้าหาปลายทางไม่เจอ (ไม่ควร cache แบบเชิงความหมาย)"""
+    text = normalize_name(user_input)
+    destinations = _matches(text, _DESTINATIONS)
+    if not destinations:
+        return None
+
+    days: Optional[int] = None
+    m = _DAYS_RE.search(text)
+    if m:
+        days = int(m.group(1))
+    else:
+        m = _NIGHTS_RE.search(text)
+        if m:
+            days = int(m.group(1)) + 1
+
+    return TripKey(
+        destinations=tuple(destinations),
+        days=days,
+        months=tuple(_matches(text, _MONTHS)),
+        styles=tuple(_styles(text)),
+    )
+
+
+def research_cache_key(user_input: str, today: date, bucket_days: int) -> str:
+    """key สำหรับ cache ผล research — คำขอที่ไม่รู้ปลายทางใช้ข้อความ normalize ทั้งประโยคแทน"""
+    bucket = today.toordinal() // max(1, bucket_days)
+    trip = extract_trip_key(user_input)
+    semantic = trip.as_key() if trip else "raw:" + normalize_name(user_input)
+    return f"{bucket}|{semantic}"
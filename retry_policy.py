@@ -0,0 +1,119 @@
+"""Retry แบบ exponential backoff + full jitter ภายใต้ deadline และ hedged request
+
+ใช้โดย gemini_client.call_model — ไม่ผูกกับ Gemini โดยตรง (รับ factory ที่คืน awaitable)
+"""
+
+import asyncio
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from metrics import MODEL_HEDGES, MODEL_RETRIES, error_status
+
+T = TypeVar("T")
+
+_RETRYABLE_CODES = (408, 429, 500, 502, 503, 504)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5    # วินาที (ก่อน jitter) ของการ retry ครั้งแรก
+    max_delay: float = 8.0
+    deadline: float = 90.0     # เวลารวมทุก attempt (วินาที)
+
+    def backoff(self, attempt: int) -> float:
+        """full jitter: สุ่มในช่วง [0, min(max_delay, base * 2^(attempt-1))]"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429/5xx/timeout ลองใหม่ได้ — 4xx อื่น ๆ และ schema error ไม่ลองซ้ำ"""
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(code, int):
+        return code in _RETRYABLE_CODES
+    return isinstance(exc, (asyncio.TimeoutError, TimeoutError)) or "Timeout" in type(exc).__name__
+
+
+async def retry_call(
+    name: str,
+    factory: Callable[[], Awaitable[T]],
+    policy: RetryPolicy,
+    deadline: Optional[float] = None,
+) -> T:
+    """เรียก factory() ซ้ำตาม policy — ไม่เริ่ม attempt ใหม่ถ้าการรอ backoff จะเลย deadline (time.monotonic)"""
+    deadline = deadline if deadline is not None else time.monotonic() + policy.deadline
+    attempt = 1
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise asyncio.TimeoutError(f"{name}: deadline exceeded before attempt {attempt}")
+        try:
+            return await asyncio.wait_for(factory(), timeout=remaining)
+        except Exception as exc:
+            if attempt >= policy.max_attempts or not is_retryable(exc):
+                raise
+            delay = policy.backoff(attempt)
+            if time.monotonic() + delay >= deadline:
+                raise
+            MODEL_RETRIES.labels(name, error_status(exc)).inc()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+class LatencyWindow:
+    """เก็บ latency ล่าสุด N ค่า เพื่อหา p95 สำหรับตัดสินใจ hedge"""
+
+    def __init__(self, size: int = 200, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def p95(self) -> Optional[float]:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+
+async def hedged(
+    name: str,
+    primary: Callable[[], Awaitable[T]],
+    backup: Callable[[], Awaitable[T]],
+    hedge_after: Optional[float],
+) -> T:
+    """เริ่ม primary ก่อน ถ้ายังไม่เสร็จภายใน hedge_after วินาที ส่ง backup ขนานกันแล้วใช้ผลที่สำเร็จก่อน
+
+    hedge_after=None -> ไม่ hedge (รอ primary อย่างเดียว)
+    """
+    if hedge_after is None:
+        return await primary()
+
+    first = asyncio.ensure_future(primary())
+    tasks = {first: "primary"}
+    try:
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        MODEL_HEDGES.labels(name, "sent").inc()
+        tasks[asyncio.ensure_future(backup())] = "hedge"
+        pending = set(tasks)
+        errors = {}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    MODEL_HEDGES.labels(name, f"{tasks[task]}_won").inc()
+                    return task.result()
+                errors[tasks[task]] = task.exception()
+        raise errors.get("primary") or errors["hedge"]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
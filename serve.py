@@ -0,0 +1,50 @@
+"""รันแอป FastAPI แบบ process เดียวหรือหลาย worker ตาม WEB_CONCURRENCY (ใช้ทั้ง main.py และ api.py)
+
+WEB_CONCURRENCY=1 (ค่าเริ่มต้น) -> uvicorn process เดียวเหมือนเดิม
+WEB_CONCURRENCY>1 -> uvicorn ตาม import string ("main:app") แยกหลาย worker process
+  cache ทุกชั้น (research / place / response) และคิวงานใช้ SQLite ไฟล์เดียวกัน (WAL) จึง hit ร่วมกันได้
+  งานในคิวผูกกับ worker ที่ claim ผ่าน lease (ไม่ถูกทำซ้ำเมื่อ worker อื่น start/restart) และการเรียก
+  SQLite จากโค้ด async ทำใน thread — worker ที่รอ write lock ของกันและกันไม่ทำให้ event loop ค้าง
+  metrics รวมข้ามทุก worker ผ่าน PROMETHEUS_MULTIPROC_DIR
+
+สำหรับ production ใช้ gunicorn ได้เช่นกัน: gunicorn -c gunicorn.conf.py main:app
+"""
+
+import logging
+import os
+import tempfile
+from typing import Any, Optional
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+
+def web_concurrency() -> int:
+    return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def prepare_multiprocess_metrics() -> str:
+    """ต้องตั้งก่อน worker import prometheus_client — ล้างไฟล์เก่าของรอบก่อนทิ้ง"""
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        path = tempfile.mkdtemp(prefix="planner-prom-")
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if name.endswith(".db"):
+            os.remove(os.path.join(path, name))
+    return path
+
+
+def run(import_string: str, app: Any, host: str, port: int, log_level: Optional[str] = None, **kwargs: Any) -> None:
+    workers = web_concurrency()
+    if workers == 1:
+        uvicorn.run(app, host=host, port=port, log_level=log_level, **kwargs)
+        return
+
+    if not os.getenv("CACHE_DB_PATH", "planner_cache.sqlite3"):
+        logger.warning("CACHE_DB_PATH is empty: each worker keeps its own in-memory cache")
+    prepare_multiprocess_metrics()
+    logger.info(f"starting {workers} workers for {import_string} on {host}:{port}")
+    uvicorn.run(import_string, host=host, port=port, workers=workers, log_level=log_level, **kwargs)
@@ -0,0 +1,8 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# import main ในเทสต์ไม่ต้องสร้างไฟล์ SQLite จริง (cache/คิวอยู่ในหน่วยความจำ)
+os.environ.setdefault("CACHE_DB_PATH", "")
+os.environ.setdefault("JOBS_DB_PATH", "")
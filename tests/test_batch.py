@@ -0,0 +1,22 @@
+import json
+
+import pytest
+
+import main
+
+ROWS = [{"input": "เชียงใหม่ 2 วัน", "options": 1}, {"input": "น่าน 3 วัน", "options": 2}]
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        json.dumps(ROWS, ensure_ascii=False),
+        json.dumps({"items": ROWS}, ensure_ascii=False),
+        "\n".join(json.dumps(row, ensure_ascii=False) for row in ROWS) + "\n",
+    ],
+    ids=["array", "items", "jsonl"],
+)
+def test_load_batch_file_formats(tmp_path, content):
+    path = tmp_path / "items.json"
+    path.write_text(content, encoding="utf-8")
+    assert [item.model_dump() for item in main._load_batch_file(str(path))] == [main.MakePlan(**row).model_dump() for row in ROWS]
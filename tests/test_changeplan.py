@@ -0,0 +1,121 @@
+import pytest
+
+import main
+from benchmarks.fake_upstream import FakeConfig, make_plan_response
+
+
+@pytest.fixture
+def plan():
+    plan = main.PlanResponse(**make_plan_response(FakeConfig(days=2, stops_per_day=4, hotels=1), 1))
+    for i, (_, place) in enumerate(main.iter_places(plan)):
+        place.coordinates = main.Coordinates(lat=18.7 + (i % 5) / 100, lng=98.9 + (i % 3) / 100)
+    return plan
+
+
+def test_autofix_locally_complete_plan_needs_no_model(plan):
+    summary, leftovers = main.autofix_locally(plan)
+    assert summary and leftovers == []
+
+
+def test_autofix_missing_details_stay_local(plan):
+    for _, place in main.iter_places(plan):
+        place.notes = place.price_info = None  # prompt ให้โมเดลเว้น None เมื่อไม่แน่ใจ
+    summary, leftovers = main.autofix_locally(plan)
+    assert summary and leftovers == []
+
+
+@pytest.mark.parametrize(
+    "break_plan, expected",
+    [
+        (lambda day: setattr(day.stops[1].places, "price_info", None), "ข้อมูลไม่ครบ"),
+        (lambda day: setattr(day.stops[2].places, "type", "hotel"), "โรงแรม"),
+        (lambda day: setattr(day.stops[3].places, "name", day.stops[1].places.name), "สถานที่ซ้ำ"),
+    ],
+)
+def test_autofix_leftovers_fall_through_to_model(plan, break_plan, expected, monkeypatch):
+    monkeypatch.setattr(main.settings, "AUTOFIX_REQUIRE_DETAILS", True)
+    break_plan(plan.plan_output[0].itinerary[0])
+    summary, leftovers = main.autofix_locally(plan)
+    assert summary is not None  # ลำดับ/เวลายังจัดในเครื่อง แล้วส่งต่อให้โมเดล
+    assert any(expected in item for item in leftovers)
+
+
+def test_autofix_flags_day_past_midnight(plan):
+    day = plan.plan_output[0].itinerary[1]
+    day.stops[0].start_time = "20:00"
+    before = [stop.start_time for stop in day.stops]
+    summary, leftovers = main.autofix_locally(plan)
+    assert [stop.start_time for stop in day.stops] == before
+    assert any("เที่ยงคืน" in item for item in leftovers)
+    assert any("เที่ยงคืน" in w for w in plan.plan_output[0].warnings)
+
+
+@pytest.mark.parametrize(
+    "break_plan, model_calls",
+    [
+        (lambda day: setattr(day.stops[1].places, "notes", None), 0),  # ข้อมูลขาด -> แก้ในเครื่องครบ
+        (lambda day: setattr(day.stops[3].places, "name", day.stops[1].places.name), 1),  # ซ้ำ -> ให้โมเดลแก้ต่อ
+    ],
+)
+def test_planner_changeplan_calls_model_only_for_leftovers(plan, monkeypatch, break_plan, model_calls):
+    import asyncio
+    import json
+
+    break_plan(plan.plan_output[0].itinerary[0])
+    sent = []
+
+    async def fake_modify(instruction, old_json_text, research=""):
+        sent.append(old_json_text)
+        return main.PlanResponse(**json.loads(plan.model_dump_json()))
+
+    async def no_enrich(p):
+        return p
+
+    monkeypatch.setattr(main, "modify_plan_with_ai", fake_modify)
+    monkeypatch.setattr(main, "enrich_all_places", no_enrich)
+    monkeypatch.setattr(main.settings, "CHANGEPLAN_COMPACT", False)
+    result = asyncio.run(main.planner_changeplan(None, plan.model_dump_json()))
+    assert result.status == "success"
+    assert len(sent) == model_calls
+
+
+@pytest.mark.parametrize(
+    "instruction, expected",
+    [
+        ("เปลี่ยนร้านวันที่ 2", {2}),
+        ("day 1 and day 3: more cafes", {1, 3}),
+        ("วันแรกกับวันสุดท้ายขอชิล ๆ", {1, 3}),
+        ("เลื่อนไปเที่ยววันที่ 2 ธันวาคม แทน", None),
+        ("ไปวันที่ 1/12", None),
+        ("วันที่ 2 ขอเปลี่ยนเป็นไปตลาด (ไปถึง 5 ธ.ค.)", None),
+        ("move day 2 to 14 Feb", None),
+        ("add 2 markets on day 3", {3}),
+        ("Sunday 2pm go to the night market", None),
+        ("saturday 3pm: cafe instead", None),
+        ("Day 2, Sunday 3pm: add a cafe", {2}),
+        ("วันที่ 9", None),  # เกินจำนวนวันของทริป
+    ],
+)
+def test_referenced_days(instruction, expected):
+    assert main.referenced_days(instruction, 3) == expected
+
+
+def test_date_instruction_regenerates_full_plan(plan):
+    data = plan.model_dump(mode="json")
+    assert main.select_patch_days(data, "เปลี่ยนร้านวันที่ 2") == {2}
+    assert main.select_patch_days(data, "เลื่อนไปเที่ยววันที่ 2 ธันวาคม แทน") is None
+
+
+def test_restore_ignores_model_filled_coordinates_but_keeps_text_edits(plan):
+    stored = plan.plan_output[0].itinerary[0].stops[0].places
+    original = stored.coordinates
+    _, old_places = main.extract_and_strip_old_plan(plan.model_dump_json())
+
+    answer = main.PlanResponse(**plan.model_dump(mode="json"))
+    place = answer.plan_output[0].itinerary[0].stops[0].places
+    place.coordinates = main.Coordinates(lat=1.0, lng=2.0)  # โมเดลแต่งพิกัดขึ้นเอง
+    place.notes = "ปิดปรับปรุงเดือนนี้"  # โมเดลแก้ข้อความจริง
+
+    main.restore_old_places(answer, old_places)
+    assert place.coordinates == original
+    assert place.notes == "ปิดปรับปรุงเดือนนี้"
@@ -0,0 +1,76 @@
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return _Clock()
+
+
+def _opened(clock, threshold=3, reset_timeout=30.0):
+    breaker = CircuitBreaker("test", failure_threshold=threshold, reset_timeout=reset_timeout, clock=clock)
+    for _ in range(threshold):
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_at_failure_threshold(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, clock=clock)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+    assert breaker.stats() == {"state": OPEN, "failures": 3, "retry_in_s": 30.0}
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, clock=clock)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_after_cooldown_allows_one_probe(clock):
+    breaker = _opened(clock)
+    clock.now += 29.9
+    assert not breaker.allow()
+    clock.now += 0.1
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow()  # probe เดียวต่อ reset_timeout
+
+
+def test_half_open_success_closes(clock):
+    breaker = _opened(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(failed=False)
+    assert breaker.state == CLOSED and breaker.failures == 0 and breaker.allow()
+
+
+def test_half_open_failure_reopens(clock):
+    breaker = _opened(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(failed=True)
+    assert breaker.state == OPEN and not breaker.allow()
+    clock.now += 30
+    assert breaker.allow() and breaker.state == HALF_OPEN  # นับ cooldown ใหม่จากตอนเปิดรอบหลัง
+
+
+def test_unreported_probe_is_replaced_after_timeout(clock):
+    breaker = _opened(clock)
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 30  # probe แรกไม่รายงานผล (เช่น ถูกยกเลิก)
+    assert breaker.allow() and breaker.state == HALF_OPEN
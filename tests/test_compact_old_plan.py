@@ -0,0 +1,56 @@
+import json
+
+import main
+from benchmarks.fake_upstream import FakeConfig, make_plan_response
+
+
+def _plan_dict():
+    plan = main.assign_place_ids(main.PlanResponse(**make_plan_response(FakeConfig(days=2, stops_per_day=4, hotels=1), 1)))
+    for i, (_, place) in enumerate(main.iter_places(plan)):
+        place.coordinates = main.Coordinates(lat=18.7 + i / 100, lng=98.9)
+    return plan.model_dump(mode="json")
+
+
+def _compact(original, instruction, max_tokens=0):
+    data = json.loads(json.dumps(original))
+    old_places = main.strip_old_plan(data)
+    encoded = main.compact_old_plan(data, old_places, instruction, max_tokens)
+    return data, old_places, encoded
+
+
+def _places(data, day_index):
+    return [stop["places"] for day in data["plan_output"][0]["itinerary"] if day["day_index"] == day_index for stop in day["stops"]]
+
+
+def test_untouched_days_are_summarised_and_restored():
+    original = _plan_dict()
+    data, old_places, encoded = _compact(original, "วันที่ 1 ขอเปลี่ยนร้านอาหาร")
+
+    assert encoded.startswith(main._COMPACT_LEGEND)
+    assert all(place["notes"] is None and place["short_description"].endswith("…") for place in _places(data, 2))
+    assert all(place["notes"] for place in _places(data, 1))
+
+    # โมเดลตอบข้อความย่อที่ส่งไปกลับมาตามเดิม -> ได้ค่าเต็มคืน
+    restored = main.restore_old_places(main.PlanResponse(**data), old_places)
+    assert restored.model_dump(mode="json") == original
+
+
+def test_budget_trimming_keeps_required_fields_and_restores():
+    original = _plan_dict()
+    data, old_places, encoded = _compact(original, None, max_tokens=200)
+
+    assert all(place["notes"] is None and place["price_info"] is None for _, place in main._iter_place_dicts(data))
+    assert all(isinstance(place["short_description"], str) and place["short_description"] for _, place in main._iter_place_dicts(data))
+    assert "short_description" not in main._TRIM_ORDER
+
+    echoed = main.PlanResponse(**data)  # แผนที่ตัดแล้วยังผ่าน schema โดยโมเดลไม่ต้องแต่งข้อความใหม่
+    assert main.restore_old_places(echoed, old_places).model_dump(mode="json") == original
+
+
+def test_trimming_stops_once_within_budget():
+    original = _plan_dict()
+    _, _, full = _compact(original, None)
+    data, _, _ = _compact(original, None, max_tokens=main.estimate_tokens(full.split("\n", 1)[1]) - 20)
+    places = [place for _, place in main._iter_place_dicts(data)]
+    assert any(place["notes"] is None for place in places)
+    assert all(place["opening_hours"] for place in places)  # ตัดแค่ notes ก็พอ ไม่ลามไปฟิลด์ถัดไป
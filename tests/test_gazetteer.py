@@ -0,0 +1,58 @@
+import pytest
+
+from gazetteer import Gazetteer, build_index, gazetteer_key, read_csv
+
+
+@pytest.fixture
+def index(tmp_path):
+    entries = [
+        ("วัดพระธาตุดอยสุเทพราชวรวิหาร", 18.8048, 98.9216, 10),
+        ("Wat Phra That Doi Suthep", 18.8048, 98.9216, 10),
+        # ชื่อซ้ำคนละจังหวัด (เชียงใหม่ / เชียงราย / ลำปาง)
+        ("วัดเจดีย์หลวง", 18.7870, 98.9868, 50),
+        ("วัดเจดีย์หลวง", 20.2560, 100.0750, 5),
+        ("วัดใหม่", 18.79, 98.99, 1),
+        ("วัดใหม่", 18.29, 99.49, 1),
+        # ชื่อเดียวกันพิกัดต่างกันเล็กน้อย (แหล่งข้อมูลต่างกัน) ยังถือเป็นที่เดียว
+        ("ตลาดวโรรส", 18.7900, 99.0010, 3),
+        ("ตลาดวโรรส", 18.7905, 99.0015, 7),
+    ]
+    path = str(tmp_path / "gaz.idx")
+    build_index(entries, path)
+    gaz = Gazetteer(path)
+    yield gaz
+    gaz.close()
+
+
+def test_key_normalization():
+    assert gazetteer_key("Wat Phra-Kaew") == gazetteer_key("wat phra kaew") == "watphrakaew"
+
+
+def test_exact_prefix_and_contained(index):
+    assert index.lookup("Wat Phra That Doi Suthep").match == "exact"
+    assert index.lookup("วัดพระธาตุดอยสุเทพ").match == "prefix"
+    hit = index.lookup("ตลาดวโรรสเชียง")
+    assert hit.match == "contained" and (hit.lat, hit.lng) == (18.7905, 99.0015)  # rank สูงสุด
+
+
+def test_homonyms_are_not_guessed(index):
+    assert index.lookup("วัดเจดีย์หลวง") is None
+    assert index.lookup("วัดใหม่") is None
+    assert index.lookup("วัดเจดีย์หลวงวรวิหาร") is None  # contained ก็ไม่เดา
+    assert index.lookup("วัดเจดีย์หลวง (Wat Chedi Luang)") is None
+
+
+def test_fuzzy_and_miss(index):
+    assert index.lookup("วัดพระธาตุดอยสุเทพราชวรวิหร").match == "fuzzy"
+    assert index.lookup("วัดพระธาตุดอยสุเทพราชวรวิหร", fuzzy=False) is None
+    assert index.lookup("ไม่มีในดัชนี") is None
+
+
+def test_csv_negative_rank_is_clamped(tmp_path):
+    source = tmp_path / "places.csv"
+    source.write_text("name,lat,lng,aliases,rank\nร้านทดสอบ,13.75,100.50,Test Shop,-5\nไม่มีพิกัด,,,,1\n", encoding="utf-8")
+    path = str(tmp_path / "gaz.idx")
+    assert build_index(read_csv(str(source)), path) == 2
+    gaz = Gazetteer(path)
+    assert gaz.lookup("test shop").lat == 13.75
+    gaz.close()
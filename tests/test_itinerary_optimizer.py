@@ -0,0 +1,44 @@
+import math
+
+import pytest
+
+from itinerary_optimizer import EXACT_MAX_NODES, Stop, format_hhmm, optimize_day, parse_hhmm
+
+
+def test_hhmm_round_trip_and_bounds():
+    assert parse_hhmm("09:05") == 545 and format_hhmm(545) == "09:05"
+    assert format_hhmm(0) == "00:00" and format_hhmm(24 * 60 - 1) == "23:59"
+    assert parse_hhmm("24:00") is None and parse_hhmm("ไม่ทราบ") is None and parse_hhmm(None) is None
+    with pytest.raises(ValueError):
+        format_hhmm(24 * 60 + 30)  # เลยเที่ยงคืนต้องไม่กลายเป็น "00:30"
+
+
+def test_empty_day():
+    assert optimize_day([]).order == []
+
+
+def test_reorders_zigzag_and_keeps_pins():
+    # เส้นตรงตามลองจิจูด แต่ลำดับเดิมกระโดดไปมา — จุดแรกปักหมุด
+    lngs = [98.90, 98.98, 98.92, 98.96, 98.94]
+    stops = [Stop(18.79, lng, 60, pinned=i == 0) for i, lng in enumerate(lngs)]
+    result = optimize_day(stops, day_start_minutes=9 * 60, speed_kmh=30, buffer_minutes=10)
+    assert result.order == [0, 2, 4, 3, 1]
+    assert result.reordered and result.distance_km < result.original_distance_km
+    assert result.start_minutes[0] == 9 * 60
+    assert all(b - a >= 60 for a, b in zip(result.start_minutes, result.start_minutes[1:]))
+
+
+def test_unlocated_stop_stays_in_place():
+    stops = [Stop(18.79, 98.90, 60), Stop(None, None, 30), Stop(18.79, 98.98, 60), Stop(18.79, 98.91, 60)]
+    result = optimize_day(stops, unknown_travel_minutes=45)
+    assert result.order[1] == 1
+    assert result.travel_minutes[1] == 45 and result.travel_minutes[2] == 45
+
+
+def test_long_segment_never_worse_than_original():
+    n = EXACT_MAX_NODES + 5
+    stops = [Stop(18.7 + (i * 7 % n) / 100, 98.9 + (i * 3 % n) / 100, 30) for i in range(n)]
+    result = optimize_day(stops)
+    assert sorted(result.order) == list(range(n))
+    assert result.distance_km <= result.original_distance_km + 1e-9
+    assert not math.isnan(result.distance_km)
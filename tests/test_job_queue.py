@@ -0,0 +1,82 @@
+import asyncio
+import sqlite3
+import time
+
+from job_queue import DONE, QUEUED, RUNNING, JobQueue
+
+
+def _status(path, job_id):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT status, worker_id FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_second_process_does_not_rerun_leased_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    calls = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def slow(payload):
+            calls.append(payload["n"])
+            await release.wait()
+            return {"n": payload["n"]}
+
+        a = JobQueue({"work": slow}, path=path, workers=1, poll_interval=0.05)
+        b = JobQueue({"work": slow}, path=path, workers=1, poll_interval=0.05)
+        await a.start()
+        job_id = await a.submit("work", {"n": 1})
+        while not calls:
+            await asyncio.sleep(0.01)
+
+        await b.start()  # worker ที่ start ทีหลัง (เช่น restart ของ process อื่น) ต้องไม่แย่งงานที่ lease ยังไม่หมด
+        await asyncio.sleep(0.3)
+        assert _status(path, job_id) == (RUNNING, a.worker_id)
+
+        release.set()
+        job = await b.wait(job_id, 5)
+        await a.stop()
+        await b.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job["status"] == DONE and job["result"] == {"n": 1}
+    assert calls == [1]
+
+
+def test_expired_lease_is_requeued_and_stale_finish_is_ignored(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    crashed = JobQueue({"work": None}, path=path, workers=1)
+    job_id = asyncio.run(crashed.submit("work", {"n": 2}))
+    assert crashed._claim()[0] == job_id  # claim แล้ว process "ตาย" (ไม่ต่อ lease)
+    with crashed._lock:
+        crashed._db.execute("UPDATE jobs SET lease_until = ? WHERE id = ?", (time.time() - 1, job_id))
+
+    async def handler(payload):
+        return {"n": payload["n"]}
+
+    async def scenario():
+        fresh = JobQueue({"work": handler}, path=path, workers=1, poll_interval=0.05)
+        await fresh.start()
+        job = await fresh.wait(job_id, 5)
+        await fresh.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job["status"] == DONE and job["attempts"] == 2
+    crashed._finish(job_id, "failed", error="late")  # process เดิมฟื้นมาเขียนผลทับไม่ได้
+    assert _status(path, job_id)[0] == DONE
+
+
+def test_adds_lease_columns_to_existing_file(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    with sqlite3.connect(path) as db:
+        db.execute(
+            "CREATE TABLE jobs (id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL, "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, "
+            "available_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        db.execute("INSERT INTO jobs VALUES ('old', 'work', '{}', 'running', NULL, NULL, 1, 0, 0, 0, NULL)")
+    queue = JobQueue({"work": None}, path=path)
+    assert queue._requeue_expired() == 1
+    assert _status(path, "old") == (QUEUED, None)
@@ -0,0 +1,57 @@
+import asyncio
+from typing import List
+
+import httpx
+import pytest
+from pydantic import ValidationError
+
+import main
+from benchmarks.fake_upstream import FakeConfig, make_plan_response
+from json_io import JSONBytesResponse, dump_json, validate_json
+
+
+def _plan() -> main.PlanResponse:
+    return main.PlanResponse(**make_plan_response(FakeConfig(days=1, stops_per_day=2, hotels=1), 1))
+
+
+def test_validate_json_model_and_plain_type():
+    plan = _plan()
+    assert validate_json(main.PlanResponse, plan.model_dump_json()) == plan
+    assert validate_json(List[int], b"[1, 2]") == [1, 2]
+
+
+def test_validate_json_malformed_is_validation_error():
+    with pytest.raises(ValidationError):
+        validate_json(main.PlanResponse, '{"status": ')
+
+
+def test_dump_json_keeps_thai_and_embedded_models():
+    plan = _plan()
+    raw = dump_json({"event": "done", "note": "เชียงใหม่", "data": plan})
+    assert "เชียงใหม่".encode("utf-8") in raw
+    assert validate_json(main.PlanResponse, dump_json(plan)) == plan
+    assert JSONBytesResponse({"a": "ไทย"}).body == dump_json({"a": "ไทย"})
+    assert JSONBytesResponse(b'{"a":1}').body == b'{"a":1}'
+
+
+def test_makeplan_miss_goes_through_response_model_and_hit_is_served_from_cache(monkeypatch):
+    calls = []
+
+    async def fake_planner(user_input, options=1):
+        calls.append(user_input)
+        return _plan()
+
+    monkeypatch.setattr(main, "planner_makeplan", fake_planner)
+    body = {"input": "เที่ยวน่าน 1 วัน json_io", "options": 1}
+
+    async def post_twice():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            return await client.post("/makeplan", json=body), await client.post("/makeplan", json=body)
+
+    miss, hit = asyncio.run(post_twice())
+
+    assert miss.status_code == hit.status_code == 200
+    assert miss.headers["X-Response-Cache"] == "miss"
+    assert hit.headers["X-Response-Cache"] == "hit"
+    assert miss.json() == hit.json() == _plan().model_dump(mode="json")
+    assert calls == [body["input"]]
@@ -0,0 +1,27 @@
+import asyncio
+import sqlite3
+
+from kv_cache import KVCache
+
+
+def test_async_api_shares_disk_layer_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    writer = KVCache("ns", ttl=60, max_entries=10, path=path)
+    reader = KVCache("ns", ttl=60, max_entries=10, path=path)
+
+    async def scenario():
+        await writer.aset("k", {"v": "ไทย"})
+        return await reader.aget("k"), await reader.aget("missing")
+
+    assert asyncio.run(scenario()) == ({"v": "ไทย"}, None)
+    assert reader.stats()["hits"] == 1 and reader.stats()["misses"] == 1
+
+
+def test_disk_hit_does_not_rewrite_recent_accessed_at(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    KVCache("ns", ttl=3600, max_entries=10, path=path).set("k", 1)
+    with sqlite3.connect(path) as db:
+        before = db.execute("SELECT accessed_at FROM kv_cache").fetchone()[0]
+    assert KVCache("ns", ttl=3600, max_entries=10, path=path).get("k") == 1
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT accessed_at FROM kv_cache").fetchone()[0] == before
@@ -0,0 +1,28 @@
+import asyncio
+
+import main
+from benchmarks.fake_upstream import FakeConfig, make_plan_response
+
+
+def test_parallel_option_indices_match_final_plan(monkeypatch):
+    # ตัวเลือก 0 ล้มช้าที่สุด, ตัวเลือก 2 เสร็จก่อนตัวเลือก 1
+    delays = {main._OPTION_HINTS[0]: 0.06, main._OPTION_HINTS[1]: 0.04, main._OPTION_HINTS[2]: 0.01}
+
+    async def fake_create_plan(user_input, research="", options=1, option_hint=None):
+        await asyncio.sleep(delays[option_hint])
+        if option_hint == main._OPTION_HINTS[0]:
+            return main._error_response("Output Error")
+        plan = main.PlanResponse(**make_plan_response(FakeConfig(days=1, stops_per_day=1, hotels=1), 1))
+        plan.plan_output[0].name = option_hint
+        return plan
+
+    monkeypatch.setattr(main, "create_plan", fake_create_plan)
+    monkeypatch.setattr(main.settings, "PARALLEL_OPTIONS", True)
+
+    async def collect():
+        return [item async for item in main.create_plan_stream("เชียงใหม่ 1 วัน", options=3)]
+
+    *options, final = asyncio.run(collect())
+    assert [index for index, _ in options] == [0, 1]
+    assert [option.name for _, option in options] == [main._OPTION_HINTS[2], main._OPTION_HINTS[1]]
+    assert [plan.name for plan in final.plan_output] == [option.name for _, option in options]
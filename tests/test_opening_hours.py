@@ -0,0 +1,33 @@
+import pytest
+
+from opening_hours import compile_hours, is_open
+
+DAYTIME = [(600, 1080)]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Mon-Sun 10:00-18:00 (closed Wed)", [DAYTIME, DAYTIME, [], DAYTIME, DAYTIME, DAYTIME, DAYTIME]),
+        ("ทุกวัน 08:00-17:00 ปิดวันจันทร์", [[]] + [[(480, 1020)]] * 6),
+        ("Mon closed, Tue-Sun 09:00-16:00", [[]] + [[(540, 960)]] * 6),
+        ("9-5pm", [[(540, 1020)]] * 7),
+        ("24 ชม.", [[(0, 1440)]] * 7),
+    ],
+)
+def test_compile_hours_intervals(text, expected):
+    hours = compile_hours(text)
+    assert [hours.intervals(weekday) for weekday in range(7)] == expected
+
+
+def test_past_midnight_spills_into_next_day():
+    hours = compile_hours("Fri-Sat 18:00-02:00")
+    assert hours.intervals(6) == [(0, 120)]
+    assert is_open(hours, 5, (23 * 60, 25 * 60)) is True  # คืนวันเสาร์ถึงตีหนึ่ง
+    assert is_open(hours, 6, (23 * 60, 25 * 60)) is False
+
+
+def test_unknown_hours_is_none():
+    assert compile_hours("ไม่ทราบ โปรดตรวจสอบ") is None
+    assert is_open(None, 0, (600, 660)) is None
+    assert is_open("ไม่ทราบ", 0, (600, 660)) is None
@@ -0,0 +1,45 @@
+import numpy as np
+
+from plan_feasibility import HOURS_CLOSED, HOURS_OK, assess, build_arrays
+
+
+def test_overlap_shortfall_and_hours():
+    rows = [
+        (0, 18.79, 98.98, 9 * 60, 60, "Mon-Sun 08:00-18:00"),
+        (0, 18.79, 98.98, 9 * 60 + 30, 60, None),            # เริ่มก่อนจุดแรกจบ 30 นาที
+        (0, 18.90, 98.98, 11 * 60, 60, "Mon-Sun 18:00-22:00"),  # ~12 กม. ต่อกันพอดี + ปิดอยู่
+    ]
+    result = assess(build_arrays(rows), 1, speed_kmh=30, buffer_minutes=10)
+    assert result.overlap.tolist() == [0, 30, 0]
+    assert result.shortfall[2] > 0
+    assert result.hours.tolist() == [HOURS_OK, HOURS_OK, HOURS_CLOSED]
+    assert result.span.tolist() == [3 * 60]
+
+
+def test_trailing_empty_day_keeps_group_count():
+    # กลุ่ม 0 มีจุดแวะ, กลุ่ม 1 (วันสุดท้าย) ว่าง
+    result = assess(build_arrays([(0, 18.79, 98.98, 540, 60, None)]), 2, speed_kmh=30, buffer_minutes=10)
+    assert len(result.stay_total) == len(result.travel_total) == len(result.span) == len(result.stops) == 2
+    assert result.stops.tolist() == [1, 0]
+    assert np.isnan(result.span[1])
+
+
+def test_plan_without_stops():
+    result = assess(build_arrays([]), 3, speed_kmh=30, buffer_minutes=10)
+    assert result.stops.tolist() == [0, 0, 0]
+    assert len(result.overlap) == 0
+
+
+def test_assess_plan_feasibility_with_empty_day():
+    import main
+    from benchmarks.fake_upstream import FakeConfig, make_plan_response
+
+    plan = main.PlanResponse(**make_plan_response(FakeConfig(days=3, stops_per_day=3, hotels=1), 2))
+    plan.plan_output[0].itinerary[-1].stops = []
+    for day in plan.plan_output[1].itinerary:
+        day.stops = []
+
+    reports = main.assess_plan_feasibility(plan)
+    assert [len(r.days) for r in reports] == [3, 3]
+    assert reports[0].days[-1].stay_minutes == 0
+    assert all(d.stay_minutes == 0 for d in reports[1].days)
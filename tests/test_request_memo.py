@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+import pytest
+
+import main
+from benchmarks.fake_upstream import FakeConfig, make_plan_response
+from request_memo import IdempotencyKeyMismatch, InflightCoalescer, body_hash, request_key
+
+
+def test_idempotency_key_replaces_body_in_key():
+    assert request_key("ns", "a", idempotency_key="k1") == request_key("ns", "b", idempotency_key=" k1 ")
+    assert request_key("ns", "a") != request_key("ns", "b")
+
+
+def test_inflight_coalescer_rejects_reused_key_with_other_body():
+    async def scenario():
+        coalescer = InflightCoalescer()
+        release = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return "plan"
+
+        first = asyncio.create_task(coalescer.run("k", work, body_hash("เชียงใหม่")))
+        await asyncio.sleep(0)
+        same = asyncio.create_task(coalescer.run("k", work, body_hash("เชียงใหม่")))
+        with pytest.raises(IdempotencyKeyMismatch):
+            await coalescer.run("k", work, body_hash("น่าน"))
+        release.set()
+        return await first, await same, calls, len(coalescer)
+
+    first, same, calls, left = asyncio.run(scenario())
+    assert first == ("plan", False) and same == ("plan", True)
+    assert calls == [1] and left == 0
+
+
+def test_makeplan_reused_idempotency_key_with_other_body_is_422(monkeypatch):
+    async def fake_planner(user_input, options=1):
+        return main.PlanResponse(**make_plan_response(FakeConfig(days=1, stops_per_day=1, hotels=1), 1))
+
+    monkeypatch.setattr(main, "planner_makeplan", fake_planner)
+    headers = {"Idempotency-Key": "test-request-memo-422"}
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test") as client:
+            first = await client.post("/makeplan", json={"input": "เชียงใหม่ 1 วัน"}, headers=headers)
+            replay = await client.post("/makeplan", json={"input": "เชียงใหม่ 1 วัน"}, headers=headers)
+            other = await client.post("/makeplan", json={"input": "น่าน 3 วัน"}, headers=headers)
+            return first, replay, other
+
+    first, replay, other = asyncio.run(scenario())
+    assert first.status_code == replay.status_code == 200
+    assert replay.headers["X-Response-Cache"] == "hit"
+    assert other.status_code == 422 and other.json()["status"] == "error"
@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+from research_key import extract_trip_key, research_cache_key
+
+
+def test_wording_variants_share_a_key():
+    today = date(2026, 10, 17)
+    assert research_cache_key("เที่ยวเชียงใหม่ 3 วัน", today, 7) == research_cache_key("ไป  เชียงใหม่ 3 วัน", today, 7)
+
+
+@pytest.mark.parametrize(
+    "text, destinations, styles",
+    [
+        ("เที่ยวจังหวัดเชียงใหม่ 3 วัน", ("chiang mai",), ()),          # "วัด" ใน "จังหวัด"
+        ("ไปหาดใหญ่ 2 วัน ตระเวนของกิน", ("songkhla",), ("food",)),       # "หาด" ใน "หาดใหญ่"
+        ("เกาะช้าง 3 วัน 2 คืน", ("koh chang",), ()),                     # "เกาะ" ในชื่อปลายทาง
+        ("อำเภอปาย 2 วัน", ("pai",), ()),
+        ("เชียงใหม่ ไหว้พระ 9 วัด", ("chiang mai",), ("temple",)),
+        ("กระบี่ เที่ยวทะเล ดำน้ำ", ("krabi",), ("beach",)),
+        ("nan province trip with banana pancakes", ("nan",), ()),
+    ],
+)
+def test_destinations_and_styles(text, destinations, styles):
+    key = extract_trip_key(text)
+    assert key.destinations == destinations
+    assert key.styles == styles
+
+
+def test_days_nights_and_months():
+    key = extract_trip_key("ภูเก็ต 3 คืน เดือนธันวาคม")
+    assert key.days == 4 and key.months == (12,)
+    assert extract_trip_key("อยากไปเที่ยวทะเล") is None
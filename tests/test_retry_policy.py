@@ -0,0 +1,139 @@
+import asyncio
+import random
+
+import pytest
+
+import retry_policy
+from retry_policy import RetryPolicy, hedged, is_retryable, retry_call
+
+
+class _ApiError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.code = code
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """RNG ที่ seed แล้ว + asyncio.sleep ที่จดเวลารอไว้แทนการรอจริง"""
+    recorded = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(delay, *args, **kwargs):
+        recorded.append(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(retry_policy, "random", random.Random(7))
+    monkeypatch.setattr(retry_policy.asyncio, "sleep", fake_sleep)
+    return recorded
+
+
+def _flaky(errors, result="ok"):
+    calls = []
+
+    async def factory():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    return factory, calls
+
+
+def test_backoff_is_full_jitter_within_cap(monkeypatch):
+    policy = RetryPolicy(base_delay=0.5, max_delay=2.0)
+    monkeypatch.setattr(retry_policy, "random", random.Random(3))
+    delays = [policy.backoff(attempt) for attempt in (1, 2, 3, 10)]
+    expected = random.Random(3)
+    assert delays == [expected.uniform(0, cap) for cap in (0.5, 1.0, 2.0, 2.0)]
+
+
+@pytest.mark.parametrize(
+    "exc, expected",
+    [(_ApiError(429), True), (_ApiError(503), True), (_ApiError(400), False), (asyncio.TimeoutError(), True), (ValueError(), False)],
+)
+def test_is_retryable(exc, expected):
+    assert is_retryable(exc) is expected
+
+
+def test_retries_retryable_errors_until_success(sleeps):
+    factory, calls = _flaky([_ApiError(503), _ApiError(429)])
+    policy = RetryPolicy(max_attempts=3, base_delay=0.5)
+    assert asyncio.run(retry_call("test", factory, policy)) == "ok"
+    expected = random.Random(7)
+    assert len(calls) == 3
+    assert sleeps == [expected.uniform(0, 0.5), expected.uniform(0, 1.0)]
+
+
+def test_non_retryable_error_is_not_retried(sleeps):
+    factory, calls = _flaky([_ApiError(400)])
+    with pytest.raises(_ApiError):
+        asyncio.run(retry_call("test", factory, RetryPolicy(max_attempts=3)))
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_gives_up_after_max_attempts(sleeps):
+    factory, calls = _flaky([_ApiError(429)] * 5)
+    with pytest.raises(_ApiError):
+        asyncio.run(retry_call("test", factory, RetryPolicy(max_attempts=3)))
+    assert len(calls) == 3 and len(sleeps) == 2
+
+
+def test_backoff_past_deadline_gives_up_without_waiting(sleeps, monkeypatch):
+    factory, calls = _flaky([_ApiError(503)])
+    policy = RetryPolicy(max_attempts=3, base_delay=50.0, max_delay=50.0, deadline=0.5)
+    monkeypatch.setattr(retry_policy.random, "uniform", lambda a, b: b)  # backoff เต็มเพดาน -> เลย deadline แน่นอน
+    with pytest.raises(_ApiError):
+        asyncio.run(retry_call("test", factory, policy))
+    assert len(calls) == 1 and sleeps == []
+
+
+def test_hedge_fires_after_delay_and_cancels_loser():
+    events = []
+
+    async def primary():
+        try:
+            await asyncio.sleep(10)
+            return "primary"
+        except asyncio.CancelledError:
+            events.append("primary cancelled")
+            raise
+
+    async def backup():
+        events.append("hedge sent")
+        return "hedge"
+
+    async def scenario():
+        result = await hedged("test", primary, backup, hedge_after=0.01)
+        await asyncio.sleep(0)  # ให้ task ที่ถูกยกเลิกได้ทำงานจนจบ
+        return result
+
+    assert asyncio.run(scenario()) == "hedge"
+    assert events == ["hedge sent", "primary cancelled"]
+
+
+def test_fast_primary_does_not_hedge():
+    backup_calls = []
+
+    async def primary():
+        return "primary"
+
+    async def backup():
+        backup_calls.append(1)
+        return "hedge"
+
+    assert asyncio.run(hedged("test", primary, backup, hedge_after=0.05)) == "primary"
+    assert backup_calls == []
+
+
+def test_hedge_falls_back_to_primary_error_when_both_fail():
+    async def primary():
+        await asyncio.sleep(0.02)
+        raise _ApiError(503)
+
+    async def backup():
+        raise _ApiError(500)
+
+    with pytest.raises(_ApiError) as exc:
+        asyncio.run(hedged("test", primary, backup, hedge_after=0.01))
+    assert exc.value.code == 503
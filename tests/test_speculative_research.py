@@ -0,0 +1,36 @@
+import asyncio
+import gc
+
+import pytest
+
+import main
+
+
+def _discarded() -> float:
+    return main.SPECULATIVE_RESEARCH.labels("discarded")._value.get()
+
+
+def test_failed_intent_check_discards_research_and_retrieves_its_error(monkeypatch):
+    async def failing_research(user_input):
+        raise RuntimeError("research failed")
+
+    async def failing_intent(user_input):
+        await asyncio.sleep(0.01)  # ให้ research ล้มเสร็จก่อน
+        raise RuntimeError("intent failed")
+
+    monkeypatch.setattr(main.settings, "SPECULATIVE_RESEARCH", True)
+    monkeypatch.setattr(main, "research_from_user_input", failing_research)
+    monkeypatch.setattr(main, "intent_check", failing_intent)
+
+    unretrieved = []
+
+    async def scenario():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, ctx: unretrieved.append(ctx))
+        with pytest.raises(RuntimeError, match="intent failed"):
+            await main._intent_and_research("เชียงใหม่ 3 วัน")
+        gc.collect()
+
+    before = _discarded()
+    asyncio.run(scenario())
+    assert _discarded() == before + 1
+    assert unretrieved == []
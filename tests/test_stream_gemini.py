@@ -0,0 +1,47 @@
+import asyncio
+from types import SimpleNamespace
+
+import gemini_client
+import main
+
+
+def _fake_client(chunks):
+    async def generate_content_stream(model, contents, config):
+        async def stream():
+            for text in chunks:
+                await asyncio.sleep(0)
+                yield SimpleNamespace(text=text)
+
+        return stream()
+
+    return SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content_stream=generate_content_stream)))
+
+
+def _run_stream(monkeypatch, model, take):
+    monkeypatch.setattr(gemini_client, "get_client", lambda: _fake_client(['{"a":', "1", "}"]))
+    limiter = gemini_client.limiter(model)
+    limiter.window = 2.0
+
+    async def scenario():
+        stream = main._stream_gemini_text(model, "prompt", "system", main.PlanResponse)
+        received = []
+        async for text in stream:
+            received.append(text)
+            if len(received) == take:
+                break
+        await stream.aclose()  # client หลุด -> StreamingResponse ปิด generator
+        return received
+
+    return asyncio.run(scenario()), limiter
+
+
+def test_client_disconnect_does_not_grow_limiter_window(monkeypatch):
+    received, limiter = _run_stream(monkeypatch, "test-stream-disconnect", take=1)
+    assert received == ['{"a":']
+    assert (limiter.window, limiter.inflight) == (2.0, 0)
+
+
+def test_completed_stream_counts_as_success(monkeypatch):
+    received, limiter = _run_stream(monkeypatch, "test-stream-complete", take=None)
+    assert "".join(received) == '{"a":1}'
+    assert limiter.window > 2.0 and limiter.inflight == 0
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from upstream_limiter import AdaptiveLimiter, UpstreamOverloaded
+
+
+class _Overloaded(Exception):
+    code = 429
+
+
+def test_window_grows_on_success_and_halves_on_overload():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-aimd", max_concurrency=8)
+        limiter.window = 4.0
+        async with limiter.slot():
+            pass
+        grown = limiter.window
+        with pytest.raises(_Overloaded):
+            async with limiter.slot():
+                raise _Overloaded()
+        return grown, limiter.window, limiter.inflight
+
+    grown, halved, inflight = asyncio.run(scenario())
+    assert grown == 4.25 and halved == grown / 2 and inflight == 0
+
+
+def test_queue_full_is_shed():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-shed", max_concurrency=1, max_queue=0)
+        async with limiter.slot():
+            with pytest.raises(UpstreamOverloaded) as exc:
+                async with limiter.slot():
+                    pass
+        return exc.value.retry_after
+
+    assert asyncio.run(scenario()) >= 1
+
+
+def test_slot_granted_to_cancelled_waiter_does_not_grow_window():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-cancel-grant", max_concurrency=4)
+        limiter.window = 1.0
+        await limiter._acquire()
+        waiter = asyncio.create_task(limiter._acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()         # waiter ถูกยกเลิกแล้ว ...
+        limiter._return_slot()  # ... แต่ slot ถูกส่งต่อให้ก่อนที่มันจะได้ทำงาน
+        await asyncio.gather(waiter, return_exceptions=True)
+        return limiter.window, limiter.inflight
+
+    assert asyncio.run(scenario()) == (1.0, 0)
+
+
+def test_cancelled_call_does_not_grow_window():
+    async def scenario():
+        limiter = AdaptiveLimiter("test-cancel-call", max_concurrency=4)
+        limiter.window = 2.0
+
+        async def call():
+            async with limiter.slot():
+                await asyncio.sleep(10)
+
+        task = asyncio.create_task(call())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return limiter.window, limiter.inflight
+
+    assert asyncio.run(scenario()) == (2.0, 0)
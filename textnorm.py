@@ -0,0 +1,19 @@
+"""Text normalization ที่ใช้ร่วมกันระหว่าง cache / lookup ต่าง ๆ"""
+
+import re
+import unicodedata
+
+_WS_RE = re.compile(r"\s+")
+_ZERO_WIDTH_RE = re.compile("[\u200b\u200c\u200d\u2060\ufeff]")
+
+
+def normalize_name(text: str) -> str:
+    """ทำชื่อสถานที่ให้อยู่ในรูปมาตรฐานสำหรับใช้เป็น key
+
+    NFKC + casefold (อังกฤษ) + ตัด zero-width space ที่มักติดมากับข้อความไทย + ยุบช่องว่างเหลือช่องเดียว
+    เช่น "  วัดพระแก้ว " / "Wat  Phra Kaew" / "WAT PHRA KAEW" -> "วัดพระแก้ว" / "wat phra kaew"
+    """
+    t = unicodedata.normalize("NFKC", text or "")
+    t = _ZERO_WIDTH_RE.sub("", t)
+    t = _WS_RE.sub(" ", t).strip()
+    return t.casefold()
@@ -0,0 +1,175 @@
+"""จำกัดจำนวน request ที่ส่งไปยังบริการภายนอกพร้อมกัน (ต่อโมเดล) แบบปรับตัวได้
+
+- หน้าต่าง concurrency แบบ AIMD: สำเร็จ -> ขยายทีละนิด, เจอ 429/503 -> ลดครึ่ง
+- token bucket (ถ้ากำหนด rpm) เพื่อไม่ยิงเกินโควตาต่อนาที
+- คิวรอมีขอบเขต: คิวเต็มหรือรอนานเกินไป -> raise UpstreamOverloaded ทันที (แอปตอบ 503 + Retry-After)
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from metrics import LIMITER_QUEUE, LIMITER_SHED, LIMITER_WINDOW
+
+_OVERLOAD_CODES = (429, 503)
+
+
+class UpstreamOverloaded(Exception):
+    """upstream เต็ม/คิวเต็ม — ควรตอบ 503 พร้อม Retry-After (วินาที)"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"{name}: upstream overloaded, retry after {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_overload_error(exc: BaseException) -> bool:
+    """429 RESOURCE_EXHAUSTED / 503 UNAVAILABLE จาก google-genai (APIError.code) หรือ httpx"""
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    return code in _OVERLOAD_CODES
+
+
+class AdaptiveLimiter:
+    """semaphore ที่ขนาดหน้าต่างปรับตามสัญญาณ overload จาก upstream (ใช้ภายใน event loop เดียว)"""
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        max_queue: int = 32,
+        queue_timeout: float = 30.0,
+        rpm: Optional[float] = None,
+    ):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.window = float(self.max_concurrency)
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self._latency_ewma = 1.0  # วินาที ใช้ประเมิน Retry-After
+
+        self._rate = rpm / 60.0 if rpm else None
+        self._tokens = float(max(1, self.max_concurrency))
+        self._tokens_at = time.monotonic()
+
+        LIMITER_WINDOW.labels(name).set(self.window)
+
+    # ---- public ----
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """ครอบการเรียก upstream หนึ่งครั้ง — รอคิวตามขอบเขต แล้วปรับหน้าต่างตามผลลัพธ์"""
+        await self._acquire()
+        t0 = time.monotonic()
+        overloaded = False
+        try:
+            await self._take_token()
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            # ถูกยกเลิก (เช่น hedge ตัวที่แพ้) หรือ stream ถูกปิดกลางทางเพราะ client หลุด
+            # ไม่ใช่สัญญาณจาก upstream — คืน slot โดยไม่ปรับหน้าต่าง
+            self._return_slot()
+            raise
+        except BaseException as exc:
+            overloaded = is_overload_error(exc)
+            self._release(overloaded, time.monotonic() - t0)
+            raise
+        else:
+            self._release(overloaded, time.monotonic() - t0)
+
+    def retry_after(self) -> int:
+        """ประเมินเวลาที่คิวน่าจะว่าง: (คิว + inflight) / หน้าต่าง × latency เฉลี่ย"""
+        backlog = len(self._waiters) + self.inflight
+        return max(1, math.ceil(backlog / max(1.0, self.window) * self._latency_ewma))
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "window": round(self.window, 2),
+            "max_concurrency": self.max_concurrency,
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "latency_ewma_s": round(self._latency_ewma, 3),
+        }
+
+    # ---- internals ----
+    def _has_capacity(self) -> bool:
+        return self.inflight < int(self.window)
+
+    async def _acquire(self) -> None:
+        if self._has_capacity() and not self._waiters:
+            self.inflight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._shed("queue_full")
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        LIMITER_QUEUE.labels(self.name).set(len(self._waiters))
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # ได้ slot พอดีตอนหมดเวลา — คืน slot ก่อน shed (ยังไม่ได้เรียก upstream จึงไม่ขยายหน้าต่าง)
+                self._return_slot()
+            else:
+                fut.cancel()
+            self._shed("queue_timeout")
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._return_slot()
+            else:
+                fut.cancel()
+            raise
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+            LIMITER_QUEUE.labels(self.name).set(len(self._waiters))
+
+    def _shed(self, reason: str) -> None:
+        LIMITER_SHED.labels(self.name, reason).inc()
+        raise UpstreamOverloaded(self.name, self.retry_after())
+
+    def _release(self, overloaded: bool, elapsed: Optional[float]) -> None:
+        self.inflight -= 1
+        now = time.monotonic()
+        if overloaded:
+            # ลดครึ่งได้ไม่เกินหนึ่งครั้งต่อ latency หนึ่งรอบ (429 ที่มาพร้อมกันเป็นสัญญาณเดียวกัน)
+            if now - self._last_decrease >= self._latency_ewma:
+                self.window = max(float(self.min_concurrency), self.window / 2)
+                self._last_decrease = now
+        else:
+            self.window = min(float(self.max_concurrency), self.window + 1.0 / self.window)
+            if elapsed is not None:
+                self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * elapsed
+        LIMITER_WINDOW.labels(self.name).set(self.window)
+        self._wake()
+
+    def _return_slot(self) -> None:
+        """คืน slot ที่ไม่ได้ใช้เรียก upstream จริง — ไม่นับเป็นสำเร็จ/overload จึงไม่แตะ window และ latency"""
+        self.inflight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self._has_capacity():
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self.inflight += 1
+            fut.set_result(None)
+
+    async def _take_token(self) -> None:
+        if self._rate is None:
+            return
+        while True:
+            now = time.monotonic()
+            self._tokens = min(float(self.max_concurrency), self._tokens + (now - self._tokens_at) * self._rate)
+            self._tokens_at = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return
+            await asyncio.sleep((1.0 - self._tokens) / self._rate)